@@ -0,0 +1,117 @@
+"""
+Runtime settings for the RewardOps Analytics API, overridable via environment variables.
+"""
+import os
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _float_env(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# Database connection pool
+DB_POOL_MIN_SIZE = _int_env("DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = _int_env("DB_POOL_MAX_SIZE", 10)
+DB_POOL_MAX_CONNECTION_AGE = _float_env("DB_POOL_MAX_CONNECTION_AGE", 1800.0)
+
+# Prepared statements kept per pooled connection, keyed by SQL template (0 disables)
+DB_PREPARED_STATEMENTS_PER_CONNECTION = _int_env("DB_PREPARED_STATEMENTS_PER_CONNECTION", 128)
+
+# Maximum number of queries processed in parallel per worker process
+QUERY_MAX_CONCURRENCY = _int_env("QUERY_MAX_CONCURRENCY", DB_POOL_MAX_SIZE)
+
+# Most queries accepted in one batch request or WebSocket batch message
+QUERY_BATCH_MAX_SIZE = _int_env("QUERY_BATCH_MAX_SIZE", 50)
+
+# Query scheduling: queries running at once per session (the overall budget is
+# QUERY_MAX_CONCURRENCY), and queries that may wait per session and in total before
+# new ones are refused as busy
+SCHEDULER_MAX_RUNNING_PER_SESSION = _int_env("SCHEDULER_MAX_RUNNING_PER_SESSION",
+                                             max(1, QUERY_MAX_CONCURRENCY // 2))
+SCHEDULER_MAX_QUEUED_PER_SESSION = _int_env("SCHEDULER_MAX_QUEUED_PER_SESSION", QUERY_BATCH_MAX_SIZE)
+SCHEDULER_MAX_QUEUED = _int_env("SCHEDULER_MAX_QUEUED", 500)
+
+# Per-query deadline in seconds, enforced by Postgres and the API (0 disables)
+QUERY_TIMEOUT = _float_env("QUERY_TIMEOUT", 30.0)
+
+# Query result cache
+RESULT_CACHE_DEFAULT_TTL = _float_env("RESULT_CACHE_DEFAULT_TTL", 30.0)
+RESULT_CACHE_MAX_ENTRIES = _int_env("RESULT_CACHE_MAX_ENTRIES", 256)
+RESULT_CACHE_MAX_ROWS = _int_env("RESULT_CACHE_MAX_ROWS", 100_000)
+RESULT_CACHE_TABLE_TTLS = {
+    "orders": _float_env("RESULT_CACHE_TTL_ORDERS", 15.0),
+    "members": _float_env("RESULT_CACHE_TTL_MEMBERS", 60.0),
+    "programs": _float_env("RESULT_CACHE_TTL_PROGRAMS", 300.0),
+}
+
+# Memoized natural language -> (analysis, SQL) plans
+PLAN_MEMO_MAX_ENTRIES = _int_env("PLAN_MEMO_MAX_ENTRIES", 1024)
+
+# Latest result per session, kept for in-memory follow-ups ("only the paid ones")
+SESSION_CONTEXT_MAX_SESSIONS = _int_env("SESSION_CONTEXT_MAX_SESSIONS", 1000)
+SESSION_CONTEXT_MAX_ROWS = _int_env("SESSION_CONTEXT_MAX_ROWS", 200_000)
+SESSION_CONTEXT_MAX_ROWS_PER_SESSION = _int_env("SESSION_CONTEXT_MAX_ROWS_PER_SESSION", 10_000)
+SESSION_CONTEXT_TTL = _float_env("SESSION_CONTEXT_TTL", 1800.0)
+
+# Approximate counts: rows read by a TABLESAMPLE estimate; smaller tables are counted exactly
+ESTIMATE_SAMPLE_ROWS = _int_env("ESTIMATE_SAMPLE_ROWS", 10_000)
+
+# Slow-query log: statements slower than the threshold (seconds; 0 disables plan capture)
+# get an EXPLAIN (ANALYZE, BUFFERS), at most once per interval per query shape, and at most
+# QUERY_SHAPES_MAX shapes are tracked. Suggested indexes are only built through the API
+# when QUERY_SHAPES_ALLOW_INDEX_CREATION is set to 1.
+QUERY_SHAPES_SLOW_THRESHOLD = _float_env("QUERY_SHAPES_SLOW_THRESHOLD", 0.25)
+QUERY_SHAPES_EXPLAIN_INTERVAL = _float_env("QUERY_SHAPES_EXPLAIN_INTERVAL", 600.0)
+QUERY_SHAPES_MAX = _int_env("QUERY_SHAPES_MAX", 500)
+QUERY_SHAPES_ALLOW_INDEX_CREATION = _int_env("QUERY_SHAPES_ALLOW_INDEX_CREATION", 0) == 1
+
+# Default dashboard tiles, run during startup warm-up to prepare their statements and prime
+# the result cache; separated by ";" (empty disables)
+WARMUP_QUERIES = [query.strip() for query in os.getenv(
+    "WARMUP_QUERIES",
+    "How many orders;How many paid orders;Give me a summary of orders;Show me the latest 10 orders",
+).split(";") if query.strip()]
+
+# Rows per batch when streaming results over the WebSocket
+STREAM_BATCH_SIZE = _int_env("STREAM_BATCH_SIZE", 500)
+
+# Upper bound on points in chart payloads when the client sends no chart width
+CHART_MAX_POINTS = _int_env("CHART_MAX_POINTS", 800)
+
+# CSV exports: how many may run at once (each on its own worker thread and connection,
+# apart from interactive queries; more are refused with 503), deadline in seconds for a
+# whole export (0 disables), bytes per streamed chunk and chunks buffered for a slow
+# client before COPY is paused
+EXPORT_MAX_CONCURRENCY = _int_env("EXPORT_MAX_CONCURRENCY", 2)
+EXPORT_TIMEOUT = _float_env("EXPORT_TIMEOUT", 300.0)
+EXPORT_CHUNK_SIZE = _int_env("EXPORT_CHUNK_SIZE", 64 * 1024)
+EXPORT_QUEUE_CHUNKS = _int_env("EXPORT_QUEUE_CHUNKS", 8)
+
+# Keyset pagination
+PAGE_SIZE_DEFAULT = _int_env("PAGE_SIZE_DEFAULT", 50)
+PAGE_SIZE_MAX = _int_env("PAGE_SIZE_MAX", 1000)
+
+# Where connected WebSocket sessions are tracked: "memory" for a single process, or
+# "postgres" to share them (and forward messages via LISTEN/NOTIFY) across workers and nodes,
+# with each worker's sessions refreshed every heartbeat and dropped after the TTL
+SESSION_REGISTRY_BACKEND = os.getenv("SESSION_REGISTRY_BACKEND", "memory")
+SESSION_REGISTRY_HEARTBEAT_INTERVAL = _float_env("SESSION_REGISTRY_HEARTBEAT_INTERVAL", 10.0)
+SESSION_REGISTRY_TTL = _float_env("SESSION_REGISTRY_TTL", 30.0)
+
+# Live query subscriptions: watermark poll interval, forced re-evaluation interval
+# (picks up deletes) and the largest result a subscription may track
+SUBSCRIPTION_POLL_INTERVAL = _float_env("SUBSCRIPTION_POLL_INTERVAL", 2.0)
+SUBSCRIPTION_RESYNC_INTERVAL = _float_env("SUBSCRIPTION_RESYNC_INTERVAL", 60.0)
+SUBSCRIPTION_MAX_ROWS = _int_env("SUBSCRIPTION_MAX_ROWS", 10_000)
+
+# Seconds between background schema metadata reloads (0 disables)
+SCHEMA_REFRESH_INTERVAL = _float_env("SCHEMA_REFRESH_INTERVAL", 300.0)
+
+# Daily order count rollup: seconds between incremental refreshes (0 disables the rollup),
+# the age beyond which queries go back to the orders table, and the watermark safety lag
+ROLLUP_REFRESH_INTERVAL = _float_env("ROLLUP_REFRESH_INTERVAL", 0.0)
+ROLLUP_MAX_STALENESS = _float_env("ROLLUP_MAX_STALENESS", 300.0)
+ROLLUP_WATERMARK_LAG = _float_env("ROLLUP_WATERMARK_LAG", 5.0)
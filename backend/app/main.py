@@ -1,17 +1,58 @@
 """
 FastAPI application for RewardOps Analytics POC.
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import functools
 import json
+import threading
 import uuid
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Set
 import asyncio
+import logging
+import time
 
+from . import config
+from .services.cache import ResultCache
+from .services.executor import CancelToken, QueryCancelled, QueryTimeout
+from .services.mcp_clients import MCPDatabaseClient
+from .services import metrics, wire
+from .services.metrics import PAYLOAD_BYTES, WEBSOCKET_CONNECTIONS, Timings
+from .services.query_shapes import QueryShapeRegistry
 from .services.react_agent import ReActAgent
+from .services.rollups import ROLLUP_TABLE, RollupManager
+from .services.scheduler import QueryScheduler, SchedulerBusy
+from .services.session_context import SessionContextStore
+from .services.sessions import SessionRegistry, build_session_registry
+from .services.subscriptions import SubscriptionManager
+from .services.warmup import Warmup
 
-app = FastAPI(title="RewardOps Analytics API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+# Warm-up progress of this process, reported by /ready
+warmup = Warmup()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up in the background while serving /health and /ready; release everything on shutdown."""
+    global warmup
+    warmup = Warmup()
+    task = asyncio.create_task(warm_up(warmup))
+    try:
+        yield
+    finally:
+        task.cancel()
+        for result in await asyncio.gather(task, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error("Warm-up failed", exc_info=result)
+        await close_services()
+
+
+app = FastAPI(title="RewardOps Analytics API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -22,16 +63,324 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize ReAct Agent
-react_agent = ReActAgent()
 
-# Store active WebSocket connections
+def build_agent() -> ReActAgent:
+    """Create the ReAct agent with the settings from app.config."""
+    db_client = MCPDatabaseClient(
+        min_pool_size=config.DB_POOL_MIN_SIZE,
+        max_pool_size=config.DB_POOL_MAX_SIZE,
+        max_connection_age=config.DB_POOL_MAX_CONNECTION_AGE,
+        max_prepared_statements=config.DB_PREPARED_STATEMENTS_PER_CONNECTION,
+        export_pool_size=config.EXPORT_MAX_CONCURRENCY,
+    )
+    result_cache = ResultCache(
+        default_ttl=config.RESULT_CACHE_DEFAULT_TTL,
+        table_ttls=config.RESULT_CACHE_TABLE_TTLS,
+        max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+        max_rows=config.RESULT_CACHE_MAX_ROWS,
+    )
+    rollups = None
+    if config.ROLLUP_REFRESH_INTERVAL > 0:
+        rollups = RollupManager(
+            db_client,
+            refresh_interval=config.ROLLUP_REFRESH_INTERVAL,
+            max_staleness=config.ROLLUP_MAX_STALENESS,
+            watermark_lag=config.ROLLUP_WATERMARK_LAG,
+        )
+    scheduler = QueryScheduler(
+        max_concurrency=config.QUERY_MAX_CONCURRENCY,
+        max_running_per_session=config.SCHEDULER_MAX_RUNNING_PER_SESSION,
+        max_queued_per_session=config.SCHEDULER_MAX_QUEUED_PER_SESSION,
+        max_queued=config.SCHEDULER_MAX_QUEUED,
+    )
+    session_context = SessionContextStore(
+        max_sessions=config.SESSION_CONTEXT_MAX_SESSIONS,
+        max_rows=config.SESSION_CONTEXT_MAX_ROWS,
+        max_rows_per_session=config.SESSION_CONTEXT_MAX_ROWS_PER_SESSION,
+        ttl=config.SESSION_CONTEXT_TTL,
+    )
+    query_shapes = QueryShapeRegistry(
+        db_client,
+        slow_threshold=config.QUERY_SHAPES_SLOW_THRESHOLD,
+        explain_interval=config.QUERY_SHAPES_EXPLAIN_INTERVAL,
+        max_shapes=config.QUERY_SHAPES_MAX,
+        explain_timeout=config.QUERY_TIMEOUT or 30.0,
+    )
+    return ReActAgent(
+        db_client=db_client,
+        max_concurrency=config.QUERY_MAX_CONCURRENCY,
+        result_cache=result_cache,
+        plan_memo_size=config.PLAN_MEMO_MAX_ENTRIES,
+        chart_max_points=config.CHART_MAX_POINTS,
+        default_page_size=config.PAGE_SIZE_DEFAULT,
+        max_page_size=config.PAGE_SIZE_MAX,
+        schema_refresh_interval=config.SCHEMA_REFRESH_INTERVAL,
+        query_timeout=config.QUERY_TIMEOUT or None,
+        rollups=rollups,
+        session_context=session_context,
+        scheduler=scheduler,
+        estimate_sample_rows=config.ESTIMATE_SAMPLE_ROWS,
+        query_shapes=query_shapes,
+        export_concurrency=config.EXPORT_MAX_CONCURRENCY,
+    )
+
+
+# The agent and what depends on it are built on first use (normally by the startup warm-up),
+# so importing this module, e.g. from tests or CLI tools, opens no database connections
+_agent: Optional[ReActAgent] = None
+_subscriptions: Optional[SubscriptionManager] = None
+_session_registry: Optional[SessionRegistry] = None
+_services_lock = threading.RLock()
+
+
+def get_agent() -> ReActAgent:
+    """The agent serving this process."""
+    global _agent
+    with _services_lock:
+        if _agent is None:
+            _agent = build_agent()
+        return _agent
+
+
+def use_agent(agent: Optional[ReActAgent]) -> Optional[ReActAgent]:
+    """
+    Serve requests with ``agent`` instead (e.g. a benchmark's), returning the previous one.
+
+    Live subscriptions created earlier keep querying through the agent they were made with.
+    """
+    global _agent
+    with _services_lock:
+        previous, _agent = _agent, agent
+        return previous
+
+
+def get_subscriptions() -> SubscriptionManager:
+    """Live queries pushed to WebSocket subscribers as they change."""
+    global _subscriptions
+    with _services_lock:
+        if _subscriptions is None:
+            agent = get_agent()
+            subscriptions = SubscriptionManager(
+                agent,
+                poll_interval=config.SUBSCRIPTION_POLL_INTERVAL,
+                resync_interval=config.SUBSCRIPTION_RESYNC_INTERVAL,
+                max_rows=config.SUBSCRIPTION_MAX_ROWS,
+            )
+            if agent.rollups is not None:
+                agent.rollups.add_refresh_listener(lambda: subscriptions.mark_changed([ROLLUP_TABLE]))
+            _subscriptions = subscriptions
+        return _subscriptions
+
+
+def get_session_registry() -> SessionRegistry:
+    """Sessions connected to any worker, and delivery of messages to whichever worker holds them."""
+    global _session_registry
+    with _services_lock:
+        if _session_registry is None:
+            _session_registry = build_session_registry(
+                config.SESSION_REGISTRY_BACKEND,
+                get_agent().db_client,
+                heartbeat_interval=config.SESSION_REGISTRY_HEARTBEAT_INTERVAL,
+                session_ttl=config.SESSION_REGISTRY_TTL,
+            )
+            _session_registry.set_deliver(deliver_to_session)
+        return _session_registry
+
+
+# Store active WebSocket connections held by this process
 active_connections: Dict[str, WebSocket] = {}
+WEBSOCKET_CONNECTIONS.set_function(lambda: len(active_connections))
+
+
+async def deliver_to_session(session_id: str, message: Dict[str, Any]) -> None:
+    """Send a published message to a session's socket held by this process."""
+    websocket = active_connections.get(session_id)
+    if websocket is not None:
+        await send_message(websocket, message)
+
+
+# Gauges read from the agent's cache and pool stats at scrape time: (metric, help, stats key)
+CACHE_GAUGES = [
+    ("rewardops_result_cache_entries", "Entries in the query result cache.", "entries"),
+    ("rewardops_result_cache_rows", "Rows held by the query result cache.", "rows"),
+    ("rewardops_result_cache_hit_ratio", "Result cache hit ratio since startup.", "hit_ratio"),
+]
+CACHE_COUNTERS = [
+    ("rewardops_result_cache_hits_total", "Result cache hits.", "hits"),
+    ("rewardops_result_cache_misses_total", "Result cache misses.", "misses"),
+    ("rewardops_result_cache_evictions_total", "Result cache evictions.", "evictions"),
+]
+POOL_GAUGES = [
+    ("rewardops_db_pool_connections", "Open pooled database connections.", "size"),
+    ("rewardops_db_pool_idle", "Idle pooled database connections.", "idle"),
+    ("rewardops_db_pool_in_use", "Borrowed pooled database connections.", "in_use"),
+]
+POOL_COUNTERS = [
+    ("rewardops_db_pool_acquired_total", "Connections borrowed from the pool.", "acquired"),
+    ("rewardops_db_pool_waits_total", "Borrows that had to wait for a free connection.", "waits"),
+    ("rewardops_db_pool_wait_seconds_total", "Time spent waiting for a free connection.", "wait_time_total"),
+]
+STATEMENT_COUNTERS = [
+    ("rewardops_db_statements_prepared_total", "Statements prepared on pooled connections.", "prepared"),
+    ("rewardops_db_statements_reused_total", "Executions that reused a prepared plan.", "reused"),
+]
+COALESCING_GAUGES = [
+    ("rewardops_coalesced_in_flight", "Distinct queries currently executing.", "in_flight"),
+    ("rewardops_coalesced_waiting", "Callers waiting on an identical query already executing.", "waiting"),
+]
+COALESCING_COUNTERS = [
+    ("rewardops_coalesced_executions_total", "Database executions started for uncached queries.", "executions"),
+    ("rewardops_coalesced_shared_total", "Executions saved by sharing an identical in-flight query.", "shared"),
+]
+SCHEDULER_GAUGES = [
+    ("rewardops_scheduler_running", "Queries holding a scheduler slot.", "running"),
+    ("rewardops_scheduler_queued", "Queries waiting for a scheduler slot.", "queued"),
+    ("rewardops_scheduler_sessions_waiting", "Sessions with queries waiting for a slot.", "sessions_waiting"),
+]
+SCHEDULER_COUNTERS = [
+    ("rewardops_scheduler_wait_seconds_total", "Time queries spent waiting for a slot.", "wait_time_total"),
+    ("rewardops_scheduler_rejected_session_total", "Queries refused because their session's queue was full.",
+     "rejected_session"),
+    ("rewardops_scheduler_rejected_global_total", "Queries refused because the service was saturated.",
+     "rejected_global"),
+]
+ROLLUP_GAUGES = [
+    ("rewardops_rollup_available", "Whether count and aggregate queries are answered from the rollup.", "available"),
+    ("rewardops_rollup_age_seconds", "Age of the snapshot the order count rollup reflects.", "age_seconds"),
+]
+
+
+def collect_agent_metrics():
+    """Yield cache, coalescing, scheduler, rollup and pool metric families for the /metrics endpoint."""
+    agent = get_agent()
+    cache = agent.result_cache.stats()
+    coalescing = agent.single_flight.stats()
+    scheduler = agent.scheduler.stats() if agent.scheduler is not None else {}
+    rollups = agent.rollups.stats() if agent.rollups is not None else {}
+    pool = agent.db_client.pool_stats()
+    sources = [
+        (cache, CACHE_GAUGES, "gauge"),
+        (cache, CACHE_COUNTERS, "counter"),
+        (coalescing, COALESCING_GAUGES, "gauge"),
+        (coalescing, COALESCING_COUNTERS, "counter"),
+        (scheduler, SCHEDULER_GAUGES, "gauge"),
+        (scheduler, SCHEDULER_COUNTERS, "counter"),
+        (rollups, ROLLUP_GAUGES, "gauge"),
+        (pool, POOL_GAUGES, "gauge"),
+        (pool, POOL_COUNTERS, "counter"),
+        (pool.get("prepared_statements", {}), STATEMENT_COUNTERS, "counter"),
+    ]
+    for stats, families, kind in sources:
+        for name, documentation, key in families:
+            if stats.get(key) is not None:
+                yield name, kind, documentation, [("", {}, stats[key])]
+
+
+metrics.REGISTRY.register_collector(collect_agent_metrics)
 
 
 class QueryRequest(BaseModel):
     query: str
     session_id: str
+    format: Optional[str] = None
+    chart_width: Optional[int] = None
+    timings: bool = False
+    timeout: Optional[float] = None
+    approximate: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    session_id: str
+    format: Optional[str] = None
+    chart_width: Optional[int] = None
+    timings: bool = False
+    timeout: Optional[float] = None
+
+
+class PageRequest(BaseModel):
+    session_id: str
+    query: Optional[str] = None
+    cursor: Optional[str] = None
+    page_size: Optional[int] = None
+    format: Optional[str] = None
+    timings: bool = False
+    timeout: Optional[float] = None
+
+
+class CacheInvalidationRequest(BaseModel):
+    tables: List[str] = []
+
+
+class RollupRefreshRequest(BaseModel):
+    rebuild: bool = False
+
+
+class SessionMessageRequest(BaseModel):
+    message: Dict[str, Any]
+
+
+class IndexCreationRequest(BaseModel):
+    table: str
+    columns: List[str]
+
+
+# Session the warm-up queries are scheduled under
+WARMUP_SESSION = "warmup"
+
+
+async def build_services() -> None:
+    """Construct the agent and session registry; a failure here is reported by /ready."""
+    get_agent()
+    get_session_registry()
+
+
+async def prime_tile(query: str) -> None:
+    """Run a dashboard tile query so its plan is memoized, its statement prepared and its result cached."""
+    result = await get_agent().process_query_async(query, WARMUP_SESSION, use_context=False)
+    if result.get("error") and result["error"] != "No data found":
+        raise RuntimeError(result["error"])
+
+
+async def start_background_refresh() -> None:
+    agent = get_agent()
+    agent.schema.start_background_refresh()
+    if agent.rollups is not None:
+        agent.rollups.start_background_refresh()
+
+
+async def warm_up(state: Warmup) -> None:
+    """
+    Build the agent and session registry; open the pool, load schema metadata and start
+    the registry concurrently; then run the default dashboard tiles concurrently against
+    the loaded schema, and start the background refreshes.
+    """
+    await state.run([
+        [("services", build_services, True)],
+        [
+            ("connection_pool", lambda: get_agent().executor.run(get_agent().db_client.pool.open), True),
+            # Without metadata, queries fall back to the built-in table defaults
+            ("schema", lambda: get_agent().executor.run(get_agent().refresh_schema), False),
+            ("session_registry", lambda: get_session_registry().start(), True),
+        ],
+        [(f"tile:{query}", functools.partial(prime_tile, query), False) for query in config.WARMUP_QUERIES]
+        + [("background_refresh", start_background_refresh, False)],
+    ])
+
+
+async def close_services() -> None:
+    """Stop subscriptions, the session registry and query workers, and close pooled connections."""
+    global _agent, _subscriptions, _session_registry
+    with _services_lock:
+        agent, subscriptions, registry = _agent, _subscriptions, _session_registry
+        # Anything used after shutdown (e.g. by the next test client) is built afresh
+        _agent = _subscriptions = _session_registry = None
+    if subscriptions is not None:
+        await subscriptions.close()
+    if registry is not None:
+        await registry.close()
+    if agent is not None:
+        agent.close()
 
 
 @app.get("/health")
@@ -40,75 +389,528 @@ async def health_check():
     return {"status": "healthy", "service": "RewardOps Analytics API"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup warm-up has finished and its required steps succeeded."""
+    return JSONResponse(warmup.to_dict(), status_code=200 if warmup.ready else 503)
+
+
+def encode_response(payload: Dict[str, Any], fmt: str, transport: str, timings: Timings):
+    """Encode a response payload, recording encode time and payload size."""
+    with timings.stage("encode"):
+        encoded = wire.encode(payload, fmt)
+    PAYLOAD_BYTES.observe(len(encoded), transport=transport, format=fmt)
+    return encoded
+
+
+def timed_response(result: Dict[str, Any], fmt: str, timings: Timings, include_timings: bool) -> Response:
+    """Build an HTTP response carrying stage durations in a Server-Timing header."""
+    if include_timings:
+        # Encoding happens after this point, so it only appears in the header
+        result["timings"] = timings.to_dict()
+    content = encode_response({"success": True, "data": result}, fmt, "http", timings)
+    return Response(content=content, media_type=wire.MEDIA_TYPES[fmt],
+                    headers={"Server-Timing": timings.server_timing()})
+
+
+def busy_error(error: SchedulerBusy) -> HTTPException:
+    """429 when the caller's own queue is full, 503 when the whole service is saturated."""
+    return HTTPException(status_code=429 if error.scope == "session" else 503, detail=str(error),
+                         headers={"Retry-After": str(max(1, round(error.retry_after)))})
+
+
+def query_deadline(timeout: Optional[float] = None) -> CancelToken:
+    """Cancel token for one query; clients may shorten the server's deadline but not extend it."""
+    limit = get_agent().query_timeout
+    if timeout and timeout > 0:
+        limit = min(timeout, limit) if limit else timeout
+    return CancelToken(limit)
+
+
+async def send_message(websocket: WebSocket, payload: Dict[str, Any], fmt: str = wire.JSON,
+                       timings: Optional[Timings] = None) -> None:
+    """Send a message to a WebSocket client in the negotiated wire format."""
+    encoded = encode_response(payload, fmt, "ws", timings or Timings())
+    if isinstance(encoded, bytes):
+        await websocket.send_bytes(encoded)
+    else:
+        await websocket.send_text(encoded)
+
+
 @app.post("/api/query")
-async def query_analytics(request: QueryRequest):
-    """Process analytics query via HTTP."""
+async def query_analytics(request: QueryRequest, accept: Optional[str] = Header(default=None)):
+    """Process analytics query via HTTP, encoded per the request format or Accept header."""
+    fmt = wire.negotiate_format(request.format, accept)
+    timings = Timings()
+    try:
+        result = await get_agent().process_query_async(request.query, request.session_id,
+                                                       chart_width=request.chart_width, timings=timings,
+                                                       cancel_token=query_deadline(request.timeout),
+                                                       approximate=request.approximate)
+        return timed_response(result, fmt, timings, request.timings)
+    except SchedulerBusy as e:
+        raise busy_error(e)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/query/page")
+async def query_page(request: PageRequest, accept: Optional[str] = Header(default=None)):
+    """
+    Fetch one keyset-paginated page of results.
+
+    Send ``query`` for the first page, then the returned ``next_cursor`` for the next one.
+    """
+    fmt = wire.negotiate_format(request.format, accept)
+    timings = Timings()
+    try:
+        result = await get_agent().paginate_async(request.session_id, request.query,
+                                                  request.cursor, request.page_size, timings,
+                                                  query_deadline(request.timeout))
+        return timed_response(result, fmt, timings, request.timings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SchedulerBusy as e:
+        raise busy_error(e)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/export")
+async def export_query(query: str, gzip: bool = False, timeout: Optional[float] = None):
+    """
+    Download every row behind a query as CSV, streamed from ``COPY ... TO STDOUT``.
+
+    Unlike /api/query, there is no default row limit: only a count the query
+    names ("export 100 paid orders") applies, so "export paid orders" exports
+    them all. ``gzip`` compresses the file.
+    """
+    limit = config.EXPORT_TIMEOUT or None
+    if timeout and timeout > 0:
+        limit = min(timeout, limit) if limit else timeout
+    cancel_token = CancelToken(limit)
     try:
-        result = react_agent.process_query(request.query, request.session_id)
-        return {"success": True, "data": result}
+        chunks = get_agent().export_csv(query, gzip, cancel_token, config.EXPORT_CHUNK_SIZE,
+                                        config.EXPORT_QUEUE_CHUNKS)
+    except SchedulerBusy as e:
+        raise busy_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    filename = "export.csv.gz" if gzip else "export.csv"
+    return StreamingResponse(chunks, media_type="application/gzip" if gzip else "text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def batch_size_error(queries: List[str]) -> Optional[str]:
+    """Reason a batch is rejected, or None if its size is acceptable."""
+    if not queries:
+        return "A batch needs at least one query"
+    if len(queries) > config.QUERY_BATCH_MAX_SIZE:
+        return f"A batch may hold at most {config.QUERY_BATCH_MAX_SIZE} queries"
+    return None
+
+
+async def batch_events(queries: List[str], session_id: str, chart_width: Optional[int],
+                       include_timings: bool, cancel_token: CancelToken):
+    """Yield ``(event, timings)`` per query position as results finish, then a completion event."""
+    started = time.perf_counter()
+    async for indexes, result, timings in get_agent().process_batch_async(
+            queries, session_id, chart_width, cancel_token):
+        if include_timings:
+            result["timings"] = timings.to_dict()
+        for index in indexes:
+            yield {"type": "batch_result", "index": index, "query": queries[index], "data": result}, timings
+    yield {"type": "batch_complete", "count": len(queries),
+           "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}, Timings()
+
+
+@app.post("/api/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """
+    Process many queries concurrently, streaming results as NDJSON as each one finishes.
+
+    Every line is a ``batch_result`` with the query's ``index``; a final
+    ``batch_complete`` line follows the last result.
+    """
+    error = batch_size_error(request.queries)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    # Lines are JSON text, so MessagePack falls back to columnar JSON
+    fmt = wire.negotiate_format(request.format)
+    fmt = wire.COLUMNAR if wire.is_binary(fmt) else fmt
+    cancel_token = query_deadline(request.timeout)
+
+    async def lines():
+        try:
+            async for event, timings in batch_events(request.queries, request.session_id,
+                                                     request.chart_width, request.timings, cancel_token):
+                yield encode_response(event, fmt, "http", timings) + "\n"
+        finally:
+            # Stops any remaining queries if the client goes away mid-stream
+            cancel_token.cancel("disconnected")
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def run_websocket_query(websocket: WebSocket, session_id: str, message: Dict[str, Any],
+                              cancel_token: CancelToken) -> None:
+    """Answer one WebSocket query message, or report that it was cancelled."""
+    agent = get_agent()
+    query = message.get("query", "")
+    fmt = wire.negotiate_format(message.get("format"))
+
+    try:
+        # Send processing status
+        await send_message(websocket, {
+            "type": "status",
+            "message": "Processing your query..."
+        }, fmt)
+
+        try:
+            if message.get("stream"):
+                # Stream rows in batches, then a summary without the rows
+                batch_size = int(message.get("batch_size") or config.STREAM_BATCH_SIZE)
+                async for event in agent.stream_query_async(query, session_id, batch_size, cancel_token):
+                    await send_message(websocket, event, fmt)
+            else:
+                chart_width = int(message.get("chart_width") or 0) or None
+                if message.get("approximate"):
+                    # Send an estimate straight away; the exact figure follows only if asked for
+                    timings = Timings()
+                    result = await agent.process_query_async(
+                        query, session_id, chart_width=chart_width, timings=timings,
+                        cancel_token=cancel_token, approximate=True)
+                    cancel_token.check()
+                    estimated = "estimate" in result
+                    if message.get("timings"):
+                        result["timings"] = timings.to_dict()
+                    await send_message(websocket, {
+                        "type": "estimate" if estimated else "result",
+                        "query_id": message.get("query_id"),
+                        "data": result
+                    }, fmt, timings)
+                    if not estimated or not message.get("exact"):
+                        return
+
+                # Process query with ReAct agent off the event loop
+                timings = Timings()
+                result = await agent.process_query_async(
+                    query, session_id, chart_width=chart_width, timings=timings, cancel_token=cancel_token)
+                # A result that finished just as it was superseded is no longer wanted
+                cancel_token.check()
+                if message.get("timings"):
+                    result["timings"] = timings.to_dict()
+
+                # Send result to client; after an estimate, query_id says which one it refines
+                await send_message(websocket, {
+                    "type": "result",
+                    "query_id": message.get("query_id"),
+                    "data": result
+                }, fmt, timings)
+
+        except QueryCancelled:
+            await send_message(websocket, {
+                "type": "cancelled",
+                "query": query,
+                "query_id": message.get("query_id"),
+                "reason": cancel_token.reason,
+            }, fmt)
+        except SchedulerBusy as e:
+            await send_message(websocket, {
+                "type": "busy",
+                "query": query,
+                "query_id": message.get("query_id"),
+                "scope": e.scope,
+                "retry_after": e.retry_after,
+                "message": str(e),
+            }, fmt)
+        except Exception as e:
+            # Send error to client
+            await send_message(websocket, {
+                "type": "error",
+                "message": str(e)
+            }, fmt)
+    except Exception as e:
+        # The socket went away while we were replying
+        logger.debug("Could not reply to session %s: %s", session_id, e)
+
+
+async def run_websocket_batch(websocket: WebSocket, session_id: str, message: Dict[str, Any],
+                              cancel_token: CancelToken) -> None:
+    """Answer a WebSocket batch message with one ``batch_result`` per query as each finishes."""
+    queries = message.get("queries") or []
+    fmt = wire.negotiate_format(message.get("format"))
+
+    try:
+        error = batch_size_error(queries)
+        if error:
+            await send_message(websocket, {"type": "error", "message": error}, fmt)
+            return
+
+        await send_message(websocket, {
+            "type": "status",
+            "message": f"Processing {len(queries)} queries..."
+        }, fmt)
+
+        try:
+            chart_width = int(message.get("chart_width") or 0) or None
+            async for event, timings in batch_events(queries, session_id, chart_width,
+                                                     bool(message.get("timings")), cancel_token):
+                cancel_token.check()
+                event["batch_id"] = message.get("batch_id")
+                await send_message(websocket, event, fmt, timings)
+        except QueryCancelled:
+            await send_message(websocket, {
+                "type": "cancelled",
+                "batch_id": message.get("batch_id"),
+                "reason": cancel_token.reason,
+            }, fmt)
+        except Exception as e:
+            await send_message(websocket, {
+                "type": "error",
+                "message": str(e)
+            }, fmt)
+    except Exception as e:
+        # The socket went away while we were replying
+        logger.debug("Could not reply to session %s: %s", session_id, e)
+
+
+async def run_websocket_subscription(websocket: WebSocket, session_id: str, message: Dict[str, Any]) -> None:
+    """Register a live query and send its snapshot; deltas follow as the data changes."""
+    fmt = wire.negotiate_format(message.get("format"))
+    subscription_id = str(message.get("subscription_id") or uuid.uuid4())
+
+    async def push(payload: Dict[str, Any]) -> None:
+        await send_message(websocket, payload, fmt)
+
+    try:
+        snapshot = await get_subscriptions().subscribe(session_id, subscription_id, message.get("query", ""), push)
+        await push(snapshot)
+    except Exception as e:
+        try:
+            await send_message(websocket, {
+                "type": "error",
+                "subscription_id": subscription_id,
+                "message": str(e)
+            }, fmt)
+        except Exception as send_error:
+            logger.debug("Could not reply to session %s: %s", session_id, send_error)
+
 
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for real-time analytics queries."""
+    """
+    WebSocket endpoint for real-time analytics queries.
+
+    Each query or batch runs as a task so the socket keeps listening: a newer
+    one (or a ``cancel`` message) cancels the one in flight, and so does
+    disconnecting.
+    """
     await websocket.accept()
     active_connections[session_id] = websocket
-    
+    try:
+        await get_session_registry().register(session_id)
+    except Exception as e:
+        logger.warning("Could not register session %s: %s", session_id, e)
+    running: Optional[asyncio.Task] = None
+    running_token: Optional[CancelToken] = None
+    background: Set[asyncio.Task] = set()
+
     try:
         while True:
             # Receive query from client
             data = await websocket.receive_text()
             message = json.loads(data)
-            
-            if message.get("type") == "query":
-                query = message.get("query", "")
-                
-                # Send processing status
-                await websocket.send_text(json.dumps({
-                    "type": "status",
-                    "message": "Processing your query..."
-                }))
-                
-                try:
-                    # Process query with ReAct agent
-                    result = react_agent.process_query(query, session_id)
-                    
-                    # Send result to client
-                    await websocket.send_text(json.dumps({
-                        "type": "result",
-                        "data": result
-                    }))
-                    
-                except Exception as e:
-                    # Send error to client
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": str(e)
-                    }))
-            
+
+            kind = message.get("type")
+            if kind in ("query", "batch", "cancel") and running is not None and not running.done():
+                # The task reports the cancellation to the client itself
+                running_token.cancel("cancelled by client" if kind == "cancel" else "superseded")
+
+            if kind in ("query", "batch"):
+                handler = run_websocket_query if kind == "query" else run_websocket_batch
+                running_token = query_deadline(message.get("timeout"))
+                running = asyncio.create_task(handler(websocket, session_id, message, running_token))
+            elif kind == "subscribe":
+                # Subscriptions live alongside queries rather than superseding them
+                task = asyncio.create_task(run_websocket_subscription(websocket, session_id, message))
+                background.add(task)
+                task.add_done_callback(background.discard)
+            elif kind == "unsubscribe":
+                removed = await get_subscriptions().unsubscribe(session_id, str(message.get("subscription_id")))
+                await send_message(websocket, {"type": "unsubscribed",
+                                               "subscription_id": message.get("subscription_id"),
+                                               "removed": removed})
+
     except WebSocketDisconnect:
-        # Remove connection when client disconnects
-        if session_id in active_connections:
-            del active_connections[session_id]
+        pass
     except Exception as e:
-        print(f"WebSocket error: {e}")
-        if session_id in active_connections:
+        logger.warning("WebSocket error for session %s: %s", session_id, e)
+    finally:
+        # Remove connection, stop its query and drop its remembered results when the client disconnects
+        if running is not None and not running.done():
+            running_token.cancel("disconnected")
+            running.cancel()
+        for task in background:
+            task.cancel()
+        if active_connections.get(session_id) is websocket:
             del active_connections[session_id]
+            get_agent().session_context.forget(session_id)
+            if _subscriptions is not None:
+                await _subscriptions.unsubscribe_session(session_id)
+            try:
+                await get_session_registry().unregister(session_id)
+            except Exception as e:
+                logger.warning("Could not unregister session %s: %s", session_id, e)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose stage latencies, DB timings, payload sizes and cache/pool gauges for Prometheus."""
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/sessions")
+async def get_sessions():
+    """Get connected session counts across all workers, and this worker's registry statistics."""
+    registry = get_session_registry()
+    return {**registry.stats(), "connection_count": await registry.connection_count()}
 
 
 @app.get("/api/sessions/{session_id}/status")
 async def get_session_status(session_id: str):
-    """Get status of a WebSocket session."""
-    is_connected = session_id in active_connections
+    """Get status of a WebSocket session, which may be connected to any worker."""
+    context = get_agent().session_context.recall(session_id)
+    registry = get_session_registry()
     return {
         "session_id": session_id,
-        "connected": is_connected,
-        "connection_count": len(active_connections)
+        "connected": await registry.is_connected(session_id),
+        "connection_count": await registry.connection_count(),
+        "context": {"query": context.analysis["original_query"], "rows": context.rows} if context else None,
     }
 
 
+@app.post("/api/sessions/{session_id}/messages")
+async def send_session_message(session_id: str, request: SessionMessageRequest):
+    """Push a message to a connected session, routed to whichever worker holds its socket."""
+    try:
+        delivered = await get_session_registry().publish(session_id, request.message)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not delivered:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} is not connected")
+    return {"success": True, "session_id": session_id}
+
+
+@app.get("/api/pool/stats")
+async def get_pool_stats():
+    """Get database connection pool statistics."""
+    return get_agent().db_client.pool_stats()
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get query result cache statistics, plus coalescing of identical in-flight queries."""
+    agent = get_agent()
+    return {**agent.result_cache.stats(), "coalescing": agent.single_flight.stats()}
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidationRequest):
+    """Invalidate cached results for the given tables, or everything if none are given."""
+    agent = get_agent()
+    if request.tables:
+        removed = agent.result_cache.invalidate(request.tables)
+    else:
+        removed = agent.result_cache.stats()["entries"]
+        agent.result_cache.clear()
+    return {"invalidated": removed, "tables": request.tables}
+
+
+@app.get("/api/scheduler")
+async def get_scheduler_stats():
+    """Get query scheduler statistics: running and queued queries, waits and rejections."""
+    agent = get_agent()
+    if agent.scheduler is None:
+        raise HTTPException(status_code=404, detail="Query scheduling is disabled")
+    return agent.scheduler.stats()
+
+
+@app.get("/api/query-shapes")
+async def get_query_shapes(limit: int = 10, sort: str = "total_ms"):
+    """List the most expensive query shapes with their latency, captured plans and suggested indexes."""
+    agent = get_agent()
+    try:
+        shapes = agent.slow_query_report(limit, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**agent.query_shapes.stats(), "shapes": shapes}
+
+
+@app.post("/api/query-shapes/indexes")
+async def create_suggested_index(request: IndexCreationRequest):
+    """Build an index (CREATE INDEX CONCURRENTLY); disabled unless QUERY_SHAPES_ALLOW_INDEX_CREATION=1."""
+    if not config.QUERY_SHAPES_ALLOW_INDEX_CREATION:
+        raise HTTPException(status_code=403, detail="Index creation is disabled")
+    try:
+        # Not on the query executor: building an index can take far longer than any query
+        ddl = await asyncio.to_thread(get_agent().create_index, request.table, request.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"created": True, "ddl": ddl}
+
+
+@app.get("/api/rollups")
+async def get_rollups():
+    """Get the state and freshness of the order count rollup."""
+    agent = get_agent()
+    if agent.rollups is None:
+        return {"enabled": False}
+    return {"enabled": True, **agent.rollups.stats()}
+
+
+@app.post("/api/rollups/refresh")
+async def refresh_rollups(request: RollupRefreshRequest):
+    """Apply order changes since the last refresh, or rebuild the rollup from scratch."""
+    agent = get_agent()
+    if agent.rollups is None:
+        raise HTTPException(status_code=404, detail="Rollups are disabled (set ROLLUP_REFRESH_INTERVAL)")
+    try:
+        days = await agent.executor.run(agent.rollups.refresh, request.rebuild)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Rollup refresh failed: {e}")
+    return {"refreshed": True, "backfilled": days < 0, "days_recomputed": max(days, 0),
+            **agent.rollups.freshness()}
+
+
+@app.get("/api/subscriptions")
+async def get_subscription_stats():
+    """Get live query subscription statistics."""
+    return get_subscriptions().stats()
+
+
+@app.get("/api/schema")
+async def get_schema():
+    """Get the cached schema metadata used for SQL generation."""
+    return get_agent().schema.to_dict()
+
+
+@app.post("/api/schema/refresh")
+async def refresh_schema():
+    """Reload schema metadata from the database."""
+    agent = get_agent()
+    try:
+        changed = await agent.executor.run(agent.refresh_schema)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Schema refresh failed: {e}")
+    return {"refreshed": True, "changed": changed, "loaded_at": agent.schema.loaded_at}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
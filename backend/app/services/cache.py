@@ -0,0 +1,156 @@
+"""
+In-memory result cache for generated SQL queries.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from .results import QueryResult
+
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_WHITESPACE = re.compile(r"\s+")
+_TABLE_REFERENCE = re.compile(r"\b(?:from|join)\s+([a-zA-Z_][\w.]*)", re.IGNORECASE)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapse insignificant whitespace so equivalent SQL maps to one key."""
+    parts = _STRING_LITERAL.split(sql_query.strip().rstrip(";").strip())
+    # Odd indexes are string literals, which must be kept verbatim
+    return "".join(
+        part if i % 2 else _WHITESPACE.sub(" ", part)
+        for i, part in enumerate(parts)
+    ).strip()
+
+
+def referenced_tables(sql_query: str) -> Set[str]:
+    """Return the lower-cased table names referenced in FROM/JOIN clauses."""
+    return {name.lower().split(".")[-1] for name in _TABLE_REFERENCE.findall(sql_query)}
+
+
+class _CacheEntry:
+    __slots__ = ("results", "tables", "expires_at", "rows")
+
+    def __init__(self, results: QueryResult, tables: Set[str], expires_at: float):
+        self.results = results
+        self.tables = tables
+        self.expires_at = expires_at
+        self.rows = len(results)
+
+
+class ResultCache:
+    """
+    LRU cache of query results keyed on normalized SQL text plus bound parameters.
+
+    Each entry expires after the shortest TTL of the tables it reads, and
+    entries can be dropped explicitly by table name when data changes.
+    """
+
+    def __init__(self, default_ttl: float = 30.0, table_ttls: Optional[Dict[str, float]] = None,
+                 max_entries: int = 256, max_rows: int = 100_000):
+        self.default_ttl = default_ttl
+        self.table_ttls = {name.lower(): ttl for name, ttl in (table_ttls or {}).items()}
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+
+        self._entries: "OrderedDict[Tuple[str, Tuple[Any, ...]], _CacheEntry]" = OrderedDict()
+        self._by_table: Dict[str, Set[Tuple[str, Tuple[Any, ...]]]] = {}
+        self._rows = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, sql_query: str, params: Sequence[Any] = ()) -> Optional[QueryResult]:
+        """Return cached results for ``sql_query`` with ``params``, or None on a miss."""
+        key = (normalize_sql(sql_query), tuple(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.results
+
+    def set(self, sql_query: str, results: QueryResult, params: Sequence[Any] = ()) -> None:
+        """Store results for ``sql_query`` with ``params`` subject to the TTL and size bounds."""
+        if results is None or len(results) > self.max_rows:
+            return
+
+        key = (normalize_sql(sql_query), tuple(params))
+        tables = referenced_tables(key[0])
+        ttl = self._ttl_for(tables)
+        if ttl <= 0:
+            return
+
+        entry = _CacheEntry(results, tables, time.monotonic() + ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = entry
+            self._rows += entry.rows
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tables: Iterable[str]) -> int:
+        """Drop every entry that reads any of ``tables``; returns the count removed."""
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+            self._rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "max_entries": self.max_entries,
+                "max_rows": self.max_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _ttl_for(self, tables: Set[str]) -> float:
+        ttls = [self.table_ttls[table] for table in tables if table in self.table_ttls]
+        return min(ttls) if ttls else self.default_ttl
+
+    def _remove(self, key: Tuple[str, Tuple[Any, ...]]) -> None:
+        entry = self._entries.pop(key)
+        self._rows -= entry.rows
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
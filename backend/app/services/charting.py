@@ -0,0 +1,111 @@
+"""
+Helpers for keeping chart payloads proportional to chart width rather than table size.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Sequence, Tuple
+
+# date_trunc units, finest first, with their length in seconds
+TIME_BUCKETS: List[Tuple[str, int]] = [
+    ("minute", 60),
+    ("hour", 3600),
+    ("day", 86400),
+    ("week", 7 * 86400),
+]
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Convert an ISO timestamp string (or datetime) to epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def choose_time_bucket(start: float, end: float, max_points: int) -> str:
+    """Pick the finest date_trunc unit that yields at most ``max_points`` buckets."""
+    span = max(end - start, 0)
+    for unit, seconds in TIME_BUCKETS:
+        if span / seconds < max_points:
+            return unit
+    return TIME_BUCKETS[-1][0]
+
+
+def truncate_timestamp(value: datetime, unit: str) -> datetime:
+    """In-memory date_trunc for the units in TIME_BUCKETS (weeks start on Monday, as in Postgres)."""
+    if unit == "minute":
+        return value.replace(second=0, microsecond=0)
+    if unit == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_counts(values: Sequence[Any], unit: str) -> List[List[Any]]:
+    """``[bucket, count]`` rows, oldest first, for timestamps (ISO strings or datetimes) already fetched."""
+    counts: Counter = Counter()
+    for value in values:
+        if value is None:
+            continue
+        try:
+            moment = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+        except ValueError:
+            continue
+        counts[truncate_timestamp(moment, unit)] += 1
+    return [[bucket.isoformat(), count] for bucket, count in sorted(counts.items())]
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most ``threshold`` points that preserve the
+    visual shape of the series, always keeping the first and last point.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return stride_indices(n, threshold)
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = max(next_end - next_start, 1)
+        avg_x = sum(xs[next_start:next_end]) / count if next_end > next_start else xs[-1]
+        avg_y = sum(ys[next_start:next_end]) / count if next_end > next_start else ys[-1]
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+
+def stride_indices(n: int, threshold: int) -> List[int]:
+    """Evenly spaced indices, used when the series has no numeric y values."""
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 2:
+        return [0][:threshold]
+    step = (n - 1) / (threshold - 1)
+    return [round(i * step) for i in range(threshold)]
@@ -0,0 +1,127 @@
+"""
+Approximate counts from planner statistics and block samples, with error bounds.
+"""
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .executor import CancelToken
+from .results import ColumnarResult
+
+# Row count from the last VACUUM/ANALYZE, and how many rows changed since then
+TABLE_STATS_SQL = """
+SELECT c.reltuples::bigint AS reltuples, COALESCE(s.n_mod_since_analyze, 0) AS modified,
+       GREATEST(s.last_analyze, s.last_autoanalyze, s.last_vacuum, s.last_autovacuum) AS analyzed_at
+FROM pg_class c LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.oid = to_regclass(%s)
+"""
+
+# Measures reported by aggregate questions, as (column, extra condition)
+AGGREGATE_MEASURES = {
+    "orders": [
+        ("total_orders", None),
+        ("paid_orders", "payment_status = 'PAID'"),
+        ("fulfilled_orders", "fulfillment_status = 'FULFILLED'"),
+    ],
+}
+COUNT_MEASURES = [("total_count", None)]
+
+
+class CountEstimator:
+    """
+    Estimates ``count`` and ``aggregate`` answers without scanning the table.
+
+    Unfiltered counts come from ``pg_class.reltuples``, bounded by the rows
+    modified since the table was last analyzed. Filtered counts read a
+    ``TABLESAMPLE SYSTEM`` block sample sized to about ``target_sample_rows``
+    and scale the matching fraction up to ``reltuples``. Because whole pages
+    are sampled, the error bound treats each page as one observation (a
+    cluster sample), so rows clustered by the filter widen the interval
+    rather than understate it. Tables with fewer than ``target_sample_rows``
+    rows are cheap to count exactly, so no estimate is made for them.
+    """
+
+    def __init__(self, db_client, target_sample_rows: int = 10_000, z: float = 1.96):
+        self.db_client = db_client
+        self.target_sample_rows = target_sample_rows
+        # 1.96 standard errors: a 95% confidence interval
+        self.z = z
+
+    def measures(self, table: str, query_type: str) -> List[Tuple[str, Optional[str]]]:
+        """Result columns of a count or aggregate question, with the condition each one counts."""
+        if query_type == "aggregate":
+            return AGGREGATE_MEASURES.get(table, COUNT_MEASURES)
+        return COUNT_MEASURES
+
+    def estimate(self, table: str, query_type: str, conditions: Sequence[str], params: Sequence[Any],
+                 cancel_token: Optional[CancelToken] = None) -> Optional[Tuple[ColumnarResult, Dict[str, Any]]]:
+        """
+        Return ``(rows, estimate)`` shaped like the exact answer, or None if it should be counted exactly.
+
+        ``conditions`` are the question's WHERE conditions, with ``params`` their values.
+        """
+        stats = self.db_client.execute_columnar(TABLE_STATS_SQL, (table,), cancel_token=cancel_token)
+        if not stats or stats.column("reltuples")[0] < self.target_sample_rows:
+            return None
+        total = stats.column("reltuples")[0]
+        modified = stats.column("modified")[0]
+        analyzed_at = stats.column("analyzed_at")[0]
+
+        measures = self.measures(table, query_type)
+        info: Dict[str, Any] = {
+            "total_rows": total,
+            "analyzed_at": analyzed_at,
+            "confidence": round(math.erf(self.z / math.sqrt(2)), 4),
+        }
+        if not conditions and all(condition is None for _, condition in measures):
+            # Every measure is the table's row count
+            low, high = max(total - modified, 0), total + modified
+            info.update(method="reltuples", bounds={column: [low, high] for column, _ in measures})
+            return ColumnarResult.from_rows([column for column, _ in measures], [[total] * len(measures)]), info
+
+        percent = min(100.0, 100.0 * self.target_sample_rows / total)
+        sql, sql_params = self._sample_sql(table, measures, conditions, params, percent)
+        pages = self.db_client.execute_columnar(sql, sql_params, cancel_token=cancel_token)
+
+        values, bounds = [], {}
+        sample_rows = sum(pages.column("n"))
+        for index, (column, _) in enumerate(measures):
+            value, low, high = self._scale(pages.column("n"), pages.column(f"m{index}"), total)
+            values.append(value)
+            bounds[column] = [low, high]
+        info.update(method="tablesample", sample_percent=round(percent, 4), sample_rows=sample_rows,
+                    sample_pages=len(pages), bounds=bounds)
+        return ColumnarResult.from_rows([column for column, _ in measures], [values]), info
+
+    @staticmethod
+    def _sample_sql(table: str, measures: List[Tuple[str, Optional[str]]], conditions: Sequence[str],
+                    params: Sequence[Any], percent: float) -> Tuple[str, List[Any]]:
+        """Per-page row counts and matching counts for each measure, over a block sample."""
+        columns, sql_params = [], []
+        for index, (_, extra) in enumerate(measures):
+            predicate = list(conditions) + ([extra] if extra else [])
+            if predicate:
+                columns.append(f"count(*) FILTER (WHERE {' AND '.join(predicate)}) AS m{index}")
+                sql_params.extend(params)
+            else:
+                columns.append(f"count(*) AS m{index}")
+        sql = (f"SELECT count(*) AS n, {', '.join(columns)} FROM {table} TABLESAMPLE SYSTEM (%s) "
+               f"GROUP BY (ctid::text::point)[0]")
+        # The sample percentage comes after the FILTER parameters in the statement text
+        return sql, sql_params + [percent]
+
+    def _scale(self, page_rows: List[int], page_matches: List[int], total: int) -> Tuple[int, int, int]:
+        """Ratio estimate of matching rows out of ``total``, with a confidence interval."""
+        pages = len(page_rows)
+        sampled = sum(page_rows)
+        if not sampled:
+            return 0, 0, total
+        ratio = sum(page_matches) / sampled
+        if pages > 1:
+            mean_rows = sampled / pages
+            residuals = sum((m - ratio * n) ** 2 for n, m in zip(page_rows, page_matches))
+            stderr = math.sqrt(residuals / (pages - 1) / pages) / mean_rows
+        else:
+            stderr = math.sqrt(ratio * (1 - ratio) / sampled)
+        low = max(0.0, ratio - self.z * stderr)
+        high = min(1.0, ratio + self.z * stderr)
+        return round(ratio * total), math.floor(low * total), math.ceil(high * total)
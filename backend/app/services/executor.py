@@ -0,0 +1,124 @@
+"""
+Bounded executor for running blocking agent work off the event loop.
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+
+class QueryCancelled(Exception):
+    """Raised when a query is cancelled before it completes."""
+
+
+class QueryTimeout(Exception):
+    """Raised when a query runs past its deadline."""
+
+
+class CancelToken:
+    """
+    Deadline and cancellation flag shared by every stage of one query.
+
+    Database calls attach a hook (such as the driver's cancel) while they run,
+    so ``cancel()`` from another thread interrupts the statement in flight.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._hooks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Flag the query as cancelled and interrupt any attached work."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            hooks = list(self._hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                pass
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without one."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check(self) -> None:
+        """Raise QueryCancelled or QueryTimeout if the query should stop."""
+        if self.reason is not None:
+            raise QueryCancelled(f"Query cancelled: {self.reason}")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise QueryTimeout(f"Query timed out after {self.timeout:g}s")
+
+    @contextmanager
+    def attach(self, hook: Callable[[], Any]) -> Iterator[None]:
+        """Call ``hook`` if the query is cancelled while the ``with`` block runs."""
+        with self._lock:
+            cancelled = self.reason is not None
+            if not cancelled:
+                self._hooks.append(hook)
+        if cancelled:
+            self.check()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if hook in self._hooks:
+                    self._hooks.remove(hook)
+
+
+class QueryExecutor:
+    """Runs synchronous query processing on a bounded thread pool."""
+
+    def __init__(self, max_concurrency: int = 10):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.max_concurrency = max_concurrency
+        # Worker threads are started on demand, so creating the executor is cheap
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="query-worker",
+        )
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``func`` in a worker thread and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def run_cancellable(self, cancel_token: CancelToken, func: Callable[..., Any],
+                              *args: Any, grace: float = 1.0, **kwargs: Any) -> Any:
+        """
+        Run ``func`` like ``run``, but stop waiting once ``cancel_token``'s deadline
+        (plus ``grace``) passes, and cancel the token if the caller is cancelled.
+
+        The database enforces the deadline itself; this is the client-side backstop.
+        """
+        remaining = cancel_token.remaining()
+        try:
+            return await asyncio.wait_for(self.run(func, *args, **kwargs),
+                                          None if remaining is None else max(remaining, 0) + grace)
+        except asyncio.TimeoutError:
+            cancel_token.cancel("timeout")
+            raise QueryTimeout(f"Query timed out after {cancel_token.timeout:g}s")
+        except asyncio.CancelledError:
+            cancel_token.cancel("aborted")
+            raise
+
+    def shutdown(self) -> None:
+        """Stop accepting work and drop anything still queued."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
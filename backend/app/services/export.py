@@ -0,0 +1,99 @@
+"""
+Bulk CSV export: ``COPY ... TO STDOUT`` output streamed to the client in bounded chunks.
+"""
+import asyncio
+import zlib
+from typing import AsyncIterator, Callable
+
+from .executor import CancelToken, QueryExecutor
+
+
+class ChunkWriter:
+    """
+    File-like sink for COPY output on a worker thread.
+
+    Rows are gathered into ``chunk_size`` chunks (gzip-compressed when
+    ``compress`` is set) and put on an event loop queue; a full queue blocks
+    the writer, so a slow client slows the COPY instead of growing memory.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, cancel_token: CancelToken,
+                 chunk_size: int = 64 * 1024, compress: bool = False):
+        self.loop = loop
+        self.queue = queue
+        self.cancel_token = cancel_token
+        self.chunk_size = chunk_size
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self._buffer = bytearray()
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+        return len(data)
+
+    def flush(self) -> None:
+        """Send any buffered rows, and the gzip trailer, once COPY has finished."""
+        self._flush(final=True)
+
+    def finish(self) -> None:
+        """Mark the end of the stream, whether or not COPY succeeded."""
+        asyncio.run_coroutine_threadsafe(self.queue.put(None), self.loop).result()
+
+    def _flush(self, final: bool = False) -> None:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        if self._compressor is not None:
+            chunk = self._compressor.compress(chunk)
+            if final:
+                chunk += self._compressor.flush()
+        if chunk:
+            self.bytes_written += len(chunk)
+            self._put(chunk)
+
+    def _put(self, chunk: bytes) -> None:
+        self.cancel_token.check()
+        asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop).result()
+
+
+async def stream_copy(executor: QueryExecutor, copy: Callable[[ChunkWriter], int], cancel_token: CancelToken,
+                      compress: bool = False, chunk_size: int = 64 * 1024,
+                      queue_size: int = 8) -> AsyncIterator[bytes]:
+    """
+    Run ``copy`` (which writes COPY output to the given writer) on ``executor``
+    and yield its chunks as they are produced.
+
+    At most ``queue_size`` chunks wait for the client. Closing the iterator
+    early cancels ``cancel_token``, which aborts the COPY on the server.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    writer = ChunkWriter(loop, queue, cancel_token, chunk_size, compress)
+
+    def run() -> int:
+        try:
+            rows = copy(writer)
+            writer.flush()
+            return rows
+        finally:
+            writer.finish()
+
+    job = asyncio.ensure_future(executor.run(run))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        # Raises if COPY failed part-way
+        await job
+    finally:
+        if not job.done():
+            cancel_token.cancel("export closed")
+            # Unblock a writer waiting on the full queue so the worker can exit
+            while not job.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({job}, timeout=0.05)
@@ -0,0 +1,209 @@
+"""
+Compiled single-pass intent parser and query plan memoization.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+
+# Query types in priority order: the first type with a matching keyword wins
+QUERY_TYPE_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("retrieve", ["show", "display", "get", "find", "list"]),
+    ("count", ["count", "how many", "number of"]),
+    ("aggregate", ["total", "sum", "revenue", "amount"]),
+    ("average", ["average", "avg", "mean"]),
+    ("maximum", ["max", "maximum", "highest", "largest"]),
+    ("minimum", ["min", "minimum", "lowest", "smallest"]),
+]
+
+ENTITY_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("orders", ["order", "orders", "purchase", "transaction"]),
+    ("members", ["customer", "member", "user", "client"]),
+    ("programs", ["program", "programs", "campaign"]),
+]
+
+TIME_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("recent", ["today", "yesterday", "last week", "this month"]),
+    ("latest", ["last", "latest", "recent", "newest"]),
+    ("earliest", ["first", "oldest", "earliest"]),
+]
+
+FLAG_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("paid", ["paid"]),
+    ("pending", ["pending"]),
+    ("payment", ["payment"]),
+    ("fulfillment", ["fulfillment"]),
+    ("fulfilled", ["fulfilled"]),
+    ("all", ["all", "everything"]),
+]
+
+DEFAULT_LIMIT = 10
+
+_NUMBER = re.compile(r"\b(\d+)\b")
+
+
+def _trie_pattern(keywords) -> str:
+    """Compile keywords into a prefix-trie regex that matches the longest one."""
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional group: prefer the longer keyword, fall back to this one
+        return f"(?:{body})?" if terminal else body
+
+    return build(trie)
+
+
+class IntentParser:
+    """
+    Classifies a natural language query in one regex pass.
+
+    Every keyword table is compiled into a single alternation evaluated as a
+    lookahead at each position, so keywords keep the substring semantics of
+    ``word in query`` checks (including overlaps such as "last week"/"last").
+    """
+
+    def __init__(self):
+        tagged: Dict[str, set] = {}
+        for group, table in (("type", QUERY_TYPE_KEYWORDS), ("entity", ENTITY_KEYWORDS),
+                             ("time", TIME_KEYWORDS), ("flag", FLAG_KEYWORDS)):
+            for label, keywords in table:
+                for keyword in keywords:
+                    tagged.setdefault(keyword, set()).add((group, label))
+
+        # The regex reports the longest keyword at each position; shorter keywords
+        # starting there are its prefixes, so fold their tags in ahead of time.
+        self._tags: Dict[str, FrozenSet[Tuple[str, str]]] = {}
+        for keyword in tagged:
+            tags = set()
+            for other, other_tags in tagged.items():
+                if keyword.startswith(other):
+                    tags |= other_tags
+            self._tags[keyword] = frozenset(tags)
+
+        self._pattern = re.compile(rf"(?=({_trie_pattern(tagged)}))")
+
+    def scan(self, query_lower: str) -> Tuple[FrozenSet[Tuple[str, str]], Optional[int]]:
+        """Return the matched (group, label) tags and the first number in the query."""
+        tags = set()
+        for keyword in self._pattern.findall(query_lower):
+            tags |= self._tags[keyword]
+
+        number = _NUMBER.search(query_lower)
+        return frozenset(tags), int(number.group(1)) if number else None
+
+    def parse(self, query: str) -> Dict[str, Any]:
+        """Build the analysis dict consumed by the SQL generator."""
+        query_lower = query.lower().strip()
+        tags, first_number = self.scan(query_lower)
+
+        analysis = {
+            "original_query": query,
+            "query_type": "unknown",
+            "entities": [],
+            "actions": [],
+            "filters": {},
+            "aggregations": [],
+            "time_references": [],
+            "table_hints": []
+        }
+
+        for query_type, _ in QUERY_TYPE_KEYWORDS:
+            if ("type", query_type) in tags:
+                analysis["query_type"] = query_type
+                break
+
+        analysis["entities"] = [label for label, _ in ENTITY_KEYWORDS if ("entity", label) in tags]
+        analysis["time_references"] = [label for label, _ in TIME_KEYWORDS if ("time", label) in tags]
+
+        # Status filters, applied in the same order as the original keyword checks
+        filters = analysis["filters"]
+        if ("flag", "paid") in tags:
+            filters["payment_status"] = "PAID"
+        if ("flag", "pending") in tags:
+            if ("flag", "payment") in tags:
+                filters["payment_status"] = "PENDING"
+            elif ("flag", "fulfillment") in tags:
+                filters["fulfillment_status"] = "PENDING"
+        if ("flag", "fulfilled") in tags:
+            filters["fulfillment_status"] = "FULFILLED"
+
+        if first_number is not None:
+            analysis["limit"] = first_number
+        elif ("flag", "all") in tags:
+            analysis["limit"] = None
+        else:
+            analysis["limit"] = DEFAULT_LIMIT
+
+        return analysis
+
+
+def _copy_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy an analysis dict; its values are flat lists/dicts of primitives."""
+    return {key: value.copy() if isinstance(value, (list, dict)) else value
+            for key, value in analysis.items()}
+
+
+class QueryPlanMemo:
+    """Bounded LRU memo of normalized query text -> (analysis, SQL plan)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, Tuple[Dict[str, Any], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Key used for memoization; matches the text the parser actually reads."""
+        return query.lower().strip()
+
+    def get(self, query: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """Return a private copy of the memoized plan for ``query``, if any."""
+        key = self.normalize(query)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+
+        analysis, sql_plan = plan
+        analysis = _copy_analysis(analysis)
+        analysis["original_query"] = query
+        return analysis, sql_plan
+
+    def set(self, query: str, analysis: Dict[str, Any], sql_plan: Any) -> None:
+        """Memoize the plan for ``query``, evicting the least recently used entry."""
+        key = self.normalize(query)
+        with self._lock:
+            self._plans[key] = (_copy_analysis(analysis), sql_plan)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every memoized plan, e.g. after the schema changes."""
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memo occupancy and hit/miss counters."""
+        with self._lock:
+            return {"entries": len(self._plans), "hits": self.hits, "misses": self.misses}
+
+
+# Compiled once at import so per-request parsing does no regex compilation
+DEFAULT_PARSER = IntentParser()
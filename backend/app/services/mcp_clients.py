@@ -2,57 +2,447 @@
 MCP clients using REAL PostgreSQL database connection.
 """
 import psycopg2
+import psycopg2.errors
 import json
-from typing import Dict, List, Optional, Any
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, List, Optional, Any, Iterator, Sequence
+
+from .charting import lttb_indices, parse_timestamp, stride_indices
+from .executor import CancelToken, QueryCancelled, QueryTimeout
+from .results import ColumnarResult, QueryResult
+from .statements import PreparedStatements, positional_placeholders
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class _PooledConnection:
+    """A physical connection plus the bookkeeping the pool needs for it."""
+
+    __slots__ = ("conn", "created_at", "last_used", "statements")
+
+    def __init__(self, conn, max_statements: int = 128):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Server-side prepared statements live as long as the session does
+        self.statements = PreparedStatements(max_statements)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable PostgreSQL connections.
+
+    Connections are opened lazily up to ``max_size``, validated when borrowed,
+    and recycled once they are older than ``max_age`` seconds.
+    """
+
+    def __init__(self, connection_params: Dict[str, Any], min_size: int = 1,
+                 max_size: int = 10, max_age: float = 1800.0,
+                 acquire_timeout: float = 30.0, health_check_after: float = 30.0,
+                 max_prepared_statements: int = 128):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self.connection_params = connection_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.acquire_timeout = acquire_timeout
+        # Idle connections older than this are pinged before being handed out
+        self.health_check_after = health_check_after
+        self.max_prepared_statements = max_prepared_statements
+
+        self._idle: List[_PooledConnection] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Counters exposed via stats()
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._recycled = 0
+        self._failed_checks = 0
+
+    def open(self) -> None:
+        """Eagerly open connections until the pool holds ``min_size`` of them."""
+        with self._cond:
+            self._ensure_open()
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+
+        for _ in range(max(missing, 0)):
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Close idle connections and refuse further borrowing."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for pooled in idle:
+            self._discard(pooled)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection for the duration of the ``with`` block."""
+        with self.lease() as pooled:
+            yield pooled.conn
+
+    @contextmanager
+    def lease(self) -> Iterator[_PooledConnection]:
+        """Borrow a connection along with its per-session state, such as prepared statements."""
+        pooled = self._acquire()
+        healthy = True
+        try:
+            yield pooled
+        except Exception:
+            healthy = not pooled.conn.closed
+            raise
+        finally:
+            self._release(pooled, healthy)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool utilisation for sizing and monitoring."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 6),
+                "wait_time_max": round(self._max_wait_time, 6),
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_checks,
+            }
+
+    def _acquire(self) -> _PooledConnection:
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        waited = False
+
+        while True:
+            pooled = None
+            with self._cond:
+                self._ensure_open()
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    # Reserve a slot, then connect outside the lock
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            if pooled is None:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(pooled):
+                self._discard(pooled)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                continue
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._acquired += 1
+                if waited:
+                    self._waits += 1
+                    self._wait_time += elapsed
+                    self._max_wait_time = max(self._max_wait_time, elapsed)
+            return pooled
+
+    def _release(self, pooled: _PooledConnection, healthy: bool) -> None:
+        if healthy and not pooled.conn.closed:
+            try:
+                # End the read transaction so the connection is clean for reuse
+                pooled.conn.rollback()
+            except Exception:
+                healthy = False
+
+        pooled.last_used = time.monotonic()
+        expired = pooled.last_used - pooled.created_at > self.max_age
+
+        with self._cond:
+            if healthy and not expired and not self._closed:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            self._size -= 1
+            if expired:
+                self._recycled += 1
+            self._cond.notify()
+
+        self._discard(pooled)
+
+    def _is_usable(self, pooled: _PooledConnection) -> bool:
+        """Health check run when a connection is borrowed."""
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_age:
+            with self._cond:
+                self._recycled += 1
+            return False
+
+        healthy = not pooled.conn.closed
+        if healthy and now - pooled.last_used > self.health_check_after:
+            try:
+                with pooled.conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                pooled.conn.rollback()
+            except Exception:
+                healthy = False
+
+        if not healthy:
+            with self._cond:
+                self._failed_checks += 1
+        return healthy
+
+    def _connect(self) -> _PooledConnection:
+        return _PooledConnection(psycopg2.connect(**self.connection_params), self.max_prepared_statements)
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _ensure_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
 
 
 class MCPDatabaseClient:
-    """Client for executing database operations via direct PostgreSQL connection."""
+    """Client for executing database operations via pooled PostgreSQL connections."""
 
-    def __init__(self):
+    def __init__(self, min_pool_size: int = 1, max_pool_size: int = 10,
+                 max_connection_age: float = 1800.0, max_prepared_statements: int = 128,
+                 connection_params: Optional[Dict[str, Any]] = None, export_pool_size: int = 2):
         # Database connection parameters (same as used by MCP tools)
-        self.connection_params = {
+        self.connection_params = connection_params or {
             'host': 'localhost',
             'port': 5432,
             'database': 'pangea_development',
             'user': 'mcp_user',
             'password': 'mcp_password123'
         }
+        # Connections are opened on first use, so constructing the client is cheap
+        self.pool = ConnectionPool(
+            self.connection_params,
+            min_size=min_pool_size,
+            max_size=max_pool_size,
+            max_age=max_connection_age,
+            max_prepared_statements=max_prepared_statements,
+        )
+        # Long-running COPY exports get their own few connections, so they cannot drain the query pool
+        self.export_pool = ConnectionPool(
+            self.connection_params,
+            min_size=0,
+            max_size=export_pool_size,
+            max_age=max_connection_age,
+            max_prepared_statements=0,
+        )
+
+        # Prepared statement counters exposed via pool_stats()
+        self._stats_lock = threading.Lock()
+        self._statements_prepared = 0
+        self._statements_reused = 0
+        self._statements_deallocated = 0
+
+    def close(self) -> None:
+        """Release all pooled connections."""
+        self.pool.close()
+        self.export_pool.close()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool statistics, including prepared statement plan reuse."""
+        stats = self.pool.stats()
+        stats["export_pool"] = self.export_pool.stats()
+        with self._stats_lock:
+            executions = self._statements_prepared + self._statements_reused
+            stats["prepared_statements"] = {
+                "prepared": self._statements_prepared,
+                "reused": self._statements_reused,
+                "deallocated": self._statements_deallocated,
+                "reuse_ratio": round(self._statements_reused / executions, 4) if executions else 0.0,
+            }
+        return stats
 
     def execute_sql(self, sql_query: str) -> List[Dict[str, Any]]:
-        """Execute SQL query using direct PostgreSQL connection."""
+        """Execute SQL query and return rows as a list of dictionaries."""
+        return self.execute_columnar(sql_query).to_records()
+
+    def execute_columnar(self, sql_query: str, params: Optional[Sequence[Any]] = None,
+                         prepare: bool = False, cancel_token: Optional[CancelToken] = None) -> ColumnarResult:
+        """
+        Execute SQL query on a pooled PostgreSQL connection, returning a columnar result.
+
+        With ``prepare``, ``sql_query`` is treated as a reusable template: it is
+        prepared once per connection and later calls only bind ``params``.
+        A ``cancel_token`` bounds the statement by its deadline and lets another
+        thread cancel it server-side.
+        """
         try:
-            # Connect to PostgreSQL database
-            conn = psycopg2.connect(**self.connection_params)
-            cursor = conn.cursor()
-
-            # Execute query
-            cursor.execute(sql_query)
-
-            # Get column names
-            columns = [desc[0] for desc in cursor.description]
-
-            # Fetch results
-            rows = cursor.fetchall()
-
-            # Convert to list of dictionaries
-            results = []
-            for row in rows:
-                result_dict = {}
-                for i, value in enumerate(row):
-                    # Handle datetime objects by converting to string
-                    if hasattr(value, 'isoformat'):
-                        result_dict[columns[i]] = value.isoformat()
+            if cancel_token is not None:
+                cancel_token.check()
+            with self.pool.lease() as pooled:
+                with pooled.conn.cursor() as cursor, self._guard(pooled.conn, cursor, cancel_token):
+                    if prepare and self.pool.max_prepared_statements > 0:
+                        self._execute_prepared(pooled, cursor, sql_query, params or ())
                     else:
-                        result_dict[columns[i]] = value
-                results.append(result_dict)
+                        # Execute query with any bound parameters
+                        cursor.execute(sql_query, params)
+
+                    # Get column names
+                    columns = [desc[0] for desc in cursor.description]
 
-            # Close connections
-            cursor.close()
-            conn.close()
+                    # Fetch results
+                    rows = cursor.fetchall()
 
-            return results
+            return ColumnarResult.from_rows(columns, rows)
 
+        except (QueryCancelled, QueryTimeout):
+            raise
+        except Exception as e:
+            raise Exception(f"Database query failed: {str(e)}")
+
+    def copy_csv(self, sql_query: str, params: Optional[Sequence[Any]], out: Any,
+                 cancel_token: Optional[CancelToken] = None) -> int:
+        """
+        Write the query's rows to ``out`` as CSV with a header using ``COPY ... TO STDOUT``.
+
+        Rows go straight from the server to ``out.write`` as they arrive, so
+        nothing is buffered here; returns the number of rows copied.
+        """
+        try:
+            if cancel_token is not None:
+                cancel_token.check()
+            with self.export_pool.lease() as pooled:
+                with pooled.conn.cursor() as cursor, self._guard(pooled.conn, cursor, cancel_token):
+                    # COPY takes no bind parameters, so they are quoted client-side
+                    query = cursor.mogrify(sql_query, params).decode()
+                    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+                    return cursor.rowcount
+
+        except (QueryCancelled, QueryTimeout):
+            raise
+        except Exception as e:
+            raise Exception(f"Database query failed: {str(e)}")
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """Yield a cursor on a pooled connection; its writes are committed if the block succeeds."""
+        with self.pool.lease() as pooled:
+            with pooled.conn.cursor() as cursor:
+                yield cursor
+            pooled.conn.commit()
+
+    @contextmanager
+    def _guard(self, conn, cursor, cancel_token: Optional[CancelToken]) -> Iterator[None]:
+        """Apply ``cancel_token``'s deadline as statement_timeout and cancel on request."""
+        if cancel_token is None:
+            yield
+            return
+
+        remaining = cancel_token.remaining()
+        if remaining is not None:
+            # SET LOCAL lasts until the pool rolls the transaction back on release
+            cursor.execute("SET LOCAL statement_timeout = %s", (max(int(remaining * 1000), 1),))
+        with cancel_token.attach(conn.cancel):
+            try:
+                yield
+            except psycopg2.errors.QueryCanceled:
+                cancel_token.check()
+                # statement_timeout fired a moment before our own deadline
+                raise QueryTimeout(f"Query timed out after {cancel_token.timeout:g}s")
+
+    def _execute_prepared(self, pooled, cursor, sql_query: str, params: Sequence[Any]) -> None:
+        """Run ``sql_query`` via PREPARE/EXECUTE, preparing it on this connection if needed."""
+        name = pooled.statements.lookup(sql_query)
+        if name is None:
+            positional_sql, _ = positional_placeholders(sql_query)
+            name = pooled.statements.next_name()
+            cursor.execute(f"PREPARE {name} AS {positional_sql}")
+            # Prepared statements are not transactional, so record them only once created
+            evicted = pooled.statements.add(sql_query, name)
+            for old_name in evicted:
+                cursor.execute(f"DEALLOCATE {old_name}")
+            with self._stats_lock:
+                self._statements_prepared += 1
+                self._statements_deallocated += len(evicted)
+        else:
+            with self._stats_lock:
+                self._statements_reused += 1
+
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", tuple(params))
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def stream_sql(self, sql_query: str, params: Optional[Sequence[Any]] = None,
+                   batch_size: int = 500, cancel_token: Optional[CancelToken] = None) -> Iterator[ColumnarResult]:
+        """
+        Execute SQL query with a server-side cursor, yielding rows in batches.
+
+        Only one batch is held in memory at a time; the pooled connection is
+        returned when the generator is exhausted or closed. ``cancel_token``
+        is checked between batches as well as enforced on each fetch.
+        """
+        try:
+            if cancel_token is not None:
+                cancel_token.check()
+            with self.pool.connection() as conn:
+                # SET LOCAL runs on a plain cursor; the named cursor only fetches
+                with conn.cursor() as setup, self._guard(conn, setup, cancel_token):
+                    # Named cursors live server-side for the current transaction
+                    with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                        cursor.itersize = batch_size
+                        cursor.execute(sql_query, params)
+
+                        while True:
+                            rows = cursor.fetchmany(batch_size)
+                            if not rows:
+                                break
+                            columns = [desc[0] for desc in cursor.description]
+                            yield ColumnarResult.from_rows(columns, rows)
+                            if cancel_token is not None:
+                                cancel_token.check()
+
+        except (GeneratorExit, QueryCancelled, QueryTimeout):
+            raise
         except Exception as e:
             raise Exception(f"Database query failed: {str(e)}")
 
@@ -63,36 +453,84 @@ class MCPUIGeneratorClient:
     def __init__(self):
         pass
 
-    def generate_chart_config(self, data: List[Dict[str, Any]], query_intent: str) -> Optional[Dict[str, Any]]:
-        """Generate chart configuration based on data and query intent."""
+    def generate_chart_config(self, data: QueryResult, query_intent: str,
+                              max_points: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Generate chart configuration based on data and query intent.
+
+        When ``max_points`` is given, line chart data is downsampled to at most
+        that many points.
+        """
         if not data:
             return None
 
-        sample_record = data[0]
+        columns = data.columns if isinstance(data, ColumnarResult) else list(data[0].keys())
+        time_columns = [key for key in columns if 'date' in key.lower() or 'time' in key.lower()]
+        if isinstance(data, ColumnarResult):
+            # Typed temporal columns (e.g. created_at) are time axes too
+            time_columns += [key for key, column_type in zip(columns, data.types)
+                             if column_type in ("datetime", "date") and key not in time_columns]
 
         # For time-series data
-        if any(key for key in sample_record.keys() if 'date' in key.lower() or 'time' in key.lower()):
+        if time_columns:
+            x_axis = time_columns[0]
+            y_axis = next((key for key in columns if any(t in key.lower() for t in ['amount', 'revenue', 'count', 'total'])), None)
             return {
                 "type": "line",
                 "chart_type": "line",
                 "title": "Trends Over Time",
-                "x_axis": next(key for key in sample_record.keys() if 'date' in key.lower() or 'time' in key.lower()),
-                "y_axis": next((key for key in sample_record.keys() if any(t in key.lower() for t in ['amount', 'revenue', 'count', 'total'])), None),
-                "data": data
+                "x_axis": x_axis,
+                "y_axis": y_axis,
+                "data": self.downsample(data, x_axis, y_axis, max_points) if max_points else data
             }
 
         return None
 
-    def format_data_table(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def generate_time_series_chart(self, series: QueryResult, bucket: str, x_axis: str, y_axis: str,
+                                   max_points: int) -> Dict[str, Any]:
+        """Generate a line chart from a series already aggregated into time buckets."""
+        return {
+            "type": "line",
+            "chart_type": "line",
+            "title": f"Trends Over Time (per {bucket})",
+            "x_axis": x_axis,
+            "y_axis": y_axis,
+            "bucket": bucket,
+            "aggregated": True,
+            "data": self.downsample(series, x_axis, y_axis, max_points)
+        }
+
+    def downsample(self, data: QueryResult, x_axis: str, y_axis: Optional[str],
+                   max_points: int) -> QueryResult:
+        """Reduce a series to ``max_points`` using LTTB, or even spacing when y is not numeric."""
+        if len(data) <= max_points:
+            return data
+
+        columnar = data if isinstance(data, ColumnarResult) else ColumnarResult.from_records(data)
+        ys = columnar.column(y_axis) if y_axis else None
+        xs = [parse_timestamp(value) for value in columnar.column(x_axis)]
+
+        if ys is not None and all(isinstance(y, (int, float, Decimal)) for y in ys):
+            if any(x is None for x in xs):
+                xs = list(range(len(ys)))
+            indices = lttb_indices(xs, [float(y) for y in ys], max_points)
+        else:
+            indices = stride_indices(len(columnar), max_points)
+
+        sampled = columnar.take(indices)
+        return sampled if isinstance(data, ColumnarResult) else sampled.to_records()
+
+    def format_data_table(self, data: QueryResult) -> Dict[str, Any]:
         """Format data for table display."""
         if not data:
             return {"headers": [], "rows": []}
 
-        headers = list(data[0].keys())
-        rows = []
-        for record in data:
-            row = [str(record.get(header, '')) for header in headers]
-            rows.append(row)
+        if not isinstance(data, ColumnarResult):
+            data = ColumnarResult.from_records(data)
+
+        # Stringify column by column, then zip into display rows
+        headers = list(data.columns)
+        rows = [list(row) for row in zip(*(list(map(str, values)) for values in data.data))]
 
         return {
             "headers": headers,
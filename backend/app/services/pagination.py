@@ -0,0 +1,35 @@
+"""
+Keyset pagination helpers: sort keys per table and opaque page cursors.
+"""
+import base64
+import json
+from typing import Any, Dict, List
+
+# Columns that give each table a unique, index-friendly sort order
+PAGINATION_KEYS: Dict[str, List[str]] = {
+    "orders": ["created_at", "id"],
+}
+DEFAULT_PAGINATION_KEYS = ["id"]
+
+
+def pagination_keys(table: str) -> List[str]:
+    """Return the keyset columns used to page through ``table``."""
+    return PAGINATION_KEYS.get(table, DEFAULT_PAGINATION_KEYS)
+
+
+def encode_cursor(query: str, last_key: List[Any], page_size: int) -> str:
+    """Pack the query and the last row's key into an opaque, URL-safe cursor."""
+    payload = json.dumps({"q": query, "k": last_key, "n": page_size}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Unpack a cursor produced by encode_cursor; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(state["q"], str) or not isinstance(state["k"], list) or int(state["n"]) < 1:
+            raise ValueError
+        return {"query": state["q"], "last_key": state["k"], "page_size": int(state["n"])}
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
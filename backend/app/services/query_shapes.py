@@ -0,0 +1,365 @@
+"""
+Query-shape registry: per-template latency statistics, captured EXPLAIN plans and index suggestions.
+"""
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+
+from .cache import normalize_sql
+from .statements import SQLStatement, quote_identifier
+
+logger = logging.getLogger(__name__)
+
+
+_IDENTIFIER = r'(?:[a-z_][a-z0-9_]*|"[^"]+")'
+_FROM = re.compile(rf"\bFROM\s+({_IDENTIFIER})", re.IGNORECASE)
+_EQUALITY = re.compile(rf"({_IDENTIFIER})\s*=\s*%s", re.IGNORECASE)
+_ROW_COMPARISON = re.compile(r"\(([^()]+)\)\s*[<>]=?\s*\(", re.IGNORECASE)
+# The first ORDER BY (the source query's, when wrapped for charts) ends at LIMIT, its closing parenthesis or the end
+_ORDER_BY = re.compile(r"\bORDER BY\s+([^()]+?)(?:\s+LIMIT\b|\s*\)|\s*$)", re.IGNORECASE)
+_DIRECTION = re.compile(r"\s+(?:ASC|DESC)(?:\s+NULLS\s+(?:FIRST|LAST))?$", re.IGNORECASE)
+
+PERCENTILES = (50, 95, 99)
+
+
+def fingerprint(sql: str) -> str:
+    """Stable id for an SQL template; statements differing only in bound values share it."""
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:16]
+
+
+def _unquote(identifier: str) -> str:
+    identifier = identifier.strip()
+    if identifier.startswith('"') and identifier.endswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier.lower()
+
+
+def index_columns(sql: str) -> Optional[Dict[str, Any]]:
+    """
+    Table and candidate index columns for a generated statement: its equality
+    filters first, then its range and sort keys. None if nothing would help.
+    """
+    table = _FROM.search(sql)
+    if table is None:
+        return None
+
+    columns: List[str] = []
+    for column in _EQUALITY.findall(sql):
+        columns.append(_unquote(column))
+    for group in _ROW_COMPARISON.findall(sql):
+        columns.extend(_unquote(column) for column in group.split(","))
+    order = _ORDER_BY.search(sql)
+    if order:
+        columns.extend(_unquote(_DIRECTION.sub("", column.strip())) for column in order.group(1).split(","))
+
+    # Keep the first position of each column: later mentions add nothing to a b-tree prefix
+    columns = list(dict.fromkeys(column for column in columns if column.isidentifier()))
+    if not columns:
+        return None
+    return {"table": _unquote(table.group(1)), "columns": columns}
+
+
+def plan_findings(plan: Dict[str, Any]) -> List[str]:
+    """Human-readable notes on the expensive nodes of an EXPLAIN (FORMAT JSON) plan."""
+    findings = []
+    for node in _walk(plan.get("Plan", {})):
+        node_type = node.get("Node Type")
+        if node_type == "Seq Scan":
+            note = f"Seq Scan on {node.get('Relation Name')}"
+            if node.get("Rows Removed by Filter"):
+                note += f" (removed {node['Rows Removed by Filter']:,} rows by filter)"
+            findings.append(note)
+        elif node_type in ("Sort", "Incremental Sort"):
+            method = node.get("Sort Method")
+            findings.append(f"{node_type} on {', '.join(node.get('Sort Key', []))}"
+                            + (f" ({method})" if method else ""))
+    return findings
+
+
+def _walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+class QueryShape:
+    """Statistics for one SQL template."""
+
+    def __init__(self, shape_id: str, sql: str, samples: int = 256):
+        self.id = shape_id
+        self.sql = normalize_sql(sql)
+        self.calls = 0
+        self.slow_calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_seen: Optional[float] = None
+        # Recent latencies for percentiles; bounded so hot shapes cost the same as cold ones
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        # Bound values of the latest slow call, replayed when capturing its plan
+        self.slow_params: Optional[Sequence[Any]] = None
+        self.plan: Optional[Dict[str, Any]] = None
+        self.plan_captured_at: Optional[float] = None
+
+    def percentile(self, percent: float) -> float:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "sql": self.sql,
+            "calls": self.calls,
+            "slow_calls": self.slow_calls,
+            "rows": self.rows,
+            "total_ms": round(self.total_time * 1000, 3),
+            "mean_ms": round(self.total_time / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "last_seen": datetime.fromtimestamp(self.last_seen).isoformat() if self.last_seen else None,
+            "plan": None,
+        }
+        for percent in PERCENTILES:
+            data[f"p{percent}_ms"] = round(self.percentile(percent) * 1000, 3)
+        if self.plan is not None:
+            data["plan"] = {
+                "captured_at": datetime.fromtimestamp(self.plan_captured_at).isoformat(),
+                "planning_ms": self.plan.get("Planning Time"),
+                "execution_ms": self.plan.get("Execution Time"),
+                "shared_hit_blocks": self.plan.get("Plan", {}).get("Shared Hit Blocks"),
+                "shared_read_blocks": self.plan.get("Plan", {}).get("Shared Read Blocks"),
+                "findings": plan_findings(self.plan),
+                "explain": self.plan,
+            }
+        return data
+
+
+class QueryShapeRegistry:
+    """
+    Call counts and latency distribution per generated SQL template.
+
+    The first call of a shape slower than ``slow_threshold`` seconds (and
+    again once ``explain_interval`` seconds have passed) queues an
+    ``EXPLAIN (ANALYZE, BUFFERS)`` of that call on a background thread, so the
+    query that was slow is not delayed further. Only ``max_shapes`` shapes are
+    kept, least recently seen first out.
+    """
+
+    def __init__(self, db_client, slow_threshold: float = 0.25, explain_interval: float = 600.0,
+                 max_shapes: int = 500, explain_timeout: float = 30.0):
+        self.db_client = db_client
+        self.slow_threshold = slow_threshold
+        self.explain_interval = explain_interval
+        self.max_shapes = max_shapes
+        self.explain_timeout = explain_timeout
+
+        self._shapes: "OrderedDict[str, QueryShape]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._captures: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=32)
+        self._pending: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+        self.plans_captured = 0
+        self.capture_failures = 0
+
+    def record(self, statement: SQLStatement, seconds: float, rows: int) -> None:
+        """Add one execution of ``statement`` to its shape's statistics."""
+        shape_id = fingerprint(statement.sql)
+        with self._lock:
+            shape = self._shapes.get(shape_id)
+            if shape is None:
+                shape = self._shapes[shape_id] = QueryShape(shape_id, statement.sql)
+                while len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(shape_id)
+            shape.calls += 1
+            shape.rows += rows
+            shape.total_time += seconds
+            shape.max_time = max(shape.max_time, seconds)
+            shape.last_seen = time.time()
+            shape.latencies.append(seconds)
+
+            if self.slow_threshold <= 0 or seconds < self.slow_threshold:
+                return
+            shape.slow_calls += 1
+            shape.slow_params = tuple(statement.params)
+            due = shape.plan_captured_at is None or time.time() - shape.plan_captured_at >= self.explain_interval
+            if not due or shape_id in self._pending:
+                return
+            self._pending.add(shape_id)
+
+        self._start()
+        try:
+            self._captures.put_nowait(shape_id)
+        except queue.Full:
+            # Capturing is best-effort; the next slow call will try again
+            with self._lock:
+                self._pending.discard(shape_id)
+
+    def capture_plan(self, shape_id: str) -> bool:
+        """Run EXPLAIN (ANALYZE, BUFFERS) for the shape's latest slow call; returns True on success."""
+        with self._lock:
+            shape = self._shapes.get(shape_id)
+            params = shape.slow_params if shape is not None else None
+        if shape is None or params is None:
+            return False
+
+        try:
+            with self.db_client.transaction() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", (int(self.explain_timeout * 1000),))
+                # Runs the statement again; only generated read-only SELECTs are recorded
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {shape.sql}", params)
+                plan = cursor.fetchone()[0][0]
+        except Exception as e:
+            logger.warning("Could not capture the plan of query shape %s: %s", shape_id, e)
+            with self._lock:
+                self.capture_failures += 1
+            return False
+
+        with self._lock:
+            shape.plan = plan
+            shape.plan_captured_at = time.time()
+            self.plans_captured += 1
+        return True
+
+    def wait_for_captures(self, timeout: float = 10.0) -> bool:
+        """Block until queued plan captures finish; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def worst(self, limit: int = 10, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        """The ``limit`` shapes with the highest ``sort`` statistic, most expensive first."""
+        with self._lock:
+            shapes = [shape.to_dict() for shape in self._shapes.values()]
+        if shapes and sort not in shapes[0]:
+            raise ValueError(f"Cannot sort query shapes by {sort!r}")
+        return sorted(shapes, key=lambda shape: shape[sort] or 0, reverse=True)[:limit]
+
+    def reset_plans(self) -> None:
+        """Forget captured plans, e.g. after an index was added, so they are captured afresh."""
+        with self._lock:
+            for shape in self._shapes.values():
+                shape.plan = None
+                shape.plan_captured_at = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "shapes": len(self._shapes),
+                "max_shapes": self.max_shapes,
+                "slow_threshold": self.slow_threshold,
+                "plans_captured": self.plans_captured,
+                "capture_failures": self.capture_failures,
+                "captures_pending": len(self._pending),
+            }
+
+    def stop(self) -> None:
+        """Stop the background capture thread."""
+        if self._thread is not None:
+            self._captures.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._capture_loop, name="explain-capture", daemon=True)
+                self._thread.start()
+
+    def _capture_loop(self) -> None:
+        while True:
+            shape_id = self._captures.get()
+            if shape_id is None:
+                return
+            try:
+                self.capture_plan(shape_id)
+            finally:
+                with self._lock:
+                    self._pending.discard(shape_id)
+
+
+class IndexAdvisor:
+    """
+    Suggests composite b-tree indexes for recorded query shapes, and creates them on request.
+
+    A suggestion covers a shape's equality filters followed by its range and
+    sort keys, and is only made for tables of at least ``min_rows`` rows with
+    no index already starting with those columns.
+    """
+
+    def __init__(self, db_client, schema, min_rows: int = 10_000):
+        self.db_client = db_client
+        self.schema = schema
+        self.min_rows = min_rows
+
+    def suggest(self, shape: Dict[str, Any]) -> List[Dict[str, Any]]:
+        candidate = index_columns(shape["sql"])
+        if candidate is None:
+            return []
+        table = self.schema.get(candidate["table"])
+        if table is None or (table.row_estimate or 0) < self.min_rows:
+            return []
+        columns = [column for column in candidate["columns"] if table.has_column(column)]
+        if not columns or table.has_index_prefix(columns):
+            return []
+
+        findings = (shape.get("plan") or {}).get("findings", [])
+        evidence = [finding for finding in findings
+                    if finding.startswith(("Sort", "Incremental Sort"))
+                    or finding.startswith(f"Seq Scan on {table.name}")]
+        return [{
+            "table": table.name,
+            "columns": columns,
+            "ddl": self.ddl(table.name, columns),
+            # Without a captured plan the suggestion rests on the statement text alone
+            "evidence": evidence if shape.get("plan") else None,
+        }]
+
+    def ddl(self, table: str, columns: List[str]) -> str:
+        name = "_".join(["idx", table] + columns)[:63]
+        return (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_identifier(name)} ON {quote_identifier(table)} "
+                f"({', '.join(quote_identifier(column) for column in columns)})")
+
+    def create(self, table: str, columns: List[str]) -> str:
+        """
+        Build the index with CREATE INDEX CONCURRENTLY, so writes to the table continue meanwhile.
+
+        Raises ValueError for unknown tables or columns. Returns the DDL that was run.
+        """
+        schema = self.schema.get(table)
+        if schema is None:
+            raise ValueError(f"Unknown table {table!r}")
+        unknown = [column for column in columns if not schema.has_column(column)]
+        if not columns or unknown:
+            raise ValueError(f"Unknown columns for {table}: {unknown or columns}")
+
+        ddl = self.ddl(table, columns)
+        # CONCURRENTLY cannot run inside a transaction block, so use a dedicated autocommit connection
+        conn = psycopg2.connect(**self.db_client.connection_params)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(ddl)
+        finally:
+            conn.close()
+        return ddl
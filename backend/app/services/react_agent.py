@@ -1,12 +1,59 @@
 """
 ReAct Agent for natural language query processing.
 """
+import asyncio
 import json
 import re
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime
 
+from .cache import ResultCache, normalize_sql, referenced_tables
+from .charting import TIME_BUCKETS, bucket_counts, choose_time_bucket, parse_timestamp
+from .estimates import CountEstimator
+from .executor import CancelToken, QueryCancelled, QueryExecutor, QueryTimeout
+from .export import stream_copy
+from .intent_parser import DEFAULT_PARSER, IntentParser, QueryPlanMemo
 from .mcp_clients import MCPDatabaseClient, MCPUIGeneratorClient
+from .metrics import DB_QUERY_SECONDS, DB_ROWS, Timings, row_bucket
+from .pagination import decode_cursor, encode_cursor, pagination_keys
+from .results import ColumnarResult, QueryResult
+from .query_shapes import IndexAdvisor, QueryShapeRegistry
+from .rollups import ROLLUP_TABLE, RollupManager
+from .scheduler import QueryScheduler, SchedulerBusy, estimate_cost
+from .schema import SchemaCatalog
+from .session_context import SessionContextStore, SessionResult
+from .singleflight import SingleFlight
+from .statements import SQLStatement, quote_identifier
+
+
+# Used until the schema catalog has been loaded from the database
+DEFAULT_KNOWN_TABLES = {
+    'orders': ['id', 'external_id', 'created_at', 'updated_at', 'payment_status',
+              'fulfillment_status', 'program_id', 'order_recipient_id'],
+    'programs': ['id', 'name', 'description'],
+    'members': ['id', 'email', 'first_name', 'last_name'],
+}
+
+# Columns shown for row-returning queries, narrowed to those that actually exist
+RETRIEVE_COLUMNS = {
+    'orders': ['id', 'external_id', 'created_at', 'payment_status', 'fulfillment_status', 'program_id'],
+    'programs': ['id', 'name', 'description'],
+    'members': ['id', 'email', 'first_name', 'last_name'],
+}
+
+# Follow-up phrasing that refers back to the previous answer ("only the paid ones", "first 3 of those")
+_ANAPHORA = re.compile(r"\b(?:those|these|them|ones)\b")
+_ONLY = re.compile(r"\bonly\b")
+_LAST = re.compile(r"\blast\b")
+# Questions that ask for a chart or trend rather than a listing
+_TREND = re.compile(r"\b(?:trends?|over time|timeline|chart|graph|plot|daily|weekly|hourly|per (?:minute|hour|day|week))\b")
+_RESORT = (
+    (True, re.compile(r"\b(?:latest|newest|most recent)\b")),
+    (False, re.compile(r"\b(?:oldest|earliest)\b")),
+)
 
 
 class ReActAgent:
@@ -15,37 +62,150 @@ class ReActAgent:
     Handles any natural language query by dynamically generating appropriate SQL.
     """
 
-    def __init__(self):
-        self.db_client = MCPDatabaseClient()
+    def __init__(self, db_client: Optional[MCPDatabaseClient] = None,
+                 max_concurrency: int = 10, result_cache: Optional[ResultCache] = None,
+                 plan_memo_size: int = 1024, chart_max_points: int = 800,
+                 default_page_size: int = 50, max_page_size: int = 1000,
+                 schema_refresh_interval: float = 300.0, query_timeout: Optional[float] = 30.0,
+                 rollups: Optional[RollupManager] = None,
+                 session_context: Optional[SessionContextStore] = None,
+                 scheduler: Optional[QueryScheduler] = None,
+                 estimate_sample_rows: int = 10_000,
+                 query_shapes: Optional[QueryShapeRegistry] = None,
+                 export_concurrency: int = 2):
+        self.db_client = db_client or MCPDatabaseClient()
         self.ui_client = MCPUIGeneratorClient()
-        self.session_context = {}
-
-        # Database schema knowledge - this should ideally be loaded dynamically
-        self.known_tables = {
-            'orders': ['id', 'external_id', 'created_at', 'updated_at', 'payment_status',
-                      'fulfillment_status', 'program_id', 'order_recipient_id'],
-            'programs': ['id', 'name', 'description'],
-            'members': ['id', 'email', 'first_name', 'last_name'],
-            # Add more tables as discovered
-        }
-
-    def process_query(self, query: str, session_id: str) -> Dict[str, Any]:
-        """Process any natural language query using ReAct methodology."""
+        self.executor = QueryExecutor(max_concurrency=max_concurrency)
+        # CSV exports run on their own workers (and the client's export connections), at most
+        # export_concurrency at once, so they never hold the threads interactive queries need
+        self.export_concurrency = export_concurrency
+        self.export_executor = QueryExecutor(max_concurrency=export_concurrency)
+        self._exports_running = 0
+        self._export_lock = threading.Lock()
+        self.result_cache = result_cache or ResultCache()
+        # Identical queries running at the same time share one database execution
+        self.single_flight = SingleFlight(retry_on=(QueryCancelled, QueryTimeout))
+        self.intent_parser: IntentParser = DEFAULT_PARSER
+        self.plan_memo = QueryPlanMemo(max_entries=plan_memo_size)
+        # Default chart resolution: roughly one point per pixel of chart width
+        self.chart_max_points = chart_max_points
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
+        # Default per-query deadline in seconds (None for no deadline)
+        self.query_timeout = query_timeout
+        # Latest result per session, refined in memory by follow-up questions
+        self.session_context = session_context if session_context is not None else SessionContextStore()
+        # Optional admission control: fair, cost-ordered queueing of async queries across sessions
+        self.scheduler = scheduler
+        # Approximate answers to count and aggregate questions, on request
+        self.estimator = CountEstimator(self.db_client, target_sample_rows=estimate_sample_rows)
+
+        # Database schema knowledge, loaded on demand from information_schema/pg_catalog
+        self.schema = SchemaCatalog(self.db_client, refresh_interval=schema_refresh_interval)
+        self.schema.add_listener(self.plan_memo.clear)
+        # Per-template latency statistics and EXPLAIN plans of slow shapes, with index suggestions
+        self.query_shapes = query_shapes if query_shapes is not None else QueryShapeRegistry(self.db_client)
+        self.index_advisor = IndexAdvisor(self.db_client, self.schema)
+
+        # Optional pre-aggregated counts; plans are re-made when it becomes usable or stale
+        self.rollups = rollups
+        if rollups is not None:
+            if rollups.schema is None:
+                rollups.schema = self.schema
+            rollups.add_listener(self.plan_memo.clear)
+            rollups.add_refresh_listener(lambda: self.result_cache.invalidate([ROLLUP_TABLE]))
+
+    @property
+    def known_tables(self) -> Dict[str, List[str]]:
+        """Table -> columns from the schema catalog, or the built-in defaults before it loads."""
+        if self.schema.loaded:
+            return self.schema.table_columns()
+        return DEFAULT_KNOWN_TABLES
+
+    def refresh_schema(self) -> bool:
+        """Reload schema metadata; returns True if it changed."""
+        return self.schema.load()
+
+    def slow_query_report(self, limit: int = 10, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        """The most expensive query shapes, each with its captured plan and suggested indexes."""
+        shapes = self.query_shapes.worst(limit, sort)
+        for shape in shapes:
+            shape["suggested_indexes"] = self.index_advisor.suggest(shape)
+        return shapes
+
+    def create_index(self, table: str, columns: List[str]) -> str:
+        """Build a suggested index, then re-plan with it; returns the DDL that was run."""
+        ddl = self.index_advisor.create(table, columns)
+        self.schema.load()
+        # Plans captured without the index no longer describe what the database does
+        self.query_shapes.reset_plans()
+        return ddl
+
+    def process_query(self, query: str, session_id: str, chart_width: Optional[int] = None,
+                      timings: Optional[Timings] = None,
+                      cancel_token: Optional[CancelToken] = None,
+                      use_context: bool = True, approximate: bool = False) -> Dict[str, Any]:
+        """
+        Process any natural language query using ReAct methodology.
+
+        ``chart_width`` (in pixels) bounds the number of points in chart data.
+        Stage durations are recorded into ``timings`` when one is given.
+        Without ``use_context`` the query neither refines nor replaces the
+        session's remembered result. With ``approximate``, count and aggregate
+        questions are estimated where possible; such responses carry ``estimate``.
+        Raises QueryTimeout past the deadline and QueryCancelled if ``cancel_token``
+        is cancelled; other failures are reported in the response.
+        """
+        timings = timings or Timings()
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
         try:
-            # Step 1: Thought - Analyze what the user wants
-            analysis = self._analyze_natural_language_query(query)
-
-            # Step 2: Action - Generate appropriate SQL
-            sql_query = self._generate_dynamic_sql(analysis)
-
-            # Step 3: Observation - Execute query and get results
-            query_results = self._execute_query(sql_query)
+            cancel_token.check()
+
+            # Step 1 & 2: Thought and Action - Analyze the query and plan its SQL
+            analysis, statement = self._plan_query(query, timings)
+
+            # A follow-up that only narrows, re-sorts or re-limits the last answer needs no query
+            refined = self._refine_previous(query, analysis, session_id, timings) if use_context else None
+            if refined is not None:
+                refined_analysis, refined_results, context = refined
+                with timings.stage("format"):
+                    response = self._format_natural_response(refined_analysis, refined_results,
+                                                             context.statement, chart_width, timings,
+                                                             cancel_token, rerunnable=False)
+                response.update(cached=False, coalesced=False,
+                                refined_from=context.analysis["original_query"])
+                return response
+
+            estimated = self._estimate(analysis, statement, timings, cancel_token) if approximate else None
+            if estimated is not None:
+                estimate_results, estimate = estimated
+                with timings.stage("format"):
+                    response = self._format_natural_response(analysis, estimate_results, statement,
+                                                             chart_width, timings, cancel_token,
+                                                             rerunnable=False)
+                response["response"] += (f"\n\n*Estimated ({estimate['method']}); "
+                                         f"the exact figure may differ slightly.*")
+                response.update(cached=False, coalesced=False, estimate=estimate)
+                return response
+
+            # Step 3: Observation - Execute query (or reuse a cached result)
+            query_results, cached, coalesced = self._run_query(statement, timings, cancel_token)
+            if use_context and analysis["query_type"] not in ("count", "aggregate"):
+                self.session_context.remember(session_id, analysis, statement, query_results)
 
             # Step 4: Response - Format response naturally
-            response = self._format_natural_response(analysis, query_results, sql_query)
+            with timings.stage("format"):
+                response = self._format_natural_response(analysis, query_results, statement,
+                                                         chart_width, timings, cancel_token)
+            response["cached"] = cached
+            response["coalesced"] = coalesced
+            if self.rollups is not None and ROLLUP_TABLE in referenced_tables(statement.sql):
+                response["freshness"] = self.rollups.freshness()
 
             return response
 
+        except (QueryCancelled, QueryTimeout):
+            raise
         except Exception as e:
             return {
                 "error": str(e),
@@ -56,75 +216,304 @@ class ReActAgent:
                 "timestamp": datetime.now().isoformat()
             }
 
-    def _analyze_natural_language_query(self, query: str) -> Dict[str, Any]:
-        """Analyze any natural language query to understand intent and extract key information."""
-        query_lower = query.lower().strip()
-
-        analysis = {
-            "original_query": query,
-            "query_type": "unknown",
-            "entities": [],
-            "actions": [],
-            "filters": {},
-            "aggregations": [],
-            "time_references": [],
-            "table_hints": []
+    async def process_query_async(self, query: str, session_id: str, chart_width: Optional[int] = None,
+                                  timings: Optional[Timings] = None,
+                                  cancel_token: Optional[CancelToken] = None,
+                                  use_context: bool = True, approximate: bool = False) -> Dict[str, Any]:
+        """
+        Process a query on the bounded executor without blocking the event loop.
+
+        Cancelling the awaiting task cancels the query's database work too.
+        With a scheduler, the query first waits for a slot (see ``_scheduled``).
+        """
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        async with self._scheduled(session_id, self._query_cost(query), cancel_token):
+            return await self.executor.run_cancellable(cancel_token, self.process_query, query, session_id,
+                                                       chart_width, timings, cancel_token, use_context,
+                                                       approximate)
+
+    async def process_batch_async(self, queries: List[str], session_id: str,
+                                  chart_width: Optional[int] = None,
+                                  cancel_token: Optional[CancelToken] = None
+                                  ) -> AsyncIterator[Tuple[List[int], Dict[str, Any], Timings]]:
+        """
+        Process independent queries (e.g. dashboard tiles) concurrently.
+
+        Yields ``(indexes, response, timings)`` as each query finishes; repeated
+        query texts run once and report every position they appear at. Queries
+        share the executor, connection pool, result cache and in-flight
+        coalescing, so tiles generating the same SQL hit the database once.
+        Each query gets the batch deadline on its own token, so one slow query
+        times out alone; cancelling ``cancel_token`` stops them all.
+        """
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        positions: Dict[str, List[int]] = {}
+        for index, query in enumerate(queries):
+            positions.setdefault(QueryPlanMemo.normalize(query), []).append(index)
+
+        async def run(indexes: List[int]):
+            query = queries[indexes[0]]
+            timings = Timings()
+            remaining = cancel_token.remaining()
+            token = CancelToken(max(remaining, 1e-3) if remaining is not None else None)
+            with cancel_token.attach(lambda: token.cancel(cancel_token.reason or "cancelled")):
+                try:
+                    response = await self.process_query_async(query, session_id, chart_width, timings,
+                                                              token, use_context=False)
+                except (QueryTimeout, SchedulerBusy) as e:
+                    response = {
+                        "error": str(e),
+                        "sql_query": None,
+                        "data": None,
+                        "charts": None,
+                        "response": f"I encountered an error processing your query: {str(e)}",
+                        "timestamp": datetime.now().isoformat()
+                    }
+            return indexes, response, timings
+
+        tasks = [asyncio.ensure_future(run(indexes)) for indexes in positions.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream_query(self, query: str, session_id: str, batch_size: int = 500,
+                     cancel_token: Optional[CancelToken] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a query incrementally, yielding ``partial`` row batches and then
+        a ``result`` summary; rows are never accumulated server-side.
+        """
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        analysis, statement = self._plan_query(query)
+
+        preview: List[Dict[str, Any]] = []
+        total = 0
+        batches = self.db_client.stream_sql(statement.sql, statement.params, batch_size=batch_size,
+                                            cancel_token=cancel_token)
+        for batch_number, rows in enumerate(batches, 1):
+            if len(preview) < 5:
+                preview.extend(rows[:5 - len(preview)])
+            total += len(rows)
+            yield {"type": "partial", "batch": batch_number, "data": rows}
+
+        yield {"type": "result", "data": self._format_streamed_response(analysis, preview, total, statement)}
+
+    async def stream_query_async(self, query: str, session_id: str, batch_size: int = 500,
+                                 cancel_token: Optional[CancelToken] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async wrapper around stream_query that fetches each batch on the executor."""
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        async with self._scheduled(session_id, self._query_cost(query), cancel_token):
+            events = self.stream_query(query, session_id, batch_size, cancel_token)
+            try:
+                while True:
+                    event = await self.executor.run_cancellable(cancel_token, next, events, None)
+                    if event is None:
+                        return
+                    yield event
+            finally:
+                # Closing the generator releases its pooled connection
+                await self.executor.run(events.close)
+
+    def paginate(self, session_id: str, query: Optional[str] = None, cursor: Optional[str] = None,
+                 page_size: Optional[int] = None, timings: Optional[Timings] = None,
+                 cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        Return one page of a query's rows plus an opaque cursor for the next page.
+
+        Start with ``query``; continue by passing back ``next_cursor``. Raises
+        ValueError for a missing query or malformed cursor.
+        """
+        timings = timings or Timings()
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        last_key = None
+        if cursor:
+            state = decode_cursor(cursor)
+            query, last_key, page_size = state["query"], state["last_key"], state["page_size"]
+        elif not query:
+            raise ValueError("Either a query or a cursor is required")
+
+        analysis, _ = self._plan_query(query, timings)
+        if not page_size:
+            page_size = analysis.get("limit") or self.default_page_size
+        page_size = max(1, min(int(page_size), self.max_page_size))
+
+        with timings.stage("generate_sql"):
+            statement = self._generate_page_sql(analysis, page_size, last_key)
+        with timings.stage("execute"):
+            rows, _ = self.single_flight.do(
+                self._statement_key(statement), lambda: self._execute_query(statement, cancel_token),
+                cancel_token)
+
+        has_more = len(rows) > page_size
+        page = rows[:page_size]
+        next_cursor = None
+        if has_more:
+            keys = self._pagination_keys((analysis["entities"] or ["orders"])[0])
+            next_cursor = encode_cursor(query, [page.column(key)[-1] for key in keys], page_size)
+
+        with timings.stage("format"):
+            table = self.ui_client.format_data_table(page)
+        return {
+            "sql_query": statement.sql,
+            "sql_params": list(statement.params),
+            "data": page,
+            "table": table,
+            "page_size": page_size,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "analysis": analysis,
+            "timestamp": datetime.now().isoformat()
         }
 
-        # Detect query types
-        if any(word in query_lower for word in ["show", "display", "get", "find", "list"]):
-            analysis["query_type"] = "retrieve"
-        elif any(word in query_lower for word in ["count", "how many", "number of"]):
-            analysis["query_type"] = "count"
-        elif any(word in query_lower for word in ["total", "sum", "revenue", "amount"]):
-            analysis["query_type"] = "aggregate"
-        elif any(word in query_lower for word in ["average", "avg", "mean"]):
-            analysis["query_type"] = "average"
-        elif any(word in query_lower for word in ["max", "maximum", "highest", "largest"]):
-            analysis["query_type"] = "maximum"
-        elif any(word in query_lower for word in ["min", "minimum", "lowest", "smallest"]):
-            analysis["query_type"] = "minimum"
-
-        # Detect entities (tables/objects)
-        if any(word in query_lower for word in ["order", "orders", "purchase", "transaction"]):
-            analysis["entities"].append("orders")
-        if any(word in query_lower for word in ["customer", "member", "user", "client"]):
-            analysis["entities"].append("members")
-        if any(word in query_lower for word in ["program", "programs", "campaign"]):
-            analysis["entities"].append("programs")
-
-        # Detect time references
-        if any(word in query_lower for word in ["today", "yesterday", "last week", "this month"]):
-            analysis["time_references"].append("recent")
-        if any(word in query_lower for word in ["last", "latest", "recent", "newest"]):
-            analysis["time_references"].append("latest")
-        if any(word in query_lower for word in ["first", "oldest", "earliest"]):
-            analysis["time_references"].append("earliest")
-
-        # Detect status filters
-        if "paid" in query_lower:
-            analysis["filters"]["payment_status"] = "PAID"
-        if "pending" in query_lower:
-            if "payment" in query_lower:
-                analysis["filters"]["payment_status"] = "PENDING"
-            elif "fulfillment" in query_lower:
-                analysis["filters"]["fulfillment_status"] = "PENDING"
-        if "fulfilled" in query_lower:
-            analysis["filters"]["fulfillment_status"] = "FULFILLED"
-
-        # Detect limits
-        numbers = re.findall(r'\b(\d+)\b', query_lower)
-        if numbers:
-            analysis["limit"] = int(numbers[0])
-        elif any(word in query_lower for word in ["all", "everything"]):
-            analysis["limit"] = None
-        else:
-            analysis["limit"] = 10  # Default reasonable limit
+    async def paginate_async(self, session_id: str, query: Optional[str] = None,
+                             cursor: Optional[str] = None, page_size: Optional[int] = None,
+                             timings: Optional[Timings] = None,
+                             cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """Fetch a page on the bounded executor."""
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        # Pages are bounded, so they cost about as much as a limited retrieve of one page
+        cost = 2.0 + min(page_size or self.default_page_size, self.max_page_size) / 100
+        async with self._scheduled(session_id, cost, cancel_token):
+            return await self.executor.run_cancellable(cancel_token, self.paginate, session_id, query, cursor,
+                                                       page_size, timings, cancel_token)
+
+    def export_csv(self, query: str, compress: bool = False, cancel_token: Optional[CancelToken] = None,
+                   chunk_size: int = 64 * 1024, queue_size: int = 8) -> AsyncIterator[bytes]:
+        """
+        Stream every row of ``query`` as CSV (gzip-compressed with ``compress``)
+        straight from ``COPY ... TO STDOUT``; memory use is bounded by the chunk queue.
+        Rows are only limited when the query names a number.
+
+        Raises SchedulerBusy rather than queueing when ``export_concurrency``
+        exports are already running.
+        """
+        if self._exports_running >= self.export_concurrency:
+            raise SchedulerBusy(f"{self.export_concurrency} exports are already running; "
+                                f"retry when one finishes", "global", retry_after=5.0)
+        cancel_token = cancel_token or CancelToken(self.query_timeout)
+        analysis, statement = self._plan_query(query)
+        # Exports are whole results: only a row count the query states itself limits them
+        _, number = self.intent_parser.scan(query.lower())
+        if number is None and analysis["limit"] is not None:
+            statement = self._generate_dynamic_sql(dict(analysis, limit=None))
+        return self._stream_export(statement, compress, cancel_token, chunk_size, queue_size)
+
+    async def _stream_export(self, statement: SQLStatement, compress: bool, cancel_token: CancelToken,
+                             chunk_size: int, queue_size: int) -> AsyncIterator[bytes]:
+        # The slot is only taken once the body is read, so a response that is never
+        # streamed (the client left before it started) holds nothing. Exports admitted
+        # together past the check in export_csv wait here for a slot.
+        while not self._claim_export_slot():
+            cancel_token.check()
+            await asyncio.sleep(0.05)
+        chunks = stream_copy(
+            self.export_executor,
+            lambda out: self.db_client.copy_csv(statement.sql, statement.params, out, cancel_token),
+            cancel_token, compress, chunk_size, queue_size)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            with self._export_lock:
+                self._exports_running -= 1
+
+    def _claim_export_slot(self) -> bool:
+        with self._export_lock:
+            if self._exports_running >= self.export_concurrency:
+                return False
+            self._exports_running += 1
+            return True
+
+    def plan(self, query: str) -> Tuple[Dict[str, Any], SQLStatement]:
+        """Return (analysis, statement) for ``query`` without running it."""
+        return self._plan_query(query)
+
+    def execute_uncached(self, statement: SQLStatement,
+                         cancel_token: Optional[CancelToken] = None) -> ColumnarResult:
+        """Run ``statement`` against current data, bypassing (but still refreshing) the result cache."""
+        results, _ = self.single_flight.do(self._statement_key(statement),
+                                           lambda: self._execute_query(statement, cancel_token), cancel_token)
+        self.result_cache.set(statement.sql, results, statement.params)
+        return results
+
+    def close(self) -> None:
+        """Release worker threads and pooled database connections."""
+        self.schema.stop()
+        self.query_shapes.stop()
+        if self.rollups is not None:
+            self.rollups.stop()
+        self.executor.shutdown()
+        self.export_executor.shutdown()
+        self.db_client.close()
+
+    def _plan_query(self, query: str,
+                    timings: Optional[Timings] = None) -> Tuple[Dict[str, Any], SQLStatement]:
+        """Return (analysis, statement) for ``query``, reusing memoized plans for repeated phrasing."""
+        timings = timings or Timings()
+        with timings.stage("plan_lookup"):
+            plan = self.plan_memo.get(query)
+        if plan is not None and not self._uses_stale_rollup(plan[1]):
+            return plan
+
+        with timings.stage("analyze"):
+            analysis = self._analyze_natural_language_query(query)
+        with timings.stage("generate_sql"):
+            statement = self._generate_dynamic_sql(analysis)
+        self.plan_memo.set(query, analysis, statement)
+        return analysis, statement
+
+    def _uses_stale_rollup(self, statement: SQLStatement) -> bool:
+        """True if ``statement`` reads the rollup and it is no longer fresh enough to answer."""
+        # Availability is otherwise only re-checked by refreshes, which may be failing or stopped
+        return (self.rollups is not None and ROLLUP_TABLE in referenced_tables(statement.sql)
+                and not self.rollups.check_availability())
+
+    def _estimate(self, analysis: Dict[str, Any], statement: SQLStatement, timings: Timings,
+                  cancel_token: CancelToken) -> Optional[Tuple[ColumnarResult, Dict[str, Any]]]:
+        """Approximate rows and error bounds for a count or aggregate question, or None to run it exactly."""
+        # Rollup answers are already exact and cheap
+        if analysis["query_type"] not in ("count", "aggregate") or ROLLUP_TABLE in referenced_tables(statement.sql):
+            return None
+        table = (analysis["entities"] or ["orders"])[0]
+        with timings.stage("estimate"):
+            conditions, params = self._build_where_conditions(analysis["filters"], table)
+            return self.estimator.estimate(table, analysis["query_type"], conditions, params, cancel_token)
+
+    def _scheduled(self, session_id: str, cost: float, cancel_token: CancelToken):
+        """
+        Async context holding a scheduler slot for one query, or nothing without a scheduler.
+
+        Raises SchedulerBusy when the session's or the service's queue is full.
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(session_id, cost, cancel_token)
+
+    def _query_cost(self, query: str) -> float:
+        """Estimated relative cost of ``query``, from its (usually memoized) plan."""
+        if self.scheduler is None:
+            return 1.0
+        try:
+            analysis, _ = self._plan_query(query)
+        except Exception:
+            # process_query reports the failure itself
+            return 1.0
+        return estimate_cost(analysis)
+
+    def _analyze_natural_language_query(self, query: str) -> Dict[str, Any]:
+        """Analyze any natural language query to understand intent and extract key information."""
+        return self.intent_parser.parse(query)
 
-        return analysis
+    def _generate_dynamic_sql(self, analysis: Dict[str, Any]) -> SQLStatement:
+        """
+        Generate SQL based on natural language analysis.
 
-    def _generate_dynamic_sql(self, analysis: Dict[str, Any]) -> str:
-        """Generate SQL based on natural language analysis."""
+        Filter values and limits are bound as parameters, so one template is
+        shared (and prepared once per connection) by every query of the same shape.
+        """
         entities = analysis["entities"]
         query_type = analysis["query_type"]
         filters = analysis["filters"]
@@ -137,82 +526,296 @@ class ReActAgent:
 
         primary_entity = entities[0]
 
+        # Counts and totals over orders are answered from the rollup when it is fresh
+        if self.rollups is not None and self.rollups.covers(analysis):
+            return self.rollups.statement(analysis)
+
         # Build SELECT clause based on query type
-        if query_type == "count":
-            select_clause = "SELECT COUNT(*) as total_count"
-        elif query_type == "aggregate":
-            if primary_entity == "orders":
-                select_clause = """SELECT
-                    COUNT(*) as total_orders,
-                    COUNT(CASE WHEN payment_status = 'PAID' THEN 1 END) as paid_orders,
-                    COUNT(CASE WHEN fulfillment_status = 'FULFILLED' THEN 1 END) as fulfilled_orders"""
-            else:
-                select_clause = "SELECT COUNT(*) as total_count"
-        else:
-            # Default retrieve - show relevant columns
-            if primary_entity == "orders":
-                select_clause = """SELECT
-                    id,
-                    external_id,
-                    created_at,
-                    payment_status,
-                    fulfillment_status,
-                    program_id"""
-            elif primary_entity == "programs":
-                select_clause = "SELECT id, name, description"
-            elif primary_entity == "members":
-                select_clause = "SELECT id, email, first_name, last_name"
-            else:
-                select_clause = "SELECT *"
+        select_clause = self._build_select_clause(query_type, primary_entity)
 
         # Build FROM clause
         from_clause = f"FROM {primary_entity}"
 
         # Build WHERE clause
-        where_conditions = []
-        for field, value in filters.items():
-            where_conditions.append(f"{field} = '{value}'")
+        where_conditions, params = self._build_where_conditions(filters, primary_entity)
 
         where_clause = ""
         if where_conditions:
             where_clause = "WHERE " + " AND ".join(where_conditions)
 
-        # Build ORDER BY clause
+        # Build ORDER BY clause on an index-friendly column; aggregates need no ordering
         order_clause = ""
-        if "latest" in time_refs and primary_entity in ["orders"]:
-            order_clause = "ORDER BY created_at DESC"
-        elif "earliest" in time_refs and primary_entity in ["orders"]:
-            order_clause = "ORDER BY created_at ASC"
-        elif query_type == "retrieve" and primary_entity == "orders":
-            order_clause = "ORDER BY created_at DESC"
+        sort_column = self._sort_column(primary_entity)
+        if sort_column and query_type not in ("count", "aggregate"):
+            if "latest" in time_refs:
+                order_clause = f"ORDER BY {sort_column} DESC"
+            elif "earliest" in time_refs:
+                order_clause = f"ORDER BY {sort_column} ASC"
+            elif query_type == "retrieve" and primary_entity == "orders":
+                order_clause = f"ORDER BY {sort_column} DESC"
 
         # Build LIMIT clause
         limit_clause = ""
         if limit and query_type != "count" and query_type != "aggregate":
-            limit_clause = f"LIMIT {limit}"
+            limit_clause = "LIMIT %s"
+            params.append(limit)
 
         # Combine all parts
         sql_parts = [select_clause, from_clause, where_clause, order_clause, limit_clause]
         sql_query = " ".join([part for part in sql_parts if part])
 
-        return sql_query
+        return SQLStatement(sql_query, tuple(params))
+
+    def _build_select_clause(self, query_type: str, primary_entity: str) -> str:
+        """Build the SELECT clause for a query type and entity."""
+        if query_type == "count":
+            return "SELECT COUNT(*) as total_count"
+        elif query_type == "aggregate":
+            if primary_entity == "orders":
+                return """SELECT
+                    COUNT(*) as total_orders,
+                    COUNT(CASE WHEN payment_status = 'PAID' THEN 1 END) as paid_orders,
+                    COUNT(CASE WHEN fulfillment_status = 'FULFILLED' THEN 1 END) as fulfilled_orders"""
+            return "SELECT COUNT(*) as total_count"
+
+        # Default retrieve - show only the relevant columns that exist
+        columns = self._retrieve_columns(primary_entity)
+        if columns is not None:
+            return "SELECT " + ", ".join(quote_identifier(column) for column in columns)
+
+        if primary_entity == "orders":
+            return """SELECT
+                    id,
+                    external_id,
+                    created_at,
+                    payment_status,
+                    fulfillment_status,
+                    program_id"""
+        elif primary_entity == "programs":
+            return "SELECT id, name, description"
+        elif primary_entity == "members":
+            return "SELECT id, email, first_name, last_name"
+        return "SELECT *"
+
+    def _retrieve_columns(self, primary_entity: str) -> Optional[List[str]]:
+        """Columns shown for rows of a catalogued table, or None if the catalog does not know it."""
+        table = self.schema.get(primary_entity)
+        if table is None:
+            return None
+        preferred = RETRIEVE_COLUMNS.get(primary_entity, [])
+        return [column for column in preferred if table.has_column(column)] or list(table.columns)
+
+    def _build_where_conditions(self, filters: Dict[str, Any],
+                                primary_entity: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+        """Build WHERE conditions for the detected status filters, with values as parameters."""
+        table = self.schema.get(primary_entity) if primary_entity else None
+        where_conditions = []
+        params: List[Any] = []
+        for field, value in filters.items():
+            if table is not None and not table.has_column(field):
+                raise ValueError(f"{primary_entity} has no column '{field}' to filter on")
+            where_conditions.append(f"{quote_identifier(field)} = %s")
+            params.append(value)
+        return where_conditions, params
+
+    def _sort_column(self, primary_entity: str) -> Optional[str]:
+        """Column used for newest/oldest ordering, taken from the schema when available."""
+        table = self.schema.get(primary_entity)
+        if table is not None:
+            column = table.sort_column()
+            return quote_identifier(column) if column else None
+        return "created_at" if primary_entity == "orders" else None
+
+    def _pagination_keys(self, primary_entity: str) -> List[str]:
+        """Unique sort keys for keyset pagination: sort column plus primary key."""
+        table = self.schema.get(primary_entity)
+        if table is None or not table.primary_key:
+            return pagination_keys(primary_entity)
+        sort_column = table.sort_column()
+        keys = [sort_column] if sort_column and sort_column not in table.primary_key else []
+        return keys + table.primary_key
+
+    def _generate_page_sql(self, analysis: Dict[str, Any], page_size: int,
+                           last_key: Optional[List[Any]] = None) -> SQLStatement:
+        """
+        Generate a keyset-paginated query and its parameters.
+
+        Rows after ``last_key`` are selected with a row-value comparison on the
+        table's pagination keys instead of OFFSET, so every page costs the same.
+        One extra row is fetched to tell whether another page exists.
+        """
+        primary_entity = (analysis["entities"] or ["orders"])[0]
+        key_columns = self._pagination_keys(primary_entity)
+        keys = [quote_identifier(key) for key in key_columns]
+        time_refs = analysis["time_references"]
 
-    def _execute_query(self, sql_query: str) -> Optional[List[Dict[str, Any]]]:
-        """Execute SQL query using MCP database client."""
+        # Same direction rules as _generate_dynamic_sql: orders default to newest first
+        descending = primary_entity == "orders" and not ("earliest" in time_refs and "latest" not in time_refs)
+        direction = "DESC" if descending else "ASC"
+
+        where_conditions, params = self._build_where_conditions(analysis["filters"], primary_entity)
+        if last_key is not None:
+            if len(last_key) != len(keys):
+                raise ValueError("Invalid pagination cursor")
+            placeholders = ", ".join(["%s"] * len(keys))
+            where_conditions.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({placeholders})")
+            params.extend(last_key)
+
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        order_clause = "ORDER BY " + ", ".join(f"{key} {direction}" for key in keys)
+        params.append(page_size + 1)
+
+        # The next cursor is read from the page's last row, so the keys are always selected
+        columns = self._retrieve_columns(primary_entity)
+        if columns is not None:
+            columns += [key for key in key_columns if key not in columns]
+            select_clause = "SELECT " + ", ".join(quote_identifier(column) for column in columns)
+        else:
+            select_clause = self._build_select_clause("retrieve", primary_entity)
+
+        sql_parts = [select_clause, f"FROM {primary_entity}", where_clause, order_clause, "LIMIT %s"]
+        return SQLStatement(" ".join(part for part in sql_parts if part), tuple(params))
+
+    def _generate_time_series_sql(self, statement: SQLStatement, time_column: str, bucket: str,
+                                  value_column: Optional[str] = None) -> SQLStatement:
+        """
+        Wrap a query so Postgres aggregates its rows into date_trunc buckets.
+
+        Buckets hold SUM(value_column) when a value column is given, else COUNT(*).
+        """
+        if bucket not in dict(TIME_BUCKETS):
+            raise ValueError(f"Unsupported time bucket: {bucket}")
+
+        def quote(identifier: str) -> str:
+            return '"' + identifier.replace('"', '""') + '"'
+
+        value = f"SUM({quote(value_column)}) AS {quote(value_column)}" if value_column else "COUNT(*) AS total_count"
+        return SQLStatement(f"SELECT date_trunc('{bucket}', {quote(time_column)}) AS bucket, {value} "
+                            f"FROM ({statement.sql}) AS source GROUP BY 1 ORDER BY 1", statement.params)
+
+    def _refine_previous(self, query: str, analysis: Dict[str, Any], session_id: str,
+                         timings: Timings) -> Optional[Tuple[Dict[str, Any], ColumnarResult, SessionResult]]:
+        """
+        Answer a follow-up from the session's previous result when it only narrows it.
+
+        Filters, "latest"/"oldest" re-sorts, "first/last N" limits and "how many"
+        are applied to the remembered rows. Returns (analysis, results, context),
+        or None when the question needs a database query: it asks for more rows
+        than are remembered, names a time range, or filters a column the previous
+        question already fixed to another value.
+        """
+        query_lower = query.lower()
+        if not (_ANAPHORA.search(query_lower) or (_ONLY.search(query_lower) and not analysis["entities"])):
+            return None
+        context = self.session_context.recall(session_id)
+        if context is None:
+            return None
+
+        previous = context.analysis
+        entity = (previous["entities"] or ["orders"])[0]
+        results = context.results
+        if (analysis["entities"] not in ([], [entity]) or analysis["query_type"] == "aggregate"
+                or any(field not in results.columns for field in analysis["filters"])):
+            return None
+        # The remembered rows cannot be widened: no more of them, no other period, no other status
+        _, number = self.intent_parser.scan(query_lower)
+        if ((number is not None and number > context.rows) or "recent" in analysis["time_references"]
+                or any(previous["filters"].get(field, value) != value
+                       for field, value in analysis["filters"].items())):
+            return None
+
+        with timings.stage("refine"):
+            filters = [(results.column(field), value) for field, value in analysis["filters"].items()]
+            indices = [i for i in range(len(results)) if all(values[i] == value for values, value in filters)]
+
+            sort_column = self._sort_column(entity)
+            for descending, pattern in _RESORT:
+                if pattern.search(query_lower) and sort_column and sort_column in results.columns:
+                    values = results.column(sort_column)
+                    present = [i for i in indices if values[i] is not None]
+                    present.sort(key=values.__getitem__, reverse=descending)
+                    indices = present + [i for i in indices if values[i] is None]
+                    break
+
+            if number is not None:
+                indices = indices[-number:] if _LAST.search(query_lower) else indices[:number]
+
+            refined_analysis = dict(analysis, entities=[entity],
+                                    filters={**previous["filters"], **analysis["filters"]})
+            if analysis["query_type"] == "count":
+                return refined_analysis, ColumnarResult.from_rows(["total_count"], [[len(indices)]]), context
+
+            refined_analysis["query_type"] = previous["query_type"]
+            refined = results.take(indices)
+            # Later follow-ups refer to this narrowed result
+            self.session_context.remember(session_id, refined_analysis, context.statement, refined)
+        return refined_analysis, refined, context
+
+    def _run_query(self, statement: SQLStatement, timings: Optional[Timings] = None,
+                   cancel_token: Optional[CancelToken] = None):
+        """
+        Return (results, cached, coalesced) for ``statement``.
+
+        The result cache is consulted first; on a miss, concurrent identical
+        statements wait for a single execution and share its result.
+        """
+        timings = timings or Timings()
+        with timings.stage("cache_lookup"):
+            query_results = self.result_cache.get(statement.sql, statement.params)
+        if query_results is not None:
+            return query_results, True, False
+
+        def execute() -> Optional[ColumnarResult]:
+            results = self._execute_query(statement, cancel_token)
+            # Cache before releasing waiters so later arrivals hit the cache instead
+            self.result_cache.set(statement.sql, results, statement.params)
+            return results
+
+        with timings.stage("execute"):
+            query_results, coalesced = self.single_flight.do(self._statement_key(statement), execute,
+                                                             cancel_token)
+        return query_results, False, coalesced
+
+    @staticmethod
+    def _statement_key(statement: SQLStatement) -> Tuple[str, Tuple[Any, ...]]:
+        return normalize_sql(statement.sql), tuple(statement.params)
+
+    def _execute_query(self, statement: SQLStatement,
+                       cancel_token: Optional[CancelToken] = None) -> Optional[ColumnarResult]:
+        """Execute SQL query using MCP database client, reusing its prepared plan."""
         try:
-            result = self.db_client.execute_sql(sql_query)
+            started = time.perf_counter()
+            result = self.db_client.execute_columnar(statement.sql, statement.params, prepare=True,
+                                                     cancel_token=cancel_token)
+            elapsed = time.perf_counter() - started
+            rows = len(result)
+            DB_QUERY_SECONDS.observe(elapsed, rows=row_bucket(rows))
+            self.query_shapes.record(statement, elapsed, rows)
+            DB_ROWS.observe(rows)
             return result
+        except (QueryCancelled, QueryTimeout):
+            raise
         except Exception as e:
             raise Exception(f"Database query failed: {str(e)}")
 
     def _format_natural_response(self, analysis: Dict[str, Any],
-                                query_results: Optional[List[Dict[str, Any]]],
-                                sql_query: str) -> Dict[str, Any]:
-        """Format the response naturally based on what the user asked."""
+                                query_results: Optional[QueryResult],
+                                statement: SQLStatement,
+                                chart_width: Optional[int] = None,
+                                timings: Optional[Timings] = None,
+                                cancel_token: Optional[CancelToken] = None,
+                                rerunnable: bool = True) -> Dict[str, Any]:
+        """
+        Format the response naturally based on what the user asked.
+
+        ``rerunnable`` is False when ``query_results`` were refined in memory and
+        no longer match ``statement``, so charts are built from the rows as-is.
+        """
         if not query_results:
             return {
                 "error": "No data found",
-                "sql_query": sql_query,
+                "sql_query": statement.sql,
+                "sql_params": list(statement.params),
                 "data": None,
                 "charts": None,
                 "response": "I couldn't find any data matching your query.",
@@ -224,10 +827,13 @@ class ReActAgent:
         # Generate chart if data is suitable
         chart_config = None
         if len(query_results) > 1 or analysis["query_type"] == "aggregate":
-            chart_config = self.ui_client.generate_chart_config(query_results, analysis["original_query"])
+            max_points = max(chart_width or self.chart_max_points, 3)
+            chart_config = self._build_chart(analysis, query_results, statement, max_points,
+                                             timings, cancel_token, rerunnable)
 
         return {  # ✅ FIXED: 8 spaces for proper indentation
-            "sql_query": sql_query,
+            "sql_query": statement.sql,
+            "sql_params": list(statement.params),
             "data": query_results,
             "charts": chart_config,
             "response": response_text,
@@ -235,9 +841,72 @@ class ReActAgent:
             "timestamp": datetime.now().isoformat()
         }
 
+    def _build_chart(self, analysis: Dict[str, Any], query_results: QueryResult,
+                     statement: SQLStatement, max_points: int, timings: Optional[Timings] = None,
+                     cancel_token: Optional[CancelToken] = None,
+                     rerunnable: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Build a chart whose payload is bounded by ``max_points``.
+
+        Questions asking for a trend or chart get time series without a value
+        column, or with more raw rows than points, bucketed in SQL with
+        date_trunc (unit chosen from the time span). Other listings are charted
+        from the rows already fetched, counted per bucket in memory, so they
+        cost no second round-trip; the UI client downsamples whatever still
+        exceeds ``max_points``.
+        """
+        chart_config = self.ui_client.generate_chart_config(
+            query_results, analysis["original_query"], max_points=max_points)
+        if (chart_config is None or chart_config["chart_type"] != "line"
+                or not isinstance(query_results, ColumnarResult)):
+            return chart_config
+
+        value_column = chart_config["y_axis"]
+        in_sql = rerunnable and bool(_TREND.search(analysis["original_query"].lower()))
+        if value_column is not None and (len(query_results) <= max_points or not in_sql):
+            return chart_config
+
+        time_column = chart_config["x_axis"]
+        timestamps = [t for t in map(parse_timestamp, query_results.column(time_column)) if t is not None]
+        if not timestamps:
+            return chart_config
+
+        bucket = choose_time_bucket(min(timestamps), max(timestamps), max_points)
+        if in_sql:
+            series_statement = self._generate_time_series_sql(statement, time_column, bucket, value_column)
+            series, _, _ = self._run_query(series_statement, timings, cancel_token)
+        else:
+            series = ColumnarResult.from_rows(["bucket", "total_count"],
+                                              bucket_counts(query_results.column(time_column), bucket))
+        return self.ui_client.generate_time_series_chart(
+            series, bucket, "bucket", value_column or "total_count", max_points)
+
+    def _format_streamed_response(self, analysis: Dict[str, Any], preview: List[Dict[str, Any]],
+                                  total: int, statement: SQLStatement) -> Dict[str, Any]:
+        """Format the summary sent after all streamed batches; rows are not repeated."""
+        if not total:
+            return self._format_natural_response(analysis, None, statement)
+
+        return {
+            "sql_query": statement.sql,
+            "sql_params": list(statement.params),
+            "data": None,
+            "row_count": total,
+            "streamed": True,
+            "charts": None,
+            "response": self._generate_contextual_response(analysis, preview, total),
+            "analysis": analysis,
+            "timestamp": datetime.now().isoformat()
+        }
+
     def _generate_contextual_response(self, analysis: Dict[str, Any],
-                                    data: List[Dict[str, Any]]) -> str:
-        """Generate a natural language response based on what the user asked and what we found."""
+                                    data: QueryResult,
+                                    total: Optional[int] = None) -> str:
+        """
+        Generate a natural language response based on what the user asked and what we found.
+
+        ``total`` is the full row count when ``data`` is only a preview of the result.
+        """
         query_type = analysis["query_type"]
         entities = analysis["entities"]
         original_query = analysis["original_query"]
@@ -245,6 +914,9 @@ class ReActAgent:
         if not data:
             return "No data found for your query."
 
+        if total is None:
+            total = len(data)
+
         # Handle count queries
         if query_type == "count":
             count = data[0].get("total_count", len(data))
@@ -268,7 +940,7 @@ class ReActAgent:
             return response
 
         # Handle single record queries
-        elif len(data) == 1:
+        elif total == 1:
             record = data[0]
             entity_name = entities[0] if entities else "record"
             response = f"**{entity_name.title()} Details:**\n\n"
@@ -284,7 +956,7 @@ class ReActAgent:
         # Handle multiple records
         else:
             entity_name = entities[0] if entities else "records"
-            response = f"**Found {len(data)} {entity_name}:**\n\n"
+            response = f"**Found {total} {entity_name}:**\n\n"
 
             for i, record in enumerate(data[:5], 1):  # Show first 5
                 response += f"**{i}.** "
@@ -300,8 +972,8 @@ class ReActAgent:
                     response += " | ".join(shown_fields[:3])  # Max 3 fields per line
                 response += "\n"
 
-            if len(data) > 5:
-                response += f"\n... and {len(data) - 5} more records.\n"
+            if total > 5:
+                response += f"\n... and {total - 5} more records.\n"
 
             response += f"\n*Real data from pangea_development database.*"
             return response
\ No newline at end of file
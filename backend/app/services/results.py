@@ -0,0 +1,121 @@
+"""
+Columnar representation of query results.
+"""
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+
+def _column_type(values: Sequence[Any]) -> str:
+    """Name the logical type of a column from its first non-null value."""
+    sample = next((value for value in values if value is not None), None)
+    if sample is None:
+        return "null"
+    if isinstance(sample, bool):
+        return "boolean"
+    if isinstance(sample, int):
+        return "integer"
+    if isinstance(sample, (float, Decimal)):
+        return "number"
+    if isinstance(sample, datetime):
+        return "datetime"
+    if isinstance(sample, date):
+        return "date"
+    if isinstance(sample, time_of_day):
+        return "time"
+    return "string"
+
+
+class ColumnarResult:
+    """
+    Query result stored column-major: names once, one list of values per column.
+
+    Row-style access (``len``, indexing, iteration yielding dicts) is supported
+    so code written against the old list-of-dicts results keeps working.
+    """
+
+    __slots__ = ("columns", "data", "types")
+
+    def __init__(self, columns: List[str], data: List[List[Any]], types: Optional[List[str]] = None):
+        self.columns = columns
+        self.data = data
+        self.types = types if types is not None else [_column_type(values) for values in data]
+
+    @classmethod
+    def from_rows(cls, columns: List[str], rows: Sequence[Sequence[Any]]) -> "ColumnarResult":
+        """Transpose fetched row tuples, converting temporal columns to ISO strings once per column."""
+        data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+        types = [_column_type(values) for values in data]
+        for i, column_type in enumerate(types):
+            if column_type in ("datetime", "date", "time"):
+                data[i] = [value.isoformat() if value is not None else None for value in data[i]]
+        return cls(columns, data, types)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "ColumnarResult":
+        """Build a columnar result from a list of dictionaries."""
+        if not records:
+            return cls([], [])
+        columns = list(records[0].keys())
+        return cls(columns, [[record.get(column) for record in records] for column in columns])
+
+    @property
+    def row_count(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def column(self, name: str) -> List[Any]:
+        """Return the values of column ``name``."""
+        return self.data[self.columns.index(name)]
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Return row ``index`` as a dictionary."""
+        return {column: values[index] for column, values in zip(self.columns, self.data)}
+
+    def take(self, indices: Sequence[int]) -> "ColumnarResult":
+        """Return a new result containing only the rows at ``indices``."""
+        return ColumnarResult(self.columns, [[values[i] for i in indices] for values in self.data], self.types)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Materialize the result as a list of dictionaries."""
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*self.data)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Columnar wire representation."""
+        return {
+            "columns": self.columns,
+            "types": self.types,
+            "data": self.data,
+            "row_count": self.row_count,
+        }
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        columns = self.columns
+        for values in zip(*self.data):
+            yield dict(zip(columns, values))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], "ColumnarResult"]:
+        if isinstance(index, slice):
+            return ColumnarResult(self.columns, [values[index] for values in self.data], self.types)
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("result row index out of range")
+        return self.row(index)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ColumnarResult):
+            return self.columns == other.columns and self.data == other.data
+        if isinstance(other, list):
+            return self.to_records() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ColumnarResult(columns={self.columns!r}, rows={self.row_count})"
+
+
+# Results handled by the cache and UI client may be columnar or legacy record lists
+QueryResult = Union[ColumnarResult, List[Dict[str, Any]]]
@@ -0,0 +1,276 @@
+"""
+Pre-aggregated order counts, maintained incrementally from an ``updated_at`` watermark.
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .schema import SchemaCatalog
+from .statements import SQLStatement
+
+logger = logging.getLogger(__name__)
+
+
+ROLLUP_TABLE = "orders_daily_rollup"
+DIMENSIONS = ("payment_status", "fulfillment_status", "program_id")
+
+# Dimension columns are filled in with the types of the matching ``orders`` columns
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS orders_daily_rollup (
+    day date NOT NULL,
+    {dimensions},
+    order_count bigint NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_daily_rollup_day_idx ON orders_daily_rollup (day);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name text PRIMARY KEY,
+    watermark timestamp,
+    refreshed_at timestamp with time zone
+);
+INSERT INTO rollup_state (name) VALUES ('orders_daily_rollup') ON CONFLICT (name) DO NOTHING;
+"""
+
+# Serializes refreshes across processes; the snapshot time is when the rollup is "as of"
+LOCK_STATE_SQL = "SELECT watermark, now() AS as_of FROM rollup_state WHERE name = %s FOR UPDATE"
+# The watermark stays ``watermark_lag`` behind the snapshot so rows from transactions
+# that commit late (with an older updated_at) are still seen by the next refresh
+NEXT_WATERMARK_SQL = """
+SELECT LEAST(max(updated_at), localtimestamp - %s * interval '1 second')
+FROM orders WHERE updated_at > %s
+"""
+CHANGED_DAYS_SQL = "SELECT DISTINCT created_at::date FROM orders WHERE updated_at > %s"
+
+BACKFILL_SQL = """
+INSERT INTO orders_daily_rollup (day, payment_status, fulfillment_status, program_id, order_count)
+SELECT created_at::date, payment_status, fulfillment_status, program_id, count(*)
+FROM orders
+GROUP BY 1, 2, 3, 4
+"""
+
+# Range predicates per day keep an index on orders.created_at usable
+RECOMPUTE_DAYS_SQL = """
+INSERT INTO orders_daily_rollup (day, payment_status, fulfillment_status, program_id, order_count)
+SELECT d.day, o.payment_status, o.fulfillment_status, o.program_id, count(*)
+FROM unnest(%s::date[]) AS d(day)
+JOIN orders o ON o.created_at >= d.day AND o.created_at < d.day + 1
+GROUP BY 1, 2, 3, 4
+"""
+
+SAVE_STATE_SQL = "UPDATE rollup_state SET watermark = %s, refreshed_at = %s WHERE name = %s"
+
+AGGREGATE_COLUMNS = {
+    "count": ["COALESCE(SUM(order_count), 0)::bigint AS total_count"],
+    "aggregate": [
+        "COALESCE(SUM(order_count), 0)::bigint AS total_orders",
+        "COALESCE(SUM(order_count) FILTER (WHERE payment_status = 'PAID'), 0)::bigint AS paid_orders",
+        "COALESCE(SUM(order_count) FILTER (WHERE fulfillment_status = 'FULFILLED'), 0)::bigint"
+        " AS fulfilled_orders",
+    ],
+}
+
+
+class RollupManager:
+    """
+    Daily order counts by payment status, fulfillment status and program.
+
+    The first refresh backfills the rollup from ``orders``. Later refreshes
+    find orders whose ``updated_at`` passed the watermark and recompute only
+    the days they were created on, so status changes are applied without a
+    full scan. The watermark trails the refresh snapshot by ``watermark_lag``
+    seconds, so orders written by transactions that commit late are seen by
+    the next refresh; recomputing a day twice is harmless. Deleted orders are
+    only reflected by a rebuild.
+
+    Queries are routed to the rollup while the last refresh is younger than
+    ``max_staleness``. Listeners run when that availability changes, and
+    refresh listeners run after every refresh that rewrote rollup rows.
+
+    The rollup's dimension columns take their types from ``schema`` (a
+    catalog of its own is loaded if none is given).
+    """
+
+    def __init__(self, db_client, refresh_interval: float = 60.0, max_staleness: float = 300.0,
+                 watermark_lag: float = 5.0, schema: Optional[SchemaCatalog] = None):
+        self.db_client = db_client
+        self.schema = schema
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.watermark_lag = watermark_lag
+
+        self.watermark: Optional[datetime] = None
+        self.as_of: Optional[datetime] = None
+        self.refreshes = 0
+        self.days_recomputed = 0
+        self.last_error: Optional[str] = None
+
+        self._created = False
+        self._available = False
+        self._listeners: List[Callable[[], None]] = []
+        self._refresh_listeners: List[Callable[[], None]] = []
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        """True when the rollup is loaded and fresh enough to answer queries."""
+        age = self.age()
+        return age is not None and age <= self.max_staleness
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Register a callback invoked when the rollup becomes usable or too stale."""
+        self._listeners.append(listener)
+
+    def add_refresh_listener(self, listener: Callable[[], None]) -> None:
+        """Register a callback invoked after a refresh that rewrote rollup rows."""
+        self._refresh_listeners.append(listener)
+
+    def refresh(self, rebuild: bool = False) -> int:
+        """
+        Bring the rollup up to date; returns the number of days recomputed (-1 for a backfill).
+
+        ``rebuild`` discards the rollup and backfills it from scratch.
+        """
+        with self._refresh_lock:
+            try:
+                days = self._refresh(rebuild)
+            except Exception as e:
+                self.last_error = str(e)
+                self.check_availability()
+                raise
+            self.last_error = None
+            self.refreshes += 1
+
+        self.check_availability()
+        if days:
+            for listener in self._refresh_listeners:
+                listener()
+        return days
+
+    def check_availability(self) -> bool:
+        """
+        Re-evaluate ``available`` now, running listeners if it changed.
+
+        Refreshes do this themselves; callers use it to notice the rollup
+        aging out while refreshes are failing or not running at all.
+        """
+        available = self.available
+        if available != self._available:
+            self._available = available
+            for listener in self._listeners:
+                listener()
+        return available
+
+    def covers(self, analysis: Dict[str, Any]) -> bool:
+        """True if the rollup can answer ``analysis`` exactly."""
+        entities = analysis["entities"] or ["orders"]
+        return (self.available
+                and analysis["query_type"] in AGGREGATE_COLUMNS
+                and entities[0] == "orders"
+                and all(field in DIMENSIONS for field in analysis["filters"]))
+
+    def statement(self, analysis: Dict[str, Any]) -> SQLStatement:
+        """SQL answering a count or aggregate question from the rollup."""
+        fields = list(analysis["filters"])
+        sql = f"SELECT {', '.join(AGGREGATE_COLUMNS[analysis['query_type']])} FROM {ROLLUP_TABLE}"
+        if fields:
+            sql += " WHERE " + " AND ".join(f"{field} = %s" for field in fields)
+        return SQLStatement(sql, tuple(analysis["filters"][field] for field in fields))
+
+    def age(self) -> Optional[float]:
+        """Seconds since the snapshot the rollup reflects, or None before the first refresh."""
+        if self.as_of is None:
+            return None
+        return max(0.0, (datetime.now(timezone.utc) - self.as_of).total_seconds())
+
+    def freshness(self) -> Dict[str, Any]:
+        """How current rollup answers are: changes to orders after ``as_of`` are not yet included."""
+        age = self.age()
+        return {
+            "source": ROLLUP_TABLE,
+            "as_of": self.as_of.isoformat() if self.as_of else None,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "age_seconds": round(age, 3) if age is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.freshness(),
+            "available": self.available,
+            "refresh_interval": self.refresh_interval,
+            "max_staleness": self.max_staleness,
+            "refreshes": self.refreshes,
+            "days_recomputed": self.days_recomputed,
+            "last_error": self.last_error,
+        }
+
+    def start_background_refresh(self) -> None:
+        """Refresh now and then every ``refresh_interval`` seconds on a daemon thread."""
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="rollup-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def create_sql(self) -> str:
+        """DDL for the rollup tables, with dimension columns typed like their ``orders`` columns."""
+        if self.schema is None:
+            self.schema = SchemaCatalog(self.db_client, refresh_interval=0)
+        if not self.schema.loaded:
+            self.schema.load()
+        orders = self.schema.get("orders")
+        missing = [field for field in DIMENSIONS if orders is None or not orders.has_column(field)]
+        if missing:
+            raise ValueError(f"orders has no column(s) {', '.join(missing)} to roll up")
+        return CREATE_SQL.format(dimensions=",\n    ".join(
+            f"{field} {orders.columns[field]}" for field in DIMENSIONS))
+
+    def _refresh(self, rebuild: bool) -> int:
+        create_sql = None if self._created else self.create_sql()
+        with self.db_client.transaction() as cursor:
+            if create_sql is not None:
+                cursor.execute(create_sql)
+            cursor.execute(LOCK_STATE_SQL, (ROLLUP_TABLE,))
+            watermark, as_of = cursor.fetchone()
+
+            if watermark is None or rebuild:
+                # Backfill the whole table
+                cursor.execute(NEXT_WATERMARK_SQL, (self.watermark_lag, datetime.min))
+                new_watermark = cursor.fetchone()[0]
+                cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+                cursor.execute(BACKFILL_SQL)
+                days = -1
+            else:
+                cursor.execute(NEXT_WATERMARK_SQL, (self.watermark_lag, watermark))
+                new_watermark = max(filter(None, (watermark, cursor.fetchone()[0])))
+                cursor.execute(CHANGED_DAYS_SQL, (watermark,))
+                changed = [row[0] for row in cursor.fetchall()]
+                if changed:
+                    cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE day = ANY(%s)", (changed,))
+                    cursor.execute(RECOMPUTE_DAYS_SQL, (changed,))
+                days = len(changed)
+                self.days_recomputed += days
+
+            cursor.execute(SAVE_STATE_SQL, (new_watermark, as_of, ROLLUP_TABLE))
+
+        self._created = True
+        self.watermark = new_watermark
+        self.as_of = as_of
+        return days
+
+    def _refresh_loop(self) -> None:
+        # The first pass may be a full backfill; queries use the base table until it completes
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Rollup refresh failed: %s", e)
+            self._stop.wait(self.refresh_interval)
@@ -0,0 +1,249 @@
+"""
+Admission control and fair scheduling of queries across sessions.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .executor import CancelToken, QueryCancelled, QueryTimeout
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised when a query is refused because queues are full.
+
+    ``scope`` is "session" when the caller's own queue is full (it should slow
+    down) and "global" when the whole service is saturated.
+    """
+
+    def __init__(self, message: str, scope: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def estimate_cost(analysis: Dict[str, Any]) -> float:
+    """
+    Relative cost of a planned query: counts and aggregates are cheapest,
+    limited retrieves grow with their limit, and unlimited retrieves cost most.
+    """
+    if analysis["query_type"] in ("count", "aggregate"):
+        return 1.0
+    limit = analysis.get("limit")
+    cost = 2.0 + min(limit, 5000) / 100 if limit else 100.0
+    # Filters usually shrink what is read and sent
+    return cost / 2 if analysis["filters"] else cost
+
+
+class _Waiter:
+    __slots__ = ("session_id", "loop", "future", "granted")
+
+    def __init__(self, session_id: str, loop: asyncio.AbstractEventLoop):
+        self.session_id = session_id
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+class QueryScheduler:
+    """
+    Bounds how many queries run at once and decides which waiting query runs next.
+
+    At most ``max_concurrency`` queries run in total and ``max_running_per_session``
+    per session. When a slot frees, sessions with waiting queries take turns
+    (round-robin), so one busy session cannot starve the others, and each
+    session's cheapest waiting query goes first. A query that can run at once
+    never waits; of those that must, a session may queue up to
+    ``max_queued_per_session`` and the service ``max_queued`` in total, beyond
+    which ``acquire`` raises SchedulerBusy instead of queueing.
+
+    Safe to use from several event loops (e.g. several test clients) at once.
+    """
+
+    def __init__(self, max_concurrency: int = 10, max_running_per_session: int = 5,
+                 max_queued_per_session: int = 50, max_queued: int = 500):
+        if max_concurrency < 1 or max_running_per_session < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+
+        self.max_concurrency = max_concurrency
+        self.max_running_per_session = max_running_per_session
+        self.max_queued_per_session = max_queued_per_session
+        self.max_queued = max_queued
+
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        self._active = 0
+        # Per session heap of (cost, arrival, waiter); sessions with waiters take turns in _turns
+        self._queues: Dict[str, List[Tuple[float, int, _Waiter]]] = {}
+        self._turns: Deque[str] = deque()
+        self._queued = 0
+        self._arrivals = itertools.count()
+
+        self.admitted = 0
+        self.waited = 0
+        self.wait_time_total = 0.0
+        self.rejected = {"session": 0, "global": 0}
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, cost: float = 1.0,
+                   cancel_token: Optional[CancelToken] = None) -> AsyncIterator[None]:
+        """Hold a query slot for the duration of the ``async with`` block."""
+        await self.acquire(session_id, cost, cancel_token)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    async def acquire(self, session_id: str, cost: float = 1.0,
+                      cancel_token: Optional[CancelToken] = None) -> None:
+        """
+        Wait for a slot; time spent queued counts against ``cancel_token``'s deadline.
+
+        Raises SchedulerBusy when the queues are full, and QueryTimeout or
+        QueryCancelled if the query's token expires or is cancelled while queued.
+        """
+        if cancel_token is not None:
+            cancel_token.check()
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(session_id, loop)
+        with self._lock:
+            queue = self._queues.get(session_id, [])
+            # Queries already waiting are blocked by a limit; with none ahead of it in its own
+            # session, a query that has a free slot runs now and the queue caps do not apply
+            if not queue and self._has_slot(session_id):
+                self._grant(session_id)
+                self.admitted += 1
+                return
+            if len(queue) >= self.max_queued_per_session:
+                self.rejected["session"] += 1
+                raise SchedulerBusy(f"Too many queries waiting for this session ({len(queue)}); "
+                                    f"retry when earlier ones finish", "session")
+            if self._queued >= self.max_queued:
+                self.rejected["global"] += 1
+                raise SchedulerBusy("The server is busy; please retry shortly", "global")
+
+            if not queue:
+                self._queues[session_id] = queue
+                self._turns.append(session_id)
+            heapq.heappush(queue, (cost, next(self._arrivals), waiter))
+            self._queued += 1
+            self._dispatch()
+            if waiter.granted:
+                self.admitted += 1
+                return
+
+        started = time.monotonic()
+        try:
+            await self._wait(waiter, cancel_token)
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    # Granted just as the wait gave up: hand the slot on
+                    self._finish(session_id)
+                else:
+                    self._remove(waiter)
+            raise
+        with self._lock:
+            self.admitted += 1
+            self.waited += 1
+            self.wait_time_total += time.monotonic() - started
+
+    def release(self, session_id: str) -> None:
+        """Give back the slot taken by ``acquire`` and start the next waiting query."""
+        with self._lock:
+            self._finish(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._active,
+                "queued": self._queued,
+                "sessions_running": len(self._running),
+                "sessions_waiting": len(self._turns),
+                "max_concurrency": self.max_concurrency,
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "rejected_session": self.rejected["session"],
+                "rejected_global": self.rejected["global"],
+            }
+
+    async def _wait(self, waiter: _Waiter, cancel_token: Optional[CancelToken]) -> None:
+        if cancel_token is None:
+            await waiter.future
+            return
+
+        def cancelled() -> None:
+            if not waiter.future.done():
+                waiter.future.set_exception(QueryCancelled(f"Query cancelled: {cancel_token.reason}"))
+
+        with cancel_token.attach(lambda: waiter.loop.call_soon_threadsafe(cancelled)):
+            remaining = cancel_token.remaining()
+            try:
+                await asyncio.wait_for(waiter.future, None if remaining is None else max(remaining, 0))
+            except asyncio.TimeoutError:
+                raise QueryTimeout(f"Query timed out after {cancel_token.timeout:g}s waiting to run")
+
+    def _finish(self, session_id: str) -> None:
+        self._active -= 1
+        self._running[session_id] -= 1
+        if not self._running[session_id]:
+            del self._running[session_id]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to waiting queries, one session turn at a time."""
+        skipped = 0
+        while self._active < self.max_concurrency and skipped < len(self._turns):
+            session_id = self._turns.popleft()
+            if not self._has_slot(session_id):
+                # At its own limit; other sessions go first
+                self._turns.append(session_id)
+                skipped += 1
+                continue
+
+            queue = self._queues[session_id]
+            _, _, waiter = heapq.heappop(queue)
+            self._queued -= 1
+            if queue:
+                self._turns.append(session_id)
+            else:
+                del self._queues[session_id]
+            skipped = 0
+
+            self._grant(session_id)
+            waiter.granted = True
+            waiter.loop.call_soon_threadsafe(self._wake, waiter)
+
+    def _has_slot(self, session_id: str) -> bool:
+        return (self._active < self.max_concurrency
+                and self._running.get(session_id, 0) < self.max_running_per_session)
+
+    def _grant(self, session_id: str) -> None:
+        self._active += 1
+        self._running[session_id] = self._running.get(session_id, 0) + 1
+
+    @staticmethod
+    def _wake(waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            waiter.future.set_result(None)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.session_id)
+        if queue is None:
+            return
+        entries = [entry for entry in queue if entry[2] is not waiter]
+        if len(entries) == len(queue):
+            return
+        self._queued -= 1
+        if entries:
+            heapq.heapify(entries)
+            self._queues[waiter.session_id] = entries
+        else:
+            del self._queues[waiter.session_id]
+            self._turns.remove(waiter.session_id)
@@ -0,0 +1,220 @@
+"""
+Schema metadata loaded from information_schema/pg_catalog and cached in memory.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Enum and other user-defined columns report their type's name rather than "USER-DEFINED"
+COLUMNS_SQL = """
+SELECT table_name, column_name,
+       CASE WHEN data_type = 'USER-DEFINED' THEN format('%%I.%%I', udt_schema, udt_name)
+            ELSE data_type END AS data_type
+FROM information_schema.columns
+WHERE table_schema = %s
+ORDER BY table_name, ordinal_position
+"""
+
+CONSTRAINTS_SQL = """
+SELECT tc.table_name, tc.constraint_name, tc.constraint_type, kcu.column_name,
+       ccu.table_name AS referenced_table, ccu.column_name AS referenced_column
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage kcu
+  ON kcu.constraint_name = tc.constraint_name AND kcu.table_schema = tc.table_schema
+LEFT JOIN information_schema.constraint_column_usage ccu
+  ON tc.constraint_type = 'FOREIGN KEY' AND ccu.constraint_name = tc.constraint_name
+ AND ccu.table_schema = tc.table_schema
+WHERE tc.table_schema = %s AND tc.constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY')
+ORDER BY tc.table_name, tc.constraint_name, kcu.ordinal_position
+"""
+
+INDEXES_SQL = """
+SELECT t.relname AS table_name, i.relname AS index_name, ix.indisunique AS is_unique,
+       array_agg(a.attname::text ORDER BY k.ord) AS columns
+FROM pg_index ix
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord)
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+WHERE n.nspname = %s
+GROUP BY t.relname, i.relname, ix.indisunique
+ORDER BY t.relname, i.relname
+"""
+
+ROW_ESTIMATES_SQL = """
+SELECT c.relname AS table_name, c.reltuples::bigint AS row_estimate
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+"""
+
+TEMPORAL_TYPES = ("timestamp without time zone", "timestamp with time zone", "date")
+
+
+class TableSchema:
+    """Columns, keys, indexes and size estimate for one table."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: Dict[str, str] = {}
+        self.primary_key: List[str] = []
+        self.foreign_keys: List[Dict[str, str]] = []
+        self.indexes: List[Dict[str, Any]] = []
+        self.row_estimate: Optional[int] = None
+
+    def has_column(self, column: str) -> bool:
+        return column in self.columns
+
+    def has_index_prefix(self, columns: List[str]) -> bool:
+        """Whether some index starts with exactly ``columns`` (in order)."""
+        return any(index["columns"][:len(columns)] == columns for index in self.indexes)
+
+    def sort_column(self) -> Optional[str]:
+        """
+        Preferred column for newest/oldest ordering: created_at if present,
+        else an indexed temporal column, else the first primary key column.
+        """
+        if "created_at" in self.columns:
+            return "created_at"
+        for index in self.indexes:
+            leading = index["columns"][0]
+            if self.columns.get(leading) in TEMPORAL_TYPES:
+                return leading
+        return self.primary_key[0] if self.primary_key else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "primary_key": self.primary_key,
+            "foreign_keys": self.foreign_keys,
+            "indexes": self.indexes,
+            "row_estimate": self.row_estimate,
+        }
+
+
+class SchemaCatalog:
+    """
+    In-memory cache of database schema metadata.
+
+    Nothing is queried until ``load`` is called; ``start_background_refresh``
+    then reloads it periodically. Listeners run whenever the schema changes.
+    """
+
+    def __init__(self, db_client, schema: str = "public", refresh_interval: float = 300.0):
+        self.db_client = db_client
+        self.schema = schema
+        self.refresh_interval = refresh_interval
+        self.loaded_at: Optional[float] = None
+
+        self._tables: Dict[str, TableSchema] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Register a callback invoked after a load that changed the schema."""
+        self._listeners.append(listener)
+
+    def load(self) -> bool:
+        """Load metadata from the database; returns True if the schema changed."""
+        params = [self.schema]
+        tables: Dict[str, TableSchema] = {}
+
+        for row in self.db_client.execute_columnar(COLUMNS_SQL, params):
+            table = tables.setdefault(row["table_name"], TableSchema(row["table_name"]))
+            table.columns[row["column_name"]] = row["data_type"]
+
+        foreign_keys: Dict[str, Dict[str, str]] = {}
+        for row in self.db_client.execute_columnar(CONSTRAINTS_SQL, params):
+            table = tables.get(row["table_name"])
+            if table is None:
+                continue
+            if row["constraint_type"] == "PRIMARY KEY":
+                table.primary_key.append(row["column_name"])
+            elif row["constraint_name"] not in foreign_keys:
+                foreign_key = {
+                    "column": row["column_name"],
+                    "references_table": row["referenced_table"],
+                    "references_column": row["referenced_column"],
+                }
+                foreign_keys[row["constraint_name"]] = foreign_key
+                table.foreign_keys.append(foreign_key)
+
+        for row in self.db_client.execute_columnar(INDEXES_SQL, params):
+            table = tables.get(row["table_name"])
+            if table is not None:
+                table.indexes.append({
+                    "name": row["index_name"],
+                    "columns": list(row["columns"]),
+                    "unique": row["is_unique"],
+                })
+
+        for row in self.db_client.execute_columnar(ROW_ESTIMATES_SQL, params):
+            table = tables.get(row["table_name"])
+            if table is not None and row["row_estimate"] is not None and row["row_estimate"] >= 0:
+                table.row_estimate = row["row_estimate"]
+
+        with self._lock:
+            changed = self._structure(tables) != self._structure(self._tables)
+            self._tables = tables
+            self.loaded_at = time.time()
+
+        if changed:
+            for listener in self._listeners:
+                listener()
+        return changed
+
+    def get(self, table: str) -> Optional[TableSchema]:
+        """Return metadata for ``table``, or None if unknown or not loaded."""
+        return self._tables.get(table)
+
+    def table_columns(self) -> Dict[str, List[str]]:
+        """Map of table name to column names."""
+        return {name: list(table.columns) for name, table in self._tables.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "schema": self.schema,
+            "loaded_at": self.loaded_at,
+            "tables": {name: table.to_dict() for name, table in self._tables.items()},
+        }
+
+    def start_background_refresh(self) -> None:
+        """Reload the catalog every ``refresh_interval`` seconds on a daemon thread."""
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="schema-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.load()
+            except Exception as e:
+                logger.warning("Schema refresh failed: %s", e)
+
+    @staticmethod
+    def _structure(tables: Dict[str, TableSchema]) -> Any:
+        # Row estimates change constantly and do not affect generated SQL
+        return {
+            name: (table.columns, table.primary_key, table.foreign_keys, table.indexes)
+            for name, table in tables.items()
+        }
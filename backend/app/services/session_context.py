@@ -0,0 +1,96 @@
+"""
+Per-session memory of the latest result, so follow-up questions can refine it without a new query.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .results import ColumnarResult
+from .statements import SQLStatement
+
+
+class SessionResult:
+    """The analysis, SQL and rows behind a session's most recent answer."""
+
+    __slots__ = ("analysis", "statement", "results", "rows", "stored_at")
+
+    def __init__(self, analysis: Dict[str, Any], statement: SQLStatement, results: ColumnarResult):
+        self.analysis = analysis
+        self.statement = statement
+        self.results = results
+        self.rows = len(results)
+        self.stored_at = time.monotonic()
+
+
+class SessionContextStore(OrderedDict):
+    """
+    LRU map of session id -> SessionResult.
+
+    Bounded by the number of sessions and by the rows held across all of
+    them; results larger than ``max_rows_per_session`` are not kept, and
+    entries expire ``ttl`` seconds after they were stored.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_rows: int = 200_000,
+                 max_rows_per_session: int = 10_000, ttl: float = 1800.0):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.max_rows = max_rows
+        self.max_rows_per_session = max_rows_per_session
+        self.ttl = ttl
+
+        self._rows = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def remember(self, session_id: str, analysis: Dict[str, Any], statement: SQLStatement,
+                 results: Any) -> bool:
+        """Keep ``results`` as the session's context; returns False if they are not kept."""
+        if not isinstance(results, ColumnarResult) or len(results) > self.max_rows_per_session:
+            self.forget(session_id)
+            return False
+
+        entry = SessionResult(analysis, statement, results)
+        with self._lock:
+            self.forget(session_id)
+            self[session_id] = entry
+            self._rows += entry.rows
+            while len(self) > self.max_sessions or self._rows > self.max_rows:
+                self._rows -= self.popitem(last=False)[1].rows
+                self.evictions += 1
+        return True
+
+    def recall(self, session_id: str) -> Optional[SessionResult]:
+        """Return the session's context, or None if it has none or it expired."""
+        with self._lock:
+            entry = self.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl:
+                self.forget(session_id)
+                return None
+            self.move_to_end(session_id)
+            return entry
+
+    def forget(self, session_id: str) -> None:
+        """Drop the session's context, e.g. when its WebSocket disconnects."""
+        with self._lock:
+            entry = self.pop(session_id, None)
+            if entry is not None:
+                self._rows -= entry.rows
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self),
+                "rows": self._rows,
+                "max_sessions": self.max_sessions,
+                "max_rows": self.max_rows,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,302 @@
+"""
+Registry of connected WebSocket sessions and message fanout across API worker processes.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+
+from .executor import QueryExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# Delivers a message to a session whose socket this process holds
+Deliver = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+CHANNEL = "rewardops_sessions"
+# pg_notify rejects payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS ws_sessions (
+    session_id text NOT NULL,
+    worker_id text NOT NULL,
+    connected_at timestamp with time zone NOT NULL DEFAULT now(),
+    heartbeat_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (session_id, worker_id)
+)
+"""
+REGISTER_SQL = """
+INSERT INTO ws_sessions (session_id, worker_id) VALUES (%s, %s)
+ON CONFLICT (session_id, worker_id) DO UPDATE SET connected_at = now(), heartbeat_at = now()
+"""
+UNREGISTER_SQL = "DELETE FROM ws_sessions WHERE session_id = %s AND worker_id = %s"
+# Rows of workers that stopped heartbeating (e.g. a killed pod) are ignored, then purged
+LIVE_CONDITION = "heartbeat_at > now() - %s * interval '1 second'"
+CONNECTED_SQL = f"SELECT EXISTS (SELECT 1 FROM ws_sessions WHERE session_id = %s AND {LIVE_CONDITION})"
+COUNT_SQL = f"SELECT count(DISTINCT session_id) FROM ws_sessions WHERE {LIVE_CONDITION}"
+HEARTBEAT_SQL = "UPDATE ws_sessions SET heartbeat_at = now() WHERE worker_id = %s"
+PURGE_SQL = "DELETE FROM ws_sessions WHERE heartbeat_at < now() - %s * interval '1 second'"
+CLOSE_SQL = "DELETE FROM ws_sessions WHERE worker_id = %s"
+
+
+class SessionRegistry:
+    """
+    Connected sessions and message routing for a single API process.
+
+    ``register``/``unregister`` track the sockets this process holds, and
+    ``publish`` hands a message to the ``deliver`` callback when the session
+    is connected here. Shared backends extend this to every worker process.
+    """
+
+    backend = "memory"
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._local: Set[str] = set()
+        self._deliver: Optional[Deliver] = None
+        self.published = 0
+        self.delivered = 0
+
+    def set_deliver(self, deliver: Deliver) -> None:
+        """Set the callback that writes a message to a socket held by this process."""
+        self._deliver = deliver
+
+    async def start(self) -> None:
+        """Prepare the backend; called once the event loop is running."""
+
+    async def close(self) -> None:
+        """Forget this process's sessions."""
+        self._local.clear()
+
+    async def register(self, session_id: str) -> None:
+        self._local.add(session_id)
+
+    async def unregister(self, session_id: str) -> None:
+        self._local.discard(session_id)
+
+    async def is_connected(self, session_id: str) -> bool:
+        return session_id in self._local
+
+    async def connection_count(self) -> int:
+        """Connected sessions across every worker sharing this registry."""
+        return len(self._local)
+
+    async def publish(self, session_id: str, message: Dict[str, Any]) -> bool:
+        """Send ``message`` to the session wherever it is connected; False if it is not."""
+        self.published += 1
+        if session_id in self._local:
+            await self._deliver_local(session_id, message)
+            return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "worker_id": self.worker_id,
+            "local_sessions": len(self._local),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+    async def _deliver_local(self, session_id: str, message: Dict[str, Any]) -> None:
+        if self._deliver is not None and session_id in self._local:
+            self.delivered += 1
+            await self._deliver(session_id, message)
+
+
+class PostgresSessionRegistry(SessionRegistry):
+    """
+    Session registry shared by every worker through Postgres.
+
+    Each worker records its sessions in ``ws_sessions`` and refreshes them
+    every ``heartbeat_interval`` seconds; sessions of a worker silent for
+    ``session_ttl`` seconds no longer count. Messages for a session held by
+    another worker go out with ``NOTIFY`` and are delivered by whichever
+    worker's ``LISTEN`` connection finds the session local. If that connection
+    drops, it is re-established with exponential backoff (from
+    ``reconnect_delay`` up to ``max_reconnect_delay`` seconds) and this worker's
+    sessions are written back to the table.
+    """
+
+    backend = "postgres"
+
+    def __init__(self, db_client, heartbeat_interval: float = 10.0, session_ttl: float = 30.0,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0):
+        super().__init__()
+        self.db_client = db_client
+        self.heartbeat_interval = heartbeat_interval
+        self.session_ttl = session_ttl
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # Own worker threads, so bookkeeping never queues behind slow queries for a thread;
+        # it still borrows connections from the shared pool
+        self.executor = QueryExecutor(max_concurrency=2)
+        self.notifications = 0
+        self.reconnects = 0
+
+        self._listener = None
+        self._listener_fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._reconnect: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.executor.run(self._execute, CREATE_SQL)
+        self._loop = asyncio.get_running_loop()
+        self._attach(await self.executor.run(self._listen))
+        self._heartbeat = self._loop.create_task(self._heartbeat_loop())
+
+    async def close(self) -> None:
+        for task in (self._heartbeat, self._reconnect):
+            if task is not None:
+                task.cancel()
+        self._heartbeat = self._reconnect = None
+        self._detach()
+        try:
+            await self.executor.run(self._execute, CLOSE_SQL, (self.worker_id,))
+        except Exception as e:
+            logger.warning("Could not remove this worker's sessions: %s", e)
+        self.executor.shutdown()
+        await super().close()
+
+    async def register(self, session_id: str) -> None:
+        await super().register(session_id)
+        await self.executor.run(self._execute, REGISTER_SQL, (session_id, self.worker_id))
+
+    async def unregister(self, session_id: str) -> None:
+        await super().unregister(session_id)
+        await self.executor.run(self._execute, UNREGISTER_SQL, (session_id, self.worker_id))
+
+    async def is_connected(self, session_id: str) -> bool:
+        if session_id in self._local:
+            return True
+        return await self.executor.run(self._fetch_value, CONNECTED_SQL, (session_id, self.session_ttl))
+
+    async def connection_count(self) -> int:
+        return await self.executor.run(self._fetch_value, COUNT_SQL, (self.session_ttl,))
+
+    async def publish(self, session_id: str, message: Dict[str, Any]) -> bool:
+        if await super().publish(session_id, message):
+            return True
+        if not await self.is_connected(session_id):
+            return False
+
+        payload = json.dumps({"session_id": session_id, "origin": self.worker_id, "message": message},
+                             default=str)
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            raise ValueError(f"Message too large to forward to another worker ({MAX_NOTIFY_BYTES} bytes max)")
+        await self.executor.run(self._execute, "SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "notifications": self.notifications,
+                "session_ttl": self.session_ttl, "listening": self._listener is not None,
+                "listener_reconnects": self.reconnects}
+
+    def _execute(self, sql: str, params: Any = None) -> None:
+        with self.db_client.transaction() as cursor:
+            cursor.execute(sql, params)
+
+    def _fetch_value(self, sql: str, params: Any = None) -> Any:
+        with self.db_client.transaction() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def _listen(self):
+        # LISTEN needs its own autocommit connection for as long as the worker runs
+        conn = psycopg2.connect(**self.db_client.connection_params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _attach(self, listener) -> None:
+        self._listener = listener
+        # Kept, since a failed connection may no longer report its descriptor
+        self._listener_fd = listener.fileno()
+        self._loop.add_reader(self._listener_fd, self._on_notify)
+
+    def _detach(self) -> None:
+        if self._listener is None:
+            return
+        self._loop.remove_reader(self._listener_fd)
+        self._listener.close()
+        self._listener = None
+
+    def _listener_lost(self) -> None:
+        """Drop the broken listener and start reconnecting, unless already under way."""
+        self._detach()
+        if self._reconnect is None or self._reconnect.done():
+            self._reconnect = self._loop.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                listener = await self.executor.run(self._listen)
+            except Exception as e:
+                logger.warning("Session listener reconnect failed, retrying in %.1fs: %s",
+                               min(delay * 2, self.max_reconnect_delay), e)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self._attach(listener)
+            self.reconnects += 1
+            break
+        # Rows may have been purged while this worker was cut off (e.g. a database restart)
+        for session_id in list(self._local):
+            try:
+                await self.executor.run(self._execute, REGISTER_SQL, (session_id, self.worker_id))
+            except Exception as e:
+                logger.warning("Could not re-register session %s: %s", session_id, e)
+
+    def _on_notify(self) -> None:
+        try:
+            self._listener.poll()
+        except Exception as e:
+            logger.warning("Session notification listener failed, reconnecting: %s", e)
+            self._listener_lost()
+            return
+        while self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            try:
+                event = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if event.get("origin") == self.worker_id or event.get("session_id") not in self._local:
+                continue
+            self.notifications += 1
+            self._loop.create_task(self._forward(event["session_id"], event["message"]))
+
+    async def _forward(self, session_id: str, message: Dict[str, Any]) -> None:
+        try:
+            await self._deliver_local(session_id, message)
+        except Exception as e:
+            logger.debug("Could not forward a message to session %s: %s", session_id, e)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self._listener is not None and self._listener.closed:
+                self._listener_lost()
+            try:
+                await self.executor.run(self._execute, HEARTBEAT_SQL, (self.worker_id,))
+                await self.executor.run(self._execute, PURGE_SQL, (self.session_ttl * 10,))
+            except Exception as e:
+                logger.warning("Session heartbeat failed: %s", e)
+
+
+def build_session_registry(backend: str, db_client, heartbeat_interval: float = 10.0,
+                           session_ttl: float = 30.0) -> SessionRegistry:
+    """Create the registry named by ``backend`` ("memory" or "postgres")."""
+    if backend == "memory":
+        return SessionRegistry()
+    if backend == "postgres":
+        return PostgresSessionRegistry(db_client, heartbeat_interval, session_ttl)
+    raise ValueError(f"Unknown session registry backend: {backend!r}")
@@ -0,0 +1,111 @@
+"""
+Single-flight coalescing: concurrent callers with the same key share one execution.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+from .executor import CancelToken
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one ``func`` per key at a time; callers arriving while it runs
+    wait for and share its result (or its error).
+
+    Errors listed in ``retry_on`` belong to the caller that ran ``func`` (such
+    as its own cancellation), so waiters run ``func`` themselves instead.
+    """
+
+    def __init__(self, retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.retry_on = retry_on
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any],
+           cancel_token: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True if another caller's execution was reused."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.executions += 1
+                else:
+                    call.waiters += 1
+
+            if leader:
+                return self._run(key, call, func), False
+
+            try:
+                self._wait(call, cancel_token)
+            finally:
+                with self._lock:
+                    call.waiters -= 1
+            if call.error is None:
+                with self._lock:
+                    self.shared += 1
+                return call.result, True
+            if not isinstance(call.error, self.retry_on):
+                raise call.error
+
+    def stats(self) -> Dict[str, Any]:
+        """Return execution counters; ``shared`` is the number of executions saved."""
+        with self._lock:
+            callers = self.executions + self.shared
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "executions": self.executions,
+                "shared": self.shared,
+                "shared_ratio": round(self.shared / callers, 4) if callers else 0.0,
+            }
+
+    def _run(self, key: Hashable, call: _Call, func: Callable[[], Any]) -> Any:
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                call.done = True
+                self._changed.notify_all()
+
+    def _wait(self, call: _Call, cancel_token: Optional[CancelToken]) -> None:
+        if cancel_token is None:
+            with self._lock:
+                while not call.done:
+                    self._changed.wait()
+            return
+
+        def wake() -> None:
+            with self._lock:
+                self._changed.notify_all()
+
+        # A waiter gives up when its own query is cancelled or reaches its deadline
+        with cancel_token.attach(wake):
+            with self._lock:
+                while not call.done and not cancel_token.cancelled:
+                    remaining = cancel_token.remaining()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+            if not call.done:
+                cancel_token.check()
@@ -0,0 +1,82 @@
+"""
+Parameterized SQL statements and per-connection prepared statement bookkeeping.
+"""
+import re
+from collections import OrderedDict
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+
+# psycopg2 placeholders; like psycopg2 itself, quoting is not taken into account
+_PLACEHOLDER = re.compile(r"%s|%%")
+_SIMPLE_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+class SQLStatement(NamedTuple):
+    """An SQL template with ``%s`` placeholders plus the values bound to them."""
+
+    sql: str
+    params: Tuple[Any, ...] = ()
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an SQL identifier unless it is a plain lower-case name."""
+    if _SIMPLE_IDENTIFIER.match(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def positional_placeholders(sql_query: str) -> Tuple[str, int]:
+    """
+    Rewrite psycopg2 ``%s`` placeholders as Postgres ``$1..$n`` for PREPARE.
+
+    Returns the rewritten SQL and the number of parameters.
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        token = match.group(0)
+        if token == "%s":
+            count += 1
+            return f"${count}"
+        return "%"
+
+    return _PLACEHOLDER.sub(replace, sql_query), count
+
+
+class PreparedStatements:
+    """
+    LRU map of SQL template -> server-side prepared statement name for one connection.
+
+    Prepared statements belong to a database session, so each pooled
+    connection owns one of these and it is discarded with the connection.
+    """
+
+    def __init__(self, max_statements: int = 128):
+        self.max_statements = max_statements
+        self._names: "OrderedDict[str, str]" = OrderedDict()
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def lookup(self, sql_query: str) -> Optional[str]:
+        """Return the statement name for ``sql_query`` if it is prepared, marking it recently used."""
+        name = self._names.get(sql_query)
+        if name is not None:
+            self._names.move_to_end(sql_query)
+        return name
+
+    def next_name(self) -> str:
+        """Allocate a statement name that is unique within the session."""
+        self._counter += 1
+        return f"mcp_stmt_{self._counter}"
+
+    def add(self, sql_query: str, name: str) -> List[str]:
+        """Record a prepared statement; returns names evicted to stay within the bound."""
+        self._names[sql_query] = name
+        evicted = []
+        while len(self._names) > self.max_statements:
+            _, old_name = self._names.popitem(last=False)
+            evicted.append(old_name)
+        return evicted
@@ -0,0 +1,259 @@
+"""
+Live query subscriptions: re-evaluate registered queries when their tables change and push row deltas.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import normalize_sql, referenced_tables
+from .executor import CancelToken
+from .results import ColumnarResult
+from .statements import SQLStatement, quote_identifier
+
+logger = logging.getLogger(__name__)
+
+
+# Receives each message for one subscriber; raising drops the subscriber
+Push = Callable[[Dict[str, Any]], Awaitable[None]]
+
+WATERMARK_COLUMN = "updated_at"
+
+
+class SubscriptionError(Exception):
+    """Raised when a query cannot be subscribed to."""
+
+
+class LiveQuery:
+    """One evaluated statement and its latest rows, shared by every subscriber to it."""
+
+    def __init__(self, query: str, analysis: Dict[str, Any], statement: SQLStatement):
+        self.query = query
+        self.analysis = analysis
+        self.statement = statement
+        self.tables = referenced_tables(statement.sql)
+        self.subscribers: Dict[Tuple[str, str], Push] = {}
+        self.columns: List[str] = []
+        self.key_column: Optional[str] = None
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self.evaluated_at = 0.0
+        self.evaluations = 0
+
+    def load(self, results: ColumnarResult) -> Dict[str, List[Any]]:
+        """Replace the rows with ``results``; returns the inserted, updated and removed rows."""
+        self.columns = list(results.columns)
+        # Rows are matched by id when there is one; summaries are matched by position
+        if "id" in self.columns:
+            self.key_column = "id"
+        rows = {self._key(index, record): record for index, record in enumerate(results.to_records())}
+
+        delta = {
+            "inserted": [record for key, record in rows.items() if key not in self.rows],
+            "updated": [record for key, record in rows.items()
+                        if key in self.rows and self.rows[key] != record],
+            "removed": [key for key in self.rows if key not in rows],
+        }
+        self.rows = rows
+        self.evaluated_at = time.monotonic()
+        self.evaluations += 1
+        return delta
+
+    def snapshot(self) -> ColumnarResult:
+        return ColumnarResult.from_records(list(self.rows.values())) if self.rows else ColumnarResult(
+            self.columns, [[] for _ in self.columns])
+
+    def _key(self, index: int, record: Dict[str, Any]) -> Any:
+        if self.key_column is not None:
+            return record[self.key_column]
+        if self.analysis["query_type"] in ("count", "aggregate"):
+            return index
+        return tuple(record.values())
+
+
+class SubscriptionManager:
+    """
+    Keeps subscribed queries up to date by polling table watermarks.
+
+    Every ``poll_interval`` seconds the manager reads ``max(updated_at)`` of
+    each table a live query reads, where the schema catalog shows an index
+    leading on ``updated_at`` (without one every poll would scan the table, so
+    such tables only follow marked changes and the resync). Queries over a table whose watermark moved
+    (or that was marked changed, e.g. by a rollup refresh) are re-run once,
+    however many clients subscribe to them, and each subscriber receives only
+    the inserted, updated and removed rows. Deletes do not move a watermark,
+    so every query is also re-run at least every ``resync_interval`` seconds.
+
+    Runs on the event loop; database work goes through the agent's executor.
+    """
+
+    def __init__(self, agent, poll_interval: float = 2.0, resync_interval: float = 60.0,
+                 max_rows: int = 10_000):
+        self.agent = agent
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.max_rows = max_rows
+
+        self._queries: Dict[Tuple[str, Tuple[Any, ...]], LiveQuery] = {}
+        self._subscriptions: Dict[Tuple[str, str], LiveQuery] = {}
+        self._watermarks: Dict[str, Any] = {}
+        self._unindexed: Set[str] = set()
+        self._changed: Set[str] = set()
+        self._changed_lock = threading.Lock()
+        self._poller: Optional[asyncio.Task] = None
+
+        self.polls = 0
+        self.deltas_sent = 0
+
+    async def subscribe(self, session_id: str, subscription_id: str, query: str, push: Push) -> Dict[str, Any]:
+        """Register ``query`` for the subscriber and return its current snapshot message."""
+        analysis, statement = self.agent.plan(query)
+        key = (normalize_sql(statement.sql), tuple(statement.params))
+        await self.unsubscribe(session_id, subscription_id)
+
+        live = self._queries.get(key)
+        if live is None:
+            live = LiveQuery(query, analysis, statement)
+            # Read new tables' watermarks first, so changes made while evaluating are picked up
+            # by the next poll; known tables keep theirs until then, for the other live queries
+            await self._read_watermarks(live.tables - set(self._watermarks))
+            results = await self._evaluate(live)
+            if len(results) > self.max_rows:
+                raise SubscriptionError(
+                    f"Query returns {len(results)} rows; subscriptions are limited to {self.max_rows}")
+            live.load(results)
+            # Another client may have subscribed to the same query meanwhile
+            live = self._queries.setdefault(key, live)
+
+        live.subscribers[(session_id, subscription_id)] = push
+        self._subscriptions[(session_id, subscription_id)] = live
+        self._start()
+        return {
+            "type": "snapshot",
+            "subscription_id": subscription_id,
+            "query": query,
+            "key": live.key_column,
+            "data": live.snapshot(),
+            "row_count": len(live.rows),
+            "sql_query": statement.sql,
+            "sql_params": list(statement.params),
+        }
+
+    async def unsubscribe(self, session_id: str, subscription_id: str) -> bool:
+        """Remove one subscription; returns False if it did not exist."""
+        live = self._subscriptions.pop((session_id, subscription_id), None)
+        if live is None:
+            return False
+        live.subscribers.pop((session_id, subscription_id), None)
+        if not live.subscribers:
+            self._queries = {key: query for key, query in self._queries.items() if query is not live}
+        return True
+
+    async def unsubscribe_session(self, session_id: str) -> int:
+        """Remove every subscription of a session, e.g. when its WebSocket closes."""
+        owned = [key for key in self._subscriptions if key[0] == session_id]
+        for _, subscription_id in owned:
+            await self.unsubscribe(session_id, subscription_id)
+        return len(owned)
+
+    def mark_changed(self, tables: Iterable[str]) -> None:
+        """Force queries reading ``tables`` to be re-run on the next poll; safe from any thread."""
+        with self._changed_lock:
+            self._changed.update(table.lower() for table in tables)
+
+    async def poll(self) -> int:
+        """Re-run queries whose tables changed and push their deltas; returns queries re-run."""
+        self.polls += 1
+        live_queries = list(self._queries.values())
+        tables = set().union(*(live.tables for live in live_queries)) if live_queries else set()
+        with self._changed_lock:
+            changed, self._changed = self._changed, set()
+        previous = dict(self._watermarks)
+        await self._read_watermarks(tables)
+        changed.update(table for table in tables if self._watermarks.get(table) != previous.get(table))
+
+        due = [live for live in live_queries
+               if live.tables & changed or time.monotonic() - live.evaluated_at >= self.resync_interval]
+        await asyncio.gather(*(self._refresh(live) for live in due))
+        return len(due)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live_queries": len(self._queries),
+            "subscriptions": len(self._subscriptions),
+            "evaluations": sum(live.evaluations for live in self._queries.values()),
+            "polls": self.polls,
+            "deltas_sent": self.deltas_sent,
+            "poll_interval": self.poll_interval,
+            "unindexed_tables": sorted(self._unindexed),
+        }
+
+    async def close(self) -> None:
+        """Stop polling and drop all subscriptions."""
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        self._queries.clear()
+        self._subscriptions.clear()
+
+    async def _refresh(self, live: LiveQuery) -> None:
+        try:
+            delta = live.load(await self._evaluate(live))
+        except Exception as e:
+            logger.warning("Re-evaluating subscribed query %r failed: %s", live.query, e)
+            return
+        if not any(delta.values()):
+            return
+
+        message = {"type": "delta", "key": live.key_column, **delta, "row_count": len(live.rows),
+                   "timestamp": datetime.now().isoformat()}
+        for (session_id, subscription_id), push in list(live.subscribers.items()):
+            try:
+                await push(dict(message, subscription_id=subscription_id))
+                self.deltas_sent += 1
+            except Exception:
+                await self.unsubscribe(session_id, subscription_id)
+
+    async def _evaluate(self, live: LiveQuery) -> ColumnarResult:
+        # Always read current data: the result cache may still hold the previous answer
+        cancel_token = CancelToken(self.agent.query_timeout)
+        return await self.agent.executor.run_cancellable(
+            cancel_token, self.agent.execute_uncached, live.statement, cancel_token)
+
+    async def _read_watermarks(self, tables: Iterable[str]) -> None:
+        tracked = [table for table in tables if self._has_watermark(table)]
+        if tracked:
+            self._watermarks.update(await self.agent.executor.run(self._fetch_watermarks, tracked))
+
+    def _fetch_watermarks(self, tables: List[str]) -> Dict[str, Any]:
+        sql = " UNION ALL ".join(
+            f"SELECT %s AS table_name, max({WATERMARK_COLUMN}) AS watermark FROM {quote_identifier(table)}"
+            for table in tables)
+        rows = self.agent.db_client.execute_columnar(sql, tables)
+        return {row["table_name"]: row["watermark"] for row in rows}
+
+    def _has_watermark(self, table: str) -> bool:
+        schema = self.agent.schema.get(table)
+        if schema is None or not schema.has_column(WATERMARK_COLUMN):
+            return False
+        if schema.has_index_prefix([WATERMARK_COLUMN]):
+            self._unindexed.discard(table)
+            return True
+        if table not in self._unindexed:
+            self._unindexed.add(table)
+            logger.warning("%s has no index on %s; subscribed queries over it are re-run every %gs "
+                           "instead of on change", table, WATERMARK_COLUMN, self.resync_interval)
+        return False
+
+    def _start(self) -> None:
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        while self._queries:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning("Subscription poll failed: %s", e)
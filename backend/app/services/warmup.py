@@ -0,0 +1,80 @@
+"""
+Startup warm-up: concurrent preparation steps and the readiness they add up to.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A named preparation step, and whether the process can serve without it
+Step = Tuple[str, Callable[[], Awaitable[Any]], bool]
+
+
+class Warmup:
+    """
+    Runs warm-up steps and reports readiness.
+
+    Steps of a phase run concurrently; phases run in order, and a failed
+    required step ends the warm-up since later phases build on it. The
+    process is ready once every phase has finished and no required step
+    failed. Optional steps (e.g. priming caches) that fail are reported but
+    do not hold readiness back.
+    """
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._failed_required: List[str] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and not self._failed_required
+
+    async def run(self, phases: List[List[Step]]) -> bool:
+        """Run ``phases`` in order, each one's steps concurrently; returns readiness."""
+        self.started_at = time.time()
+        for phase in phases:
+            await asyncio.gather(*(self._run_step(name, step, required) for name, step, required in phase))
+            if self._failed_required:
+                break
+        self.finished_at = time.time()
+        logger.info("Warm-up finished in %.3fs (%s)", self.finished_at - self.started_at,
+                    "ready" if self.ready else f"failed: {', '.join(self._failed_required)}")
+        return self.ready
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.ready:
+            status = "ready"
+        elif self.finished:
+            status = "failed"
+        else:
+            status = "warming"
+        return {
+            "status": status,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "elapsed_ms": round(((self.finished_at or time.time()) - self.started_at) * 1000, 3)
+            if self.started_at else None,
+            "steps": self.steps,
+        }
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]], required: bool) -> None:
+        started = time.perf_counter()
+        self.steps[name] = {"status": "running", "required": required}
+        try:
+            await step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e, exc_info=required)
+            self.steps[name].update(status="failed", error=str(e))
+            if required:
+                self._failed_required.append(name)
+        else:
+            self.steps[name]["status"] = "done"
+        self.steps[name]["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
@@ -0,0 +1,77 @@
+"""
+Wire encodings for API and WebSocket payloads.
+
+``json`` keeps the historical list-of-records shape, ``columnar`` is JSON with
+column-major result data, and ``msgpack`` is the columnar shape in MessagePack
+(available when the optional ``msgpack`` package is installed).
+"""
+import json
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Dict, Optional, Union
+
+from .results import ColumnarResult
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+
+JSON = "json"
+COLUMNAR = "columnar"
+MSGPACK = "msgpack"
+
+MEDIA_TYPES: Dict[str, str] = {
+    JSON: "application/json",
+    COLUMNAR: "application/vnd.rewardops.columnar+json",
+    MSGPACK: "application/x-msgpack",
+}
+
+
+def available_formats() -> Dict[str, bool]:
+    """Report which wire formats this process can produce."""
+    return {JSON: True, COLUMNAR: True, MSGPACK: msgpack is not None}
+
+
+def negotiate_format(requested: Optional[str] = None, accept: Optional[str] = None) -> str:
+    """
+    Pick a wire format from an explicit request or an HTTP Accept header.
+
+    Binary formats fall back to columnar JSON when their encoder is missing.
+    """
+    fmt = (requested or "").lower()
+    if not fmt and accept:
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            fmt = next((name for name, mime in MEDIA_TYPES.items() if mime == media_type), "")
+            if fmt:
+                break
+
+    if fmt == MSGPACK and msgpack is None:
+        return COLUMNAR
+    return fmt if fmt in MEDIA_TYPES else JSON
+
+
+def _default(columnar: bool):
+    def convert(value: Any) -> Any:
+        if isinstance(value, ColumnarResult):
+            return value.to_dict() if columnar else value.to_records()
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime, date, time_of_day)):
+            return value.isoformat()
+        raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+    return convert
+
+
+def encode(payload: Any, fmt: str = JSON) -> Union[str, bytes]:
+    """Serialize ``payload``; returns text for JSON formats and bytes for binary ones."""
+    if fmt == MSGPACK and msgpack is not None:
+        return msgpack.packb(payload, default=_default(columnar=True), use_bin_type=True)
+    return json.dumps(payload, default=_default(columnar=fmt != JSON))
+
+
+def is_binary(fmt: str) -> bool:
+    """Whether ``fmt`` is sent as a binary frame."""
+    return fmt == MSGPACK and msgpack is not None
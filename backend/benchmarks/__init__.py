@@ -0,0 +1,5 @@
+"""
+End-to-end benchmarks for the natural language query pipeline.
+
+Run from the backend directory, e.g. ``python -m benchmarks.run --scale 100000``.
+"""
@@ -0,0 +1,47 @@
+"""
+Deterministic synthetic data shared by the benchmark database backends.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Tuple
+
+
+PAYMENT_STATUSES = ["PAID", "PENDING", "FAILED"]
+FULFILLMENT_STATUSES = ["FULFILLED", "PENDING"]
+
+# Orders are spread evenly over the year before this instant, oldest first
+ANCHOR = datetime(2025, 1, 1)
+SPAN = timedelta(days=365)
+
+
+def table_sizes(scale: int) -> Dict[str, int]:
+    """Row counts per table for ``scale`` orders."""
+    return {
+        "orders": scale,
+        "members": max(scale // 10, 1),
+        "programs": max(scale // 1000, 10),
+    }
+
+
+def order_created_at(order_id: int, orders: int) -> datetime:
+    """Creation time of order ``order_id`` (1-based) so that ids increase with time."""
+    return ANCHOR - SPAN + SPAN * order_id / orders
+
+
+def programs(count: int) -> Iterator[Tuple]:
+    for i in range(1, count + 1):
+        yield i, f"Program {i}", f"Benchmark program {i}"
+
+
+def members(count: int) -> Iterator[Tuple]:
+    for i in range(1, count + 1):
+        yield i, f"member{i}@example.com", f"First{i}", f"Last{i}"
+
+
+def orders(scale: int) -> Iterator[Tuple]:
+    """Order rows: id, external_id, created_at, updated_at, payment, fulfillment, program, recipient."""
+    sizes = table_sizes(scale)
+    for i in range(1, scale + 1):
+        created_at = order_created_at(i, scale)
+        yield (i, f"EXT-{i}", created_at, created_at,
+               PAYMENT_STATUSES[i % 3], FULFILLMENT_STATUSES[(i // 3) % 2],
+               1 + i % sizes["programs"], 1 + i % sizes["members"])
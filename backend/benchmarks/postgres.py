@@ -0,0 +1,129 @@
+"""
+Disposable local PostgreSQL cluster for benchmarks.
+
+Needs ``initdb``/``pg_ctl`` on PATH (or ``pg_bin``) and a non-root user,
+since initdb refuses to run as root.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from typing import Any, Dict, Optional
+
+import psycopg2
+
+from . import dataset
+
+
+DATABASE = "pangea_benchmark"
+USER = "benchmark"
+
+SCHEMA = """
+CREATE TABLE programs (id serial PRIMARY KEY, name text, description text);
+CREATE TABLE members (id serial PRIMARY KEY, email text, first_name text, last_name text);
+CREATE TABLE orders (
+    id serial PRIMARY KEY,
+    external_id text,
+    created_at timestamp NOT NULL DEFAULT now(),
+    updated_at timestamp NOT NULL DEFAULT now(),
+    payment_status text,
+    fulfillment_status text,
+    program_id integer REFERENCES programs(id),
+    order_recipient_id integer REFERENCES members(id)
+);
+"""
+
+# Same rows as benchmarks.dataset, generated server-side so 10M orders load in seconds
+SEED_SQL = [
+    """INSERT INTO programs (id, name, description)
+       SELECT g, 'Program ' || g, 'Benchmark program ' || g FROM generate_series(1, %(programs)s) g""",
+    """INSERT INTO members (id, email, first_name, last_name)
+       SELECT g, 'member' || g || '@example.com', 'First' || g, 'Last' || g
+       FROM generate_series(1, %(members)s) g""",
+    """INSERT INTO orders (id, external_id, created_at, updated_at, payment_status,
+                           fulfillment_status, program_id, order_recipient_id)
+       SELECT g, 'EXT-' || g, t, t,
+              (ARRAY['PAID', 'PENDING', 'FAILED'])[1 + g %% 3],
+              (ARRAY['FULFILLED', 'PENDING'])[1 + (g / 3) %% 2],
+              1 + g %% %(programs)s, 1 + g %% %(members)s
+       FROM generate_series(1, %(orders)s) g,
+            LATERAL (SELECT %(anchor)s::timestamp - %(span)s::interval
+                            + %(span)s::interval * g / %(orders)s AS t) ts""",
+]
+
+# Rows were inserted with explicit ids, so move each serial past them
+RESET_SEQUENCE_SQL = "SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT coalesce(max(id), 1) FROM {table}))"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class DisposablePostgres:
+    """Context manager that runs a throwaway cluster in a temporary directory."""
+
+    def __init__(self, pg_bin: Optional[str] = None, port: Optional[int] = None):
+        self.pg_bin = pg_bin
+        self.port = port or _free_port()
+        self.directory: Optional[str] = None
+
+    @property
+    def connection_params(self) -> Dict[str, Any]:
+        return {"host": "127.0.0.1", "port": self.port, "database": DATABASE, "user": USER}
+
+    def __enter__(self) -> "DisposablePostgres":
+        self.directory = tempfile.mkdtemp(prefix="rewardops-bench-pg-")
+        data = os.path.join(self.directory, "data")
+        try:
+            self._run("initdb", "-D", data, "-U", USER, "--auth=trust", "-E", "UTF8")
+            self._run("pg_ctl", "-D", data, "-l", os.path.join(self.directory, "server.log"), "-w",
+                      "-o", f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1", "start")
+            conn = psycopg2.connect(host="127.0.0.1", port=self.port, database="postgres", user=USER)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"CREATE DATABASE {DATABASE}")
+            conn.close()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.directory is None:
+            return
+        data = os.path.join(self.directory, "data")
+        if os.path.exists(os.path.join(data, "postmaster.pid")):
+            self._run("pg_ctl", "-D", data, "-m", "fast", "-w", "stop", check=False)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+    def seed(self, scale: int) -> Dict[str, int]:
+        """Create the tables and generate ``scale`` orders plus proportional members/programs."""
+        sizes = dataset.table_sizes(scale)
+        params = dict(sizes, anchor=dataset.ANCHOR, span=dataset.SPAN)
+        conn = psycopg2.connect(**self.connection_params)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(SCHEMA)
+                for statement in SEED_SQL:
+                    cursor.execute(statement, params)
+                for table in ("programs", "members", "orders"):
+                    cursor.execute(RESET_SEQUENCE_SQL.format(table=table), (table,))
+            conn.commit()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("VACUUM ANALYZE")
+        finally:
+            conn.close()
+        return sizes
+
+    def _run(self, program: str, *args: str, check: bool = True) -> None:
+        executable = os.path.join(self.pg_bin, program) if self.pg_bin else shutil.which(program)
+        if not executable:
+            raise RuntimeError(f"{program} not found; install PostgreSQL or pass --pg-bin")
+        result = subprocess.run([executable, *args], capture_output=True, text=True)
+        if check and result.returncode != 0:
+            raise RuntimeError(f"{program} failed: {result.stderr.strip() or result.stdout.strip()}")
@@ -0,0 +1,324 @@
+"""
+Replay a natural language query corpus through the agent, HTTP and WebSocket entry points.
+
+Examples (from the backend directory)::
+
+    python -m benchmarks.run --scale 100000 --save-baseline
+    python -m benchmarks.run --scale 100000 --concurrency 4
+    python -m benchmarks.run --db postgres --scale 10000000 --entry http,ws
+
+Reports p50/p95/p99 latency, queries per second and peak traced memory per
+entry point, and compares them with the stored baseline when one exists.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from app.services.cache import ResultCache
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.react_agent import ReActAgent
+
+from .postgres import DisposablePostgres
+from .standin import SQLiteDatabaseClient
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "queries.txt")
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+ENTRY_POINTS = ("agent", "http", "ws")
+# Metrics compared against the baseline, and whether larger values are better
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "qps": True, "peak_memory_mb": False}
+
+
+def load_corpus(path: str) -> List[str]:
+    """Read one query per line, skipping blanks and ``#`` comments."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _is_error(result: Dict[str, Any]) -> bool:
+    # "No data found" is a valid empty answer, not a failure
+    return bool(result.get("error")) and result.get("error") != "No data found"
+
+
+# Each runner factory returns (run_one, close) for one worker thread
+
+def _agent_runner(agent: ReActAgent, app):
+    session_id = f"bench-{uuid.uuid4().hex[:8]}"
+    return (lambda query: not _is_error(agent.process_query(query, session_id))), (lambda: None)
+
+
+def _http_runner(agent: ReActAgent, app):
+    client = TestClient(app)
+    session_id = f"bench-{uuid.uuid4().hex[:8]}"
+
+    def run_one(query: str) -> bool:
+        response = client.post("/api/query", json={"query": query, "session_id": session_id})
+        return response.status_code == 200 and not _is_error(response.json()["data"])
+
+    return run_one, client.close
+
+
+def _ws_runner(agent: ReActAgent, app):
+    client = TestClient(app)
+    stack = ExitStack()
+    websocket = stack.enter_context(client.websocket_connect(f"/ws/bench-{uuid.uuid4().hex[:8]}"))
+
+    def run_one(query: str) -> bool:
+        websocket.send_text(json.dumps({"type": "query", "query": query}))
+        while True:
+            message = websocket.receive_json()
+            if message["type"] == "result":
+                return not _is_error(message["data"])
+            if message["type"] == "error":
+                return False
+
+    def close() -> None:
+        stack.close()
+        client.close()
+
+    return run_one, close
+
+
+RUNNERS: Dict[str, Callable] = {"agent": _agent_runner, "http": _http_runner, "ws": _ws_runner}
+
+
+def replay(runner_factory: Callable, agent: ReActAgent, app, queries: List[str],
+           concurrency: int) -> Dict[str, Any]:
+    """Run ``queries`` across ``concurrency`` workers and summarize their latencies."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    pending = iter(queries)
+
+    def worker() -> None:
+        nonlocal errors
+        run_one, close = runner_factory(agent, app)
+        try:
+            while True:
+                with lock:
+                    query = next(pending, None)
+                if query is None:
+                    return
+                started = time.perf_counter()
+                ok = run_one(query)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    errors += not ok
+        finally:
+            close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "qps": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def peak_memory(runner_factory: Callable, agent: ReActAgent, app, queries: List[str]) -> float:
+    """Peak Python heap (MB) while replaying ``queries`` once on a single worker."""
+    tracemalloc.start()
+    try:
+        replay(runner_factory, agent, app, queries, concurrency=1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / (1024 * 1024), 3)
+
+
+def build_agent(db_client, use_cache: bool) -> ReActAgent:
+    """Agent wired to the benchmark database; the result cache is off unless requested."""
+    result_cache = ResultCache() if use_cache else ResultCache(default_ttl=0)
+    return ReActAgent(db_client=db_client, result_cache=result_cache, schema_refresh_interval=0)
+
+
+def run_benchmark(db_client, config: Dict[str, Any], queries: List[str],
+                  load_schema: bool = False) -> Dict[str, Any]:
+    """Benchmark every configured entry point against an already seeded ``db_client``."""
+    from app import main as api
+
+    agent = build_agent(db_client, config["cache"])
+    # Point the endpoints at our agent for the run
+    previous = api.use_agent(agent)
+    app = api.app
+    try:
+        if load_schema:
+            agent.refresh_schema()
+        replayed = queries * config["iterations"]
+
+        results = {}
+        for entry in config["entries"]:
+            runner = RUNNERS[entry]
+            # Warm-up pass: imports, plan memo, prepared statements, OS page cache
+            replay(runner, agent, app, queries, concurrency=1)
+            results[entry] = replay(runner, agent, app, replayed, config["concurrency"])
+            if config["trace_memory"]:
+                results[entry]["peak_memory_mb"] = peak_memory(runner, agent, app, queries)
+        return results
+    finally:
+        api.use_agent(previous)
+        agent.executor.shutdown()
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a line per metric that regressed by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    for entry, metrics in results["entries"].items():
+        base = baseline.get("entries", {}).get(entry)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in metrics or not base.get(metric):
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{entry}.{metric}: {base[metric]} -> {metrics[metric]} ({change:+.1%})")
+    return regressions
+
+
+def format_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> str:
+    lines = [f"{'entry':<6} {'queries':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} "
+             f"{'p99 ms':>9} {'qps':>9} {'peak MB':>8}"]
+    for entry, m in results["entries"].items():
+        lines.append(f"{entry:<6} {m['queries']:>8} {m['errors']:>6} {m['p50_ms']:>9.2f} {m['p95_ms']:>9.2f} "
+                     f"{m['p99_ms']:>9.2f} {m['qps']:>9.1f} {m.get('peak_memory_mb', float('nan')):>8.2f}")
+        base = (baseline or {}).get("entries", {}).get(entry)
+        if base:
+            deltas = [f"{metric} {(m[metric] - base[metric]) / base[metric]:+.1%}"
+                      for metric in COMPARED_METRICS if m.get(metric) is not None and base.get(metric)]
+            lines.append(f"{'':<6} vs baseline: " + ", ".join(deltas))
+    lines.append(f"max RSS: {results['max_rss_mb']:.1f} MB")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite",
+                        help="in-process SQLite stand-in, or a disposable local Postgres cluster")
+    parser.add_argument("--pg-bin", help="directory containing initdb/pg_ctl (default: PATH)")
+    parser.add_argument("--scale", type=int, default=10_000,
+                        help="number of orders to seed (10k-10M); members and programs scale with it")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="file with one query per line")
+    parser.add_argument("--iterations", type=int, default=5, help="passes over the corpus per entry point")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent clients per entry point")
+    parser.add_argument("--entry", default=",".join(ENTRY_POINTS),
+                        help="comma-separated entry points: " + ", ".join(ENTRY_POINTS))
+    parser.add_argument("--cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="skip the tracemalloc pass that measures peak memory")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="fractional slowdown tolerated before a metric counts as a regression")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    args.entries = [entry.strip() for entry in args.entry.split(",") if entry.strip()]
+    unknown = set(args.entries) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+    if args.scale < 1 or args.iterations < 1 or args.concurrency < 1:
+        parser.error("--scale, --iterations and --concurrency must be positive")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    queries = load_corpus(args.corpus)
+    config = {
+        "db": args.db,
+        "scale": args.scale,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "cache": args.cache,
+        "entries": args.entries,
+        "trace_memory": args.trace_memory,
+        "corpus_size": len(queries),
+    }
+
+    with ExitStack() as stack:
+        started = time.perf_counter()
+        if args.db == "postgres":
+            cluster = stack.enter_context(DisposablePostgres(pg_bin=args.pg_bin))
+            sizes = cluster.seed(args.scale)
+            db_client = MCPDatabaseClient(connection_params=cluster.connection_params,
+                                          max_pool_size=max(args.concurrency, 2))
+        else:
+            db_client = SQLiteDatabaseClient()
+            sizes = db_client.seed(args.scale)
+        stack.callback(db_client.close)
+        print(f"Seeded {sizes} on {args.db} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        entries = run_benchmark(db_client, config, queries, load_schema=args.db == "postgres")
+
+    results = {
+        "config": config,
+        "entries": entries,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        different = {key for key in ("db", "scale", "concurrency", "cache")
+                     if baseline["config"].get(key) != config[key]}
+        if different:
+            print(f"Baseline was recorded with different {', '.join(sorted(different))}; "
+                  "comparison is indicative only", file=sys.stderr)
+
+    print(format_report(results, baseline))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
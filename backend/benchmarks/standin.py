@@ -0,0 +1,173 @@
+"""
+In-process SQLite stand-in implementing the MCPDatabaseClient interface.
+
+Generated SQL is Postgres-flavoured but mostly portable; the stand-in rewrites
+``%s`` placeholders to ``?`` and provides ``date_trunc``. Schema introspection
+is not supported, so the agent falls back to its built-in table defaults.
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app.services.executor import CancelToken, QueryCancelled, QueryTimeout
+from app.services.results import ColumnarResult
+
+from . import dataset
+
+
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+# Timestamps are stored as ISO text under a private declared type so rows come
+# back as datetimes without touching sqlite3's global "timestamp" converter
+sqlite3.register_converter("bench_timestamp", lambda value: datetime.fromisoformat(value.decode()))
+
+SCHEMA = """
+CREATE TABLE programs (id INTEGER PRIMARY KEY, name TEXT, description TEXT);
+CREATE TABLE members (id INTEGER PRIMARY KEY, email TEXT, first_name TEXT, last_name TEXT);
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY,
+    external_id TEXT,
+    created_at bench_timestamp NOT NULL,
+    updated_at bench_timestamp NOT NULL,
+    payment_status TEXT,
+    fulfillment_status TEXT,
+    program_id INTEGER REFERENCES programs(id),
+    order_recipient_id INTEGER REFERENCES members(id)
+);
+"""
+
+_TRUNCATE = {
+    "minute": lambda t: t.replace(second=0, microsecond=0),
+    "hour": lambda t: t.replace(minute=0, second=0, microsecond=0),
+    "day": lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0),
+    "week": lambda t: datetime.fromordinal(t.toordinal() - t.weekday()),
+}
+
+
+def _date_trunc(unit: str, value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return _TRUNCATE[unit](datetime.fromisoformat(value)).isoformat()
+
+
+def _to_qmark(sql_query: str) -> str:
+    return _PLACEHOLDER.sub(lambda m: "?" if m.group(0) == "%s" else "%", sql_query)
+
+
+class SQLiteDatabaseClient:
+    """Drop-in replacement for MCPDatabaseClient backed by a seeded SQLite file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="rewardops-bench-", suffix=".sqlite3")
+            os.close(fd)
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._executions = 0
+
+    def seed(self, scale: int, chunk_size: int = 50_000) -> Dict[str, int]:
+        """Create the tables and insert ``scale`` orders plus proportional members/programs."""
+        sizes = dataset.table_sizes(scale)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO programs VALUES (?, ?, ?)", dataset.programs(sizes["programs"]))
+        conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?)", dataset.members(sizes["members"]))
+
+        rows = ((i, ext, created.isoformat(), updated.isoformat(), pay, ful, prog, member)
+                for i, ext, created, updated, pay, ful, prog, member in dataset.orders(scale))
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)", chunk)
+        conn.commit()
+        conn.execute("ANALYZE")
+        return sizes
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        if self._owns_file and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "sqlite", "size": len(self._connections), "acquired": self._executions}
+
+    def execute_sql(self, sql_query: str) -> List[Dict[str, Any]]:
+        return self.execute_columnar(sql_query).to_records()
+
+    def execute_columnar(self, sql_query: str, params: Optional[Sequence[Any]] = None,
+                         prepare: bool = False, cancel_token: Optional[CancelToken] = None) -> ColumnarResult:
+        try:
+            with self._guard(cancel_token):
+                cursor = self._execute(sql_query, params)
+                columns = [desc[0] for desc in cursor.description]
+                return ColumnarResult.from_rows(columns, cursor.fetchall())
+        except (QueryCancelled, QueryTimeout):
+            raise
+        except Exception as e:
+            raise Exception(f"Database query failed: {str(e)}")
+
+    def stream_sql(self, sql_query: str, params: Optional[Sequence[Any]] = None,
+                   batch_size: int = 500, cancel_token: Optional[CancelToken] = None) -> Iterator[ColumnarResult]:
+        try:
+            with self._guard(cancel_token):
+                cursor = self._execute(sql_query, params)
+                columns = [desc[0] for desc in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield ColumnarResult.from_rows(columns, rows)
+                    if cancel_token is not None:
+                        cancel_token.check()
+        except (GeneratorExit, QueryCancelled, QueryTimeout):
+            raise
+        except Exception as e:
+            raise Exception(f"Database query failed: {str(e)}")
+
+    @contextmanager
+    def _guard(self, cancel_token: Optional[CancelToken]) -> Iterator[None]:
+        # SQLite has no statement_timeout; deadlines are checked around each call
+        if cancel_token is None:
+            yield
+            return
+        cancel_token.check()
+        with cancel_token.attach(self._connection().interrupt):
+            try:
+                yield
+            except sqlite3.OperationalError as e:
+                if "interrupted" not in str(e):
+                    raise
+                cancel_token.check()
+                raise QueryCancelled("Query cancelled: interrupted")
+
+    def _execute(self, sql_query: str, params: Optional[Sequence[Any]]) -> sqlite3.Cursor:
+        with self._lock:
+            self._executions += 1
+        if params is None:
+            return self._connection().execute(sql_query)
+        return self._connection().execute(_to_qmark(sql_query), tuple(params))
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; the agent runs queries on a worker pool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            conn.create_function("date_trunc", 2, _date_trunc, deterministic=True)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
@@ -1,9 +1,17 @@
 """
 Test suite for FastAPI application endpoints.
 """
+import asyncio
+import json
+import time
+
 import pytest
 from fastapi.testclient import TestClient
+from app import main
 from app.main import app
+from app.services import wire
+from app.services.scheduler import QueryScheduler
+from app.services.statements import SQLStatement
 
 client = TestClient(app)
 
@@ -40,6 +48,101 @@ class TestAPIEndpoints:
         assert "response" in result
         assert "analysis" in result
     
+    def test_query_endpoint_columnar_format(self):
+        """Test clients can request column-major result data."""
+        payload = {
+            "query": "Show me the latest 3 orders",
+            "session_id": "test-session",
+            "format": "columnar"
+        }
+
+        response = client.post("/api/query", json=payload)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(wire.MEDIA_TYPES[wire.COLUMNAR])
+        result = response.json()["data"]["data"]
+        assert result["row_count"] == 3
+        assert "created_at" in result["columns"]
+
+    def test_query_endpoint_timings(self):
+        """Test responses can carry per-stage timings and always send Server-Timing."""
+        payload = {"query": "How many paid orders", "session_id": "test-session", "timings": True}
+
+        response = client.post("/api/query", json=payload)
+
+        assert response.status_code == 200
+        timings = response.json()["data"]["timings"]
+        assert timings["total"] >= 0
+        assert "cache_lookup" in timings
+        assert "encode;dur=" in response.headers["server-timing"]
+
+    def test_metrics_endpoint(self):
+        """Test Prometheus metrics include stage latencies, payload sizes and gauges."""
+        client.post("/api/query", json={"query": "Show me the latest 3 orders", "session_id": "test-session"})
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'rewardops_query_stage_seconds_bucket{stage="format",le="+Inf"}' in body
+        assert 'rewardops_response_payload_bytes_count{transport="http",format="json"}' in body
+        assert "# TYPE rewardops_db_query_seconds histogram" in body
+        assert "rewardops_websocket_connections 0" in body
+        assert "rewardops_result_cache_entries " in body
+        assert "rewardops_db_pool_connections " in body
+
+    def test_query_endpoint_msgpack_accept(self):
+        """Test MessagePack is negotiated through the Accept header."""
+        msgpack = pytest.importorskip("msgpack")
+        payload = {"query": "Show me the latest 3 orders", "session_id": "test-session"}
+
+        response = client.post("/api/query", json=payload,
+                               headers={"Accept": wire.MEDIA_TYPES[wire.MSGPACK]})
+
+        assert response.status_code == 200
+        body = msgpack.unpackb(response.content)
+        assert body["success"] is True
+        assert body["data"]["data"]["row_count"] == 3
+
+    def test_query_page_endpoint(self):
+        """Test paging through results with the returned cursor."""
+        first = client.post("/api/query/page", json={
+            "query": "List all orders",
+            "session_id": "test-session",
+            "page_size": 2
+        })
+
+        assert first.status_code == 200
+        page = first.json()["data"]
+        assert len(page["table"]["rows"]) == 2
+        assert page["next_cursor"]
+
+        second = client.post("/api/query/page", json={
+            "session_id": "test-session",
+            "cursor": page["next_cursor"]
+        })
+
+        assert second.status_code == 200
+        assert second.json()["data"]["data"][0]["id"] not in [row["id"] for row in page["data"]]
+
+    def test_query_page_endpoint_bad_cursor(self):
+        """Test malformed cursors return a client error."""
+        response = client.post("/api/query/page", json={"session_id": "test-session", "cursor": "bogus"})
+
+        assert response.status_code == 400
+
+    def test_schema_refresh_endpoint(self):
+        """Test schema metadata can be refreshed and inspected."""
+        response = client.post("/api/schema/refresh")
+
+        assert response.status_code == 200
+        assert response.json()["refreshed"] is True
+
+        schema = client.get("/api/schema").json()
+        assert "orders" in schema["tables"]
+        assert schema["tables"]["orders"]["primary_key"] == ["id"]
+
     def test_session_status_endpoint(self):
         """Test session status endpoint."""
         session_id = "test-session-status"
@@ -51,3 +154,162 @@ class TestAPIEndpoints:
         assert data["session_id"] == session_id
         assert "connected" in data
         assert "connection_count" in data
+
+
+@pytest.fixture
+def sleeping_tiles(monkeypatch):
+    """Make queries of the form "sleep <seconds> <n>" run pg_sleep, returning n."""
+    plan_query = main.get_agent()._plan_query
+
+    def plan(query, timings=None):
+        analysis, statement = plan_query(query, timings)
+        if query.startswith("sleep"):
+            _, seconds, tile = query.split()
+            statement = SQLStatement("SELECT pg_sleep(%s) AS slept, %s::int AS tile", (float(seconds), int(tile)))
+        return analysis, statement
+
+    monkeypatch.setattr(main.get_agent(), "_plan_query", plan)
+
+
+def batch_lines(payload):
+    response = client.post("/api/query/batch", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestBatchQueries:
+    """Test cases for evaluating many queries in one request."""
+
+    def test_batch_streams_one_line_per_query(self):
+        """Test every position gets a result, repeated queries run once, then completion."""
+        queries = ["How many paid orders", "Show me the latest 3 orders", "how many paid orders"]
+        lines = batch_lines({"queries": queries, "session_id": "batch-session", "timings": True})
+
+        results = {line["index"]: line for line in lines[:-1]}
+        assert sorted(results) == [0, 1, 2]
+        assert all(line["type"] == "batch_result" for line in results.values())
+        assert results[0]["data"] == results[2]["data"]
+        assert results[0]["query"] == "How many paid orders"
+        assert len(results[1]["data"]["data"]) == 3
+        assert results[1]["data"]["timings"]["total"] >= 0
+        assert lines[-1]["type"] == "batch_complete"
+        assert lines[-1]["count"] == 3
+
+    def test_batch_runs_concurrently(self, sleeping_tiles):
+        """Test total time tracks the slowest query, and a timeout only fails its own query."""
+        queries = ["sleep 0.5 1", "sleep 0.5 2", "sleep 0.5 3", "sleep 5 4"]
+        started = time.monotonic()
+        lines = batch_lines({"queries": queries, "session_id": "batch-session", "timeout": 1})
+        elapsed = time.monotonic() - started
+
+        results = {line["index"]: line["data"] for line in lines if line["type"] == "batch_result"}
+        assert [results[i]["data"][0]["tile"] for i in range(3)] == [1, 2, 3]
+        assert "timed out" in results[3]["error"]
+        assert elapsed < 2
+
+    def test_batch_size_limits(self):
+        """Test empty and oversized batches are rejected."""
+        empty = client.post("/api/query/batch", json={"queries": [], "session_id": "batch-session"})
+        too_many = client.post("/api/query/batch", json={
+            "queries": ["How many orders"] * (main.config.QUERY_BATCH_MAX_SIZE + 1),
+            "session_id": "batch-session"})
+
+        assert empty.status_code == 400
+        assert too_many.status_code == 400
+
+
+@pytest.fixture
+def saturated_scheduler(monkeypatch):
+    """Replace the scheduler with one whose only slot is taken and which queues nothing."""
+    scheduler = QueryScheduler(max_concurrency=1, max_queued_per_session=0, max_queued=0)
+    asyncio.run(scheduler.acquire("busy-test"))
+    monkeypatch.setattr(main.get_agent(), "scheduler", scheduler)
+    yield scheduler
+    scheduler.release("busy-test")
+
+
+class TestAdmissionControl:
+    """Test cases for refusing queries when the scheduler is saturated."""
+
+    def test_query_refused_with_429(self, saturated_scheduler):
+        """Test a full session queue yields 429 with a Retry-After header."""
+        response = client.post("/api/query", json={"query": "How many orders", "session_id": "busy-test"})
+
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        assert "waiting" in response.json()["detail"]
+
+    def test_batch_tiles_report_busy(self, saturated_scheduler):
+        """Test refused batch queries come back as per-tile errors."""
+        response = client.post("/api/query/batch", json={"queries": ["How many orders"], "session_id": "busy-test"})
+        result = json.loads(response.text.splitlines()[0])
+
+        assert "waiting" in result["data"]["error"]
+
+    def test_scheduler_stats(self):
+        """Test the scheduler statistics endpoint."""
+        client.post("/api/query", json={"query": "How many orders", "session_id": "stats-test"})
+        stats = client.get("/api/scheduler").json()
+
+        assert stats["admitted"] >= 1
+        assert stats["running"] == 0
+
+
+class TestSlowQueryLog:
+    """Test cases for the query shape endpoints."""
+
+    def test_query_shapes_listed(self):
+        """Test executed statements appear with their latency statistics."""
+        client.post("/api/query", json={"query": "list the top 5 members", "session_id": "shapes-test"})
+        response = client.get("/api/query-shapes", params={"limit": 50, "sort": "calls"})
+
+        assert response.status_code == 200
+        shapes = response.json()["shapes"]
+        assert any("FROM members" in shape["sql"] and shape["calls"] >= 1 for shape in shapes)
+        assert all("suggested_indexes" in shape for shape in shapes)
+
+    def test_unknown_sort_rejected(self):
+        """Test an unknown sort key is a client error."""
+        client.post("/api/query", json={"query": "How many orders", "session_id": "shapes-test"})
+
+        assert client.get("/api/query-shapes", params={"sort": "nonsense"}).status_code == 400
+
+    def test_index_creation_disabled_by_default(self):
+        """Test suggested indexes are only built when explicitly allowed."""
+        response = client.post("/api/query-shapes/indexes", json={"table": "orders", "columns": ["created_at"]})
+
+        assert response.status_code == 403
+
+
+class TestStartup:
+    """Test cases for lazy initialization, warm-up and readiness."""
+
+    def test_import_opens_no_connections(self):
+        """Test importing the app builds no agent and connects to nothing."""
+        import subprocess
+        import sys
+
+        code = "import app.main as m; assert m._agent is None and m._session_registry is None"
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_ready_after_warmup(self):
+        """Test /ready turns 200 once the pool, schema and dashboard tiles are warm."""
+        with TestClient(app) as lifespan_client:
+            assert lifespan_client.get("/health").status_code == 200
+            deadline = time.monotonic() + 10
+            while (response := lifespan_client.get("/ready")).status_code != 200:
+                assert response.json()["status"] == "warming"
+                assert time.monotonic() < deadline
+                time.sleep(0.02)
+
+            steps = response.json()["steps"]
+            assert {"connection_pool", "schema", "session_registry"} <= set(steps)
+            assert all(step["status"] == "done" for step in steps.values())
+            agent = main.get_agent()
+            assert agent.schema.loaded
+            assert agent.db_client.pool_stats()["size"] >= 1
+            assert agent.result_cache.stats()["entries"] >= len(main.config.WARMUP_QUERIES)
+
+        # Shutdown released everything; the next use builds afresh
+        assert main._agent is None
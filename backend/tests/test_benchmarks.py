@@ -0,0 +1,62 @@
+"""
+Test suite for the benchmark harness and its SQLite database stand-in.
+"""
+import pytest
+from benchmarks import run
+from benchmarks.standin import SQLiteDatabaseClient
+
+
+class TestBenchmarkHarness:
+    """Test cases for the end-to-end benchmark suite."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.db_client = SQLiteDatabaseClient()
+        self.db_client.seed(3000)
+
+    def teardown_method(self):
+        """Remove the stand-in database."""
+        self.db_client.close()
+
+    def test_standin_runs_generated_sql(self):
+        """Test parameterized, paginated and bucketed queries work on the stand-in."""
+        agent = run.build_agent(self.db_client, use_cache=False)
+        try:
+            result = agent.process_query("Show me the latest 5 paid orders", "bench")
+            assert len(result["data"]) == 5
+            assert {row["payment_status"] for row in result["data"]} == {"PAID"}
+
+            first = agent.paginate("bench", query="List all orders", page_size=100)
+            second = agent.paginate("bench", cursor=first["next_cursor"])
+            assert first["data"].column("id")[-1] > second["data"].column("id")[0]
+
+            charted = agent.process_query("List all orders", "bench", chart_width=50)
+            assert charted["charts"]["aggregated"] is True
+        finally:
+            agent.close()
+
+    def test_benchmark_reports_latency_percentiles(self):
+        """Test every entry point is replayed and summarized."""
+        config = {"cache": False, "iterations": 1, "concurrency": 2,
+                  "entries": list(run.ENTRY_POINTS), "trace_memory": True}
+        queries = run.load_corpus(run.DEFAULT_CORPUS)
+
+        results = run.run_benchmark(self.db_client, config, queries)
+
+        for entry in run.ENTRY_POINTS:
+            metrics = results[entry]
+            assert metrics["queries"] == len(queries)
+            assert metrics["errors"] == 0
+            assert 0 < metrics["p50_ms"] <= metrics["p95_ms"] <= metrics["p99_ms"]
+            assert metrics["qps"] > 0
+            assert metrics["peak_memory_mb"] > 0
+
+    def test_compare_flags_regressions(self):
+        """Test slower latency or lower throughput beyond the tolerance is reported."""
+        baseline = {"entries": {"http": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "qps": 100.0}}}
+        current = {"entries": {"http": {"p50_ms": 10.5, "p95_ms": 25.0, "p99_ms": 30.0, "qps": 80.0}}}
+
+        regressions = run.compare(current, baseline, tolerance=0.10)
+
+        assert [line.split(":")[0] for line in regressions] == ["http.p95_ms", "http.qps"]
+        assert run.percentile([1.0, 2.0, 3.0, 4.0], 50) == pytest.approx(2.0)
@@ -0,0 +1,72 @@
+"""
+Test suite for the query result cache.
+"""
+import time
+
+from app.services.cache import ResultCache, normalize_sql, referenced_tables
+
+
+class TestResultCache:
+    """Test cases for ResultCache behaviour."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.cache = ResultCache(default_ttl=60, table_ttls={"orders": 60, "programs": 0.05},
+                                 max_entries=3, max_rows=10)
+
+    def test_normalize_sql_keeps_literals(self):
+        """Test whitespace is collapsed outside string literals only."""
+        assert normalize_sql("SELECT *\n   FROM orders;") == "SELECT * FROM orders"
+        assert normalize_sql("SELECT 'a  b'  FROM t") == "SELECT 'a  b' FROM t"
+
+    def test_referenced_tables(self):
+        """Test table extraction from FROM and JOIN clauses."""
+        sql = "SELECT * FROM orders o JOIN public.members m ON m.id = o.order_recipient_id"
+        assert referenced_tables(sql) == {"orders", "members"}
+
+    def test_hit_and_miss_counters(self):
+        """Test lookups are keyed on normalized SQL."""
+        assert self.cache.get("SELECT id FROM orders") is None
+        self.cache.set("SELECT id FROM orders", [{"id": 1}])
+
+        assert self.cache.get("SELECT  id\nFROM orders") == [{"id": 1}]
+        stats = self.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_params_are_part_of_the_key(self):
+        """Test one template with different bound values caches separately."""
+        self.cache.set("SELECT id FROM orders WHERE payment_status = %s", [{"id": 1}], ("PAID",))
+
+        assert self.cache.get("SELECT id FROM orders WHERE payment_status = %s", ("PAID",)) == [{"id": 1}]
+        assert self.cache.get("SELECT id FROM orders WHERE payment_status = %s", ("PENDING",)) is None
+        assert self.cache.invalidate(["orders"]) == 1
+
+    def test_table_ttl_expiry(self):
+        """Test entries expire after their table's TTL."""
+        self.cache.set("SELECT id FROM programs", [{"id": 1}])
+        time.sleep(0.1)
+
+        assert self.cache.get("SELECT id FROM programs") is None
+
+    def test_invalidate_by_table(self):
+        """Test explicit invalidation only drops entries for that table."""
+        self.cache.set("SELECT id FROM orders", [{"id": 1}])
+        self.cache.set("SELECT id FROM members", [{"id": 2}])
+
+        assert self.cache.invalidate(["orders"]) == 1
+        assert self.cache.get("SELECT id FROM orders") is None
+        assert self.cache.get("SELECT id FROM members") == [{"id": 2}]
+
+    def test_lru_bounds(self):
+        """Test least recently used entries are evicted past the bounds."""
+        for i in range(3):
+            self.cache.set(f"SELECT {i} FROM orders", [{"n": i}])
+        self.cache.get("SELECT 0 FROM orders")
+        self.cache.set("SELECT 3 FROM orders", [{"n": 3}])
+
+        assert self.cache.get("SELECT 1 FROM orders") is None
+        assert self.cache.get("SELECT 0 FROM orders") == [{"n": 0}]
+
+        self.cache.set("SELECT big FROM orders", [{"n": i} for i in range(9)])
+        assert self.cache.stats()["rows"] <= 10
@@ -0,0 +1,61 @@
+"""
+Test suite for approximate count and aggregate answers.
+"""
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.react_agent import ReActAgent
+
+
+class TestApproximateCounts:
+    """Test cases for reltuples and TABLESAMPLE estimates."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.agent = ReActAgent(db_client=MCPDatabaseClient())
+
+    def teardown_method(self):
+        """Release connections."""
+        self.agent.close()
+
+    def exact(self, query):
+        return self.agent.process_query(query, "estimate-test")["data"][0]
+
+    def approximate(self, query):
+        return self.agent.process_query(query, "estimate-test", approximate=True)
+
+    def assert_within_bounds(self, response, exact):
+        for column, (low, high) in response["estimate"]["bounds"].items():
+            assert low <= response["data"][0][column] <= high
+            # The interval should cover the true answer (95% confidence; the data is not clustered)
+            assert low <= exact[column] <= high
+            assert high - low < 0.05 * response["estimate"]["total_rows"]
+
+    def test_unfiltered_count_from_statistics(self):
+        """Test a plain count is read from pg_class without touching the table."""
+        response = self.approximate("How many orders")
+
+        assert response["estimate"]["method"] == "reltuples"
+        assert response["sql_query"].startswith("SELECT COUNT(*)")
+        assert "Estimated" in response["response"]
+        self.assert_within_bounds(response, self.exact("How many orders"))
+
+    def test_filtered_count_from_sample(self):
+        """Test a filtered count is scaled up from a block sample with an error bound."""
+        response = self.approximate("How many paid orders")
+        estimate = response["estimate"]
+
+        assert estimate["method"] == "tablesample"
+        assert 0 < estimate["sample_percent"] < 100
+        assert estimate["sample_rows"] < estimate["total_rows"]
+        self.assert_within_bounds(response, self.exact("How many paid orders"))
+
+    def test_aggregate_measures(self):
+        """Test every measure of a summary is estimated with its own bounds."""
+        response = self.approximate("Give me a summary of paid orders")
+
+        assert set(response["estimate"]["bounds"]) == {"total_orders", "paid_orders", "fulfilled_orders"}
+        self.assert_within_bounds(response, self.exact("Give me a summary of paid orders"))
+
+    def test_exact_when_estimate_does_not_apply(self):
+        """Test small tables and row queries are answered exactly even in approximate mode."""
+        assert "estimate" not in self.approximate("How many members")
+        assert "estimate" not in self.approximate("Show me the latest 3 orders")
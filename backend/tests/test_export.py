@@ -0,0 +1,137 @@
+"""
+Test suite for COPY-backed CSV exports.
+"""
+import asyncio
+import csv
+import gzip
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.react_agent import ReActAgent
+from app.services.scheduler import SchedulerBusy
+
+client = TestClient(app)
+
+
+def count_orders(where: str = "TRUE") -> int:
+    db_client = MCPDatabaseClient()
+    try:
+        return db_client.execute_sql(f"SELECT COUNT(*) AS n FROM orders WHERE {where}")[0]["n"]
+    finally:
+        db_client.close()
+
+
+class TestExportEndpoint:
+    """Test cases for the /api/export download."""
+
+    def test_exports_every_matching_row(self):
+        """Test an "all" query exports the full result with a header, not a page of it."""
+        response = client.get("/api/export", params={"query": "list all paid orders"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "export.csv" in response.headers["content-disposition"]
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == count_orders("payment_status = 'PAID'")
+        assert {row["payment_status"] for row in rows} == {"PAID"}
+
+    def test_no_default_limit(self):
+        """Test a query without a count exports every row, while a stated count still applies."""
+        unlimited = client.get("/api/export", params={"query": "export paid orders"})
+        limited = client.get("/api/export", params={"query": "export 25 paid orders"})
+
+        assert len(list(csv.DictReader(io.StringIO(unlimited.text)))) == count_orders("payment_status = 'PAID'")
+        assert len(list(csv.DictReader(io.StringIO(limited.text)))) == 25
+
+    def test_gzip(self):
+        """Test compressed exports decompress to the same CSV."""
+        plain = client.get("/api/export", params={"query": "Show me the latest 100 orders"})
+        compressed = client.get("/api/export", params={"query": "Show me the latest 100 orders", "gzip": True})
+
+        assert compressed.headers["content-type"] == "application/gzip"
+        assert gzip.decompress(compressed.content) == plain.content
+        assert len(compressed.content) < len(plain.content)
+
+
+class TestExportStreaming:
+    """Test cases for chunking and early termination of exports."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.agent = ReActAgent(db_client=MCPDatabaseClient())
+
+    def teardown_method(self):
+        """Release connections."""
+        self.agent.close()
+
+    def test_chunks_are_bounded(self):
+        """Test the export arrives in chunks of about the configured size."""
+        async def collect():
+            return [chunk async for chunk in self.agent.export_csv(
+                "list all orders", chunk_size=16 * 1024, queue_size=2)]
+
+        chunks = asyncio.run(collect())
+
+        assert len(chunks) > 10
+        assert max(len(chunk) for chunk in chunks[:-1]) < 17 * 1024
+        assert b"".join(chunks).count(b"\n") == count_orders() + 1
+
+    def test_closing_early_aborts_copy(self):
+        """Test a client that stops reading releases the connection without finishing the COPY."""
+        async def read_one_chunk():
+            chunks = self.agent.export_csv("list all orders", chunk_size=1024, queue_size=1)
+            first = await chunks.__anext__()
+            await chunks.aclose()
+            return first
+
+        first = asyncio.run(read_one_chunk())
+        stats = self.agent.db_client.pool_stats()
+
+        assert first.startswith(b"id,")
+        assert stats["export_pool"]["in_use"] == 0
+        assert len(self.agent.db_client.execute_columnar("SELECT 1 AS one")) == 1
+
+    def test_unread_exports_hold_no_slot(self):
+        """Test exports whose body is never streamed do not use up the export slots."""
+        async def abandon_then_export():
+            for _ in range(self.agent.export_concurrency + 1):
+                await self.agent.export_csv("list all orders").aclose()
+            return [chunk async for chunk in self.agent.export_csv("Show me the latest 5 orders")]
+
+        assert b"".join(asyncio.run(abandon_then_export())).count(b"\n") == 6
+
+    def test_interactive_queries_run_while_exports_stream(self):
+        """Test exports hold their own workers and connections, and extra ones are refused."""
+        agent = ReActAgent(db_client=MCPDatabaseClient(max_pool_size=2, export_pool_size=2),
+                           max_concurrency=2, export_concurrency=2)
+
+        async def scenario():
+            exports = [agent.export_csv("list all orders", chunk_size=1024, queue_size=1) for _ in range(2)]
+            try:
+                # Each COPY is now paused on its full chunk queue, holding a worker and a connection
+                for export in exports:
+                    await export.__anext__()
+                with pytest.raises(SchedulerBusy):
+                    agent.export_csv("list all orders")
+                return await asyncio.wait_for(asyncio.gather(
+                    agent.process_query_async("How many orders", "export-test", use_context=False),
+                    agent.process_query_async("Show me the latest 5 orders", "export-test", use_context=False),
+                ), timeout=5)
+            finally:
+                for export in exports:
+                    await export.aclose()
+
+        async def export_after_release():
+            return [chunk async for chunk in agent.export_csv("Show me the latest 5 orders")]
+
+        try:
+            counted, latest = asyncio.run(scenario())
+            assert counted["data"][0]["total_count"] == count_orders()
+            assert len(latest["data"]) == 5
+            # Slots are given back when exports close
+            assert b"".join(asyncio.run(export_after_release())).count(b"\n") == 6
+        finally:
+            agent.close()
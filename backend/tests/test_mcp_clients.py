@@ -0,0 +1,227 @@
+"""
+Test suite for MCP database and UI clients.
+"""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from app.services.charting import choose_time_bucket, lttb_indices
+from app.services.executor import CancelToken, QueryCancelled, QueryTimeout
+from app.services.mcp_clients import MCPDatabaseClient, MCPUIGeneratorClient, PoolTimeout
+from app.services.results import ColumnarResult
+
+
+class TestConnectionPool:
+    """Test cases for pooled database connections."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.client = MCPDatabaseClient(min_pool_size=1, max_pool_size=2)
+
+    def teardown_method(self):
+        """Release pooled connections."""
+        self.client.close()
+
+    def test_connections_are_reused(self):
+        """Test consecutive queries share one physical connection."""
+        self.client.execute_sql("SELECT 1 AS one")
+        self.client.execute_sql("SELECT 1 AS one")
+
+        stats = self.client.pool_stats()
+        assert stats["size"] == 1
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+        assert stats["acquired"] == 2
+
+    def test_pool_respects_max_size(self):
+        """Test borrowing beyond max size times out."""
+        self.client.pool.acquire_timeout = 0.1
+        with self.client.pool.connection():
+            with self.client.pool.connection():
+                assert self.client.pool_stats()["in_use"] == 2
+                with pytest.raises(PoolTimeout):
+                    with self.client.pool.connection():
+                        pass
+
+        stats = self.client.pool_stats()
+        assert stats["in_use"] == 0
+        assert stats["waits"] == 0
+
+    def test_expired_connections_are_recycled(self):
+        """Test connections older than max age are replaced."""
+        self.client.pool.max_age = 0
+        self.client.execute_sql("SELECT 1 AS one")
+        self.client.execute_sql("SELECT 1 AS one")
+
+        stats = self.client.pool_stats()
+        assert stats["recycled"] >= 1
+        assert stats["idle"] == 0
+
+    def test_closed_connection_fails_health_check(self):
+        """Test a dead idle connection is discarded on borrow."""
+        self.client.pool.open()
+        self.client.pool._idle[0].conn.close()
+
+        assert self.client.execute_sql("SELECT 1 AS one") == [{"one": 1}]
+        assert self.client.pool_stats()["failed_health_checks"] == 1
+
+    def test_prepared_statements_are_reused(self):
+        """Test a template is prepared once per connection and re-executed with new values."""
+        sql = "SELECT %s::int + 1 AS next, '100%%' AS pct"
+        assert self.client.execute_columnar(sql, (1,), prepare=True).to_records() == [{"next": 2, "pct": "100%"}]
+        assert self.client.execute_columnar(sql, (41,), prepare=True).to_records() == [{"next": 42, "pct": "100%"}]
+
+        stats = self.client.pool_stats()["prepared_statements"]
+        assert stats["prepared"] == 1
+        assert stats["reused"] == 1
+        assert len(self.client.pool._idle[0].statements) == 1
+
+    def test_prepared_statements_are_bounded(self):
+        """Test the least recently used statement is deallocated past the per-connection limit."""
+        self.client.pool.max_prepared_statements = 1
+        self.client.pool.open()
+        self.client.pool._idle[0].statements.max_statements = 1
+
+        self.client.execute_columnar("SELECT %s::int AS a", (1,), prepare=True)
+        self.client.execute_columnar("SELECT %s::int AS b", (2,), prepare=True)
+
+        assert self.client.pool_stats()["prepared_statements"]["deallocated"] == 1
+        assert self.client.execute_sql("SELECT count(*) AS n FROM pg_prepared_statements") == [{"n": 1}]
+
+    def test_closed_pool_rejects_queries(self):
+        """Test queries fail after the pool is shut down."""
+        self.client.close()
+
+        with pytest.raises(Exception):
+            self.client.execute_sql("SELECT 1 AS one")
+
+
+class TestQueryCancellation:
+    """Test cases for query deadlines and server-side cancellation."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.client = MCPDatabaseClient(min_pool_size=1, max_pool_size=1)
+
+    def teardown_method(self):
+        """Release pooled connections."""
+        self.client.close()
+
+    def test_deadline_sets_statement_timeout(self):
+        """Test a statement running past its deadline is stopped by Postgres."""
+        started = time.monotonic()
+        with pytest.raises(QueryTimeout):
+            self.client.execute_columnar("SELECT pg_sleep(5)", cancel_token=CancelToken(timeout=0.2))
+
+        assert time.monotonic() - started < 2
+        # The connection is rolled back and reusable afterwards
+        assert self.client.execute_sql("SHOW statement_timeout") == [{"statement_timeout": "0"}]
+
+    def test_cancel_interrupts_running_statement(self):
+        """Test cancelling from another thread stops the query server-side."""
+        token = CancelToken()
+        threading.Timer(0.2, token.cancel, args=("superseded",)).start()
+
+        started = time.monotonic()
+        with pytest.raises(QueryCancelled, match="superseded"):
+            self.client.execute_columnar("SELECT pg_sleep(5)", cancel_token=token)
+
+        assert time.monotonic() - started < 2
+        assert self.client.pool_stats()["in_use"] == 0
+
+    def test_cancelled_token_skips_execution(self):
+        """Test nothing is sent to the database once a query is cancelled."""
+        token = CancelToken()
+        token.cancel()
+
+        with pytest.raises(QueryCancelled):
+            self.client.execute_columnar("SELECT 1", cancel_token=token)
+        assert self.client.pool_stats()["acquired"] == 0
+
+
+class TestColumnarResult:
+    """Test cases for columnar query results."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.result = ColumnarResult.from_rows(
+            ["id", "created_at", "status"],
+            [(1, datetime(2024, 1, 2, 3, 4, 5), "PAID"), (2, None, "PENDING")],
+        )
+
+    def test_from_rows_is_column_major(self):
+        """Test rows are transposed and temporal columns converted once."""
+        assert self.result.columns == ["id", "created_at", "status"]
+        assert self.result.types == ["integer", "datetime", "string"]
+        assert self.result.column("created_at") == ["2024-01-02T03:04:05", None]
+        assert len(self.result) == 2
+
+    def test_row_access_matches_records(self):
+        """Test row-style access behaves like the old list of dicts."""
+        records = self.result.to_records()
+
+        assert self.result[0] == records[0]
+        assert list(self.result) == records
+        assert self.result[:1].to_records() == records[:1]
+        assert self.result == records
+
+    def test_format_data_table(self):
+        """Test table formatting from a columnar result."""
+        table = MCPUIGeneratorClient().format_data_table(self.result)
+
+        assert table["headers"] == ["id", "created_at", "status"]
+        assert table["rows"] == [["1", "2024-01-02T03:04:05", "PAID"], ["2", "None", "PENDING"]]
+
+    def test_execute_columnar(self):
+        """Test the database client returns columnar results."""
+        client = MCPDatabaseClient()
+        try:
+            result = client.execute_columnar("SELECT 1 AS one, 'a' AS letter")
+        finally:
+            client.close()
+
+        assert result.to_dict() == {
+            "columns": ["one", "letter"],
+            "types": ["integer", "string"],
+            "data": [[1], ["a"]],
+            "row_count": 1,
+        }
+
+
+class TestChartGeneration:
+    """Test cases for bounded chart payloads."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.ui_client = MCPUIGeneratorClient()
+
+    def test_choose_time_bucket(self):
+        """Test the bucket unit scales with the time span."""
+        assert choose_time_bucket(0, 3 * 3600, 800) == "minute"
+        assert choose_time_bucket(0, 30 * 86400, 800) == "hour"
+        assert choose_time_bucket(0, 365 * 86400, 800) == "day"
+        assert choose_time_bucket(0, 365 * 86400, 100) == "week"
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """Test LTTB keeps the first/last points and a spike."""
+        xs = list(range(1000))
+        ys = [0.0] * 1000
+        ys[500] = 100.0
+
+        indices = lttb_indices(xs, ys, 50)
+
+        assert len(indices) == 50
+        assert indices[0] == 0 and indices[-1] == 999
+        assert 500 in indices
+
+    def test_line_chart_is_downsampled(self):
+        """Test line chart data never exceeds max_points."""
+        rows = [(datetime(2024, 1, 1, 0, i % 60, i // 60), i) for i in range(3000)]
+        data = ColumnarResult.from_rows(["created_at", "amount"], rows)
+
+        chart = self.ui_client.generate_chart_config(data, "amount over time", max_points=100)
+
+        assert chart["x_axis"] == "created_at"
+        assert chart["y_axis"] == "amount"
+        assert len(chart["data"]) == 100
@@ -0,0 +1,74 @@
+"""
+Test suite for the metrics registry and per-request stage timings.
+"""
+import time
+
+import pytest
+from app.services.metrics import MetricsRegistry, Timings, row_bucket
+
+
+class TestMetricsRegistry:
+    """Test cases for Prometheus text rendering."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.registry = MetricsRegistry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram samples follow the exposition format."""
+        histogram = self.registry.histogram("latency_seconds", "Latency.", ["stage"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="execute")
+        histogram.observe(0.5, stage="execute")
+        histogram.observe(5, stage="execute")
+
+        lines = self.registry.render().splitlines()
+
+        assert lines[:2] == ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"]
+        assert 'latency_seconds_bucket{stage="execute",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{stage="execute",le="1"} 2' in lines
+        assert 'latency_seconds_bucket{stage="execute",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{stage="execute"} 3' in lines
+        assert 'latency_seconds_sum{stage="execute"} 5.55' in lines
+
+    def test_counters_gauges_and_collectors(self):
+        """Test counters, callback gauges and collectors render with escaped labels."""
+        counter = self.registry.counter("errors_total", "Errors.", ["reason"])
+        counter.inc(reason='bad "input"')
+        self.registry.gauge("open_sockets", "Sockets.").set_function(lambda: 3)
+        self.registry.register_collector(lambda: [("pool_idle", "gauge", "Idle.", [("", {}, 2)])])
+
+        body = self.registry.render()
+
+        assert 'errors_total{reason="bad \\"input\\""} 1' in body
+        assert "open_sockets 3" in body
+        assert "# TYPE pool_idle gauge\npool_idle 2" in body
+
+    def test_label_names_are_enforced(self):
+        """Test observations must use exactly the declared labels."""
+        histogram = self.registry.histogram("rows", "Rows.", ["table"])
+        with pytest.raises(ValueError):
+            histogram.observe(1)
+        with pytest.raises(ValueError):
+            self.registry.histogram("rows", "Duplicate.")
+
+
+class TestTimings:
+    """Test cases for per-request stage timings."""
+
+    def test_nested_stages_record_exclusive_time(self):
+        """Test a nested stage's time is not counted twice."""
+        timings = Timings()
+        with timings.stage("format"):
+            with timings.stage("execute"):
+                time.sleep(0.02)
+
+        assert timings.stages["execute"] >= 0.02
+        assert timings.stages["format"] < 0.01
+        result = timings.to_dict()
+        assert result["total"] == pytest.approx(result["format"] + result["execute"], abs=0.01)
+        assert timings.server_timing().startswith("execute;dur=")
+
+    def test_row_bucket(self):
+        """Test result sizes map to coarse labels."""
+        assert [row_bucket(n) for n in (0, 5, 50, 500, 5000, 50000)] == [
+            "0", "1-10", "11-100", "101-1000", "1001-10000", ">10000"]
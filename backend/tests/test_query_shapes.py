@@ -0,0 +1,124 @@
+"""
+Test suite for the slow-query log and index suggestions.
+"""
+import psycopg2
+import pytest
+
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.query_shapes import QueryShapeRegistry, fingerprint, index_columns
+from app.services.react_agent import ReActAgent
+from app.services.statements import SQLStatement
+
+
+class TestQueryShapeRegistry:
+    """Test cases for fingerprints, latency statistics and eviction."""
+
+    def test_bound_values_share_a_shape(self):
+        """Test statements differing only in parameters or whitespace map to one fingerprint."""
+        assert fingerprint("SELECT * FROM orders WHERE id = %s") == fingerprint("SELECT *  FROM orders\nWHERE id = %s")
+        assert fingerprint("SELECT * FROM orders") != fingerprint("SELECT * FROM members")
+
+    def test_latency_distribution(self):
+        """Test call counts, totals and percentiles per shape."""
+        registry = QueryShapeRegistry(None, slow_threshold=0)
+        statement = SQLStatement("SELECT * FROM orders WHERE id = %s", [1])
+        for milliseconds in range(1, 101):
+            registry.record(statement, milliseconds / 1000, rows=1)
+
+        shape, = registry.worst()
+        assert shape["calls"] == 100
+        assert shape["rows"] == 100
+        assert shape["max_ms"] == 100.0
+        assert shape["p50_ms"] == 51.0
+        assert shape["p95_ms"] == 96.0
+        assert shape["slow_calls"] == 0
+
+    def test_least_recently_seen_shape_evicted(self):
+        """Test only max_shapes shapes are kept."""
+        registry = QueryShapeRegistry(None, slow_threshold=0, max_shapes=2)
+        for table in ("orders", "members", "orders", "programs"):
+            registry.record(SQLStatement(f"SELECT * FROM {table}"), 0.001, rows=0)
+
+        assert sorted(shape["sql"] for shape in registry.worst()) == [
+            "SELECT * FROM orders", "SELECT * FROM programs"]
+
+    def test_unknown_sort_rejected(self):
+        """Test sorting by a missing statistic is an error."""
+        registry = QueryShapeRegistry(None)
+        registry.record(SQLStatement("SELECT 1"), 0.001, rows=1)
+
+        with pytest.raises(ValueError):
+            registry.worst(sort="nonsense")
+
+    def test_index_columns(self):
+        """Test equality filters come before range and sort keys."""
+        sql = ("SELECT id FROM orders WHERE payment_status = %s AND (created_at, id) < (%s, %s) "
+               "ORDER BY created_at DESC, id DESC LIMIT %s")
+
+        assert index_columns(sql) == {"table": "orders", "columns": ["payment_status", "created_at", "id"]}
+        assert index_columns("SELECT COUNT(*) FROM orders") is None
+
+
+class TestSlowQueryLog:
+    """Test cases for plan capture and index suggestions against the database."""
+
+    def setup_method(self):
+        """Setup an agent that treats every statement as slow."""
+        db_client = MCPDatabaseClient()
+        self.agent = ReActAgent(db_client=db_client,
+                                query_shapes=QueryShapeRegistry(db_client, slow_threshold=1e-6))
+        self.agent.refresh_schema()
+        self.created = []
+
+    def teardown_method(self):
+        """Drop indexes created by the test and release connections."""
+        conn = psycopg2.connect(**self.agent.db_client.connection_params)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for name in self.created:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.close()
+        self.agent.close()
+
+    def slowest_retrieve(self):
+        self.agent.process_query("show me the latest 20 paid orders", "shapes-test", use_context=False)
+        assert self.agent.query_shapes.wait_for_captures()
+        return next(shape for shape in self.agent.slow_query_report(limit=20)
+                    if shape["sql"].startswith("SELECT id"))
+
+    def test_plan_captured_for_slow_shape(self):
+        """Test a slow statement gets EXPLAIN (ANALYZE, BUFFERS) with its real parameters."""
+        shape = self.slowest_retrieve()
+
+        assert shape["slow_calls"] == 1
+        assert shape["plan"]["execution_ms"] > 0
+        assert shape["plan"]["shared_hit_blocks"] + shape["plan"]["shared_read_blocks"] > 0
+        assert "Seq Scan on orders" in " ".join(shape["plan"]["findings"])
+
+    def test_composite_index_suggested(self):
+        """Test the filter and sort columns are suggested as one composite index."""
+        suggestion, = self.slowest_retrieve()["suggested_indexes"]
+
+        assert suggestion["table"] == "orders"
+        assert suggestion["columns"] == ["payment_status", "created_at"]
+        assert suggestion["ddl"].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+        assert suggestion["evidence"]
+
+    def test_created_index_no_longer_suggested(self):
+        """Test an index built on request is used and stops being suggested."""
+        suggestion, = self.slowest_retrieve()["suggested_indexes"]
+        self.created.append("idx_orders_payment_status_created_at")
+        ddl = self.agent.create_index(suggestion["table"], suggestion["columns"])
+
+        assert ddl == suggestion["ddl"]
+        self.agent.result_cache.clear()
+        shape = self.slowest_retrieve()
+        assert shape["suggested_indexes"] == []
+        assert not any(finding.startswith("Seq Scan") for finding in shape["plan"]["findings"])
+
+    def test_unknown_columns_rejected(self):
+        """Test only catalogued tables and columns can be indexed."""
+        with pytest.raises(ValueError):
+            self.agent.create_index("orders", ["no_such_column"])
+        with pytest.raises(ValueError):
+            self.agent.create_index("no_such_table", ["id"])
@@ -1,8 +1,14 @@
 """
 Test suite for ReAct Agent functionality.
 """
+import asyncio
+import time
+
 import pytest
+from app.services.executor import QueryExecutor
+from app.services.intent_parser import IntentParser
 from app.services.react_agent import ReActAgent
+from app.services.statements import SQLStatement
 
 
 class TestReActAgent:
@@ -39,3 +45,224 @@ class TestReActAgent:
         
         # Should contain data from real database
         assert result["data"] is not None
+
+    def test_repeated_query_served_from_cache(self):
+        """Test identical queries are answered from the result cache."""
+        first = self.agent.process_query("How many paid orders", "test-session")
+        second = self.agent.process_query("How many paid orders", "test-session")
+
+        assert first["cached"] is False
+        assert second["cached"] is True
+        assert second["data"] == first["data"]
+
+    def test_plan_is_memoized(self):
+        """Test repeated phrasing reuses the memoized analysis and SQL."""
+        analysis, sql_query = self.agent._plan_query("Show me the latest 5 paid orders")
+        analysis["filters"]["payment_status"] = "MUTATED"
+        again, sql_again = self.agent._plan_query("  show me the LATEST 5 paid orders")
+
+        assert sql_again == sql_query
+        assert again["filters"] == {"payment_status": "PAID"}
+        assert again["original_query"] == "  show me the LATEST 5 paid orders"
+        assert self.agent.plan_memo.stats()["hits"] == 1
+
+    def test_filters_and_limits_are_bound_parameters(self):
+        """Test generated SQL is a template shared by queries of the same shape."""
+        _, paid = self.agent._plan_query("Show me the latest 5 paid orders")
+        _, pending = self.agent._plan_query("Show me the latest 7 pending payment orders")
+
+        assert paid.sql == pending.sql
+        assert "PAID" not in paid.sql and "%s" in paid.sql
+        assert paid.params == ("PAID", 5)
+        assert pending.params == ("PENDING", 7)
+
+        result = self.agent.process_query("Show me the latest 5 paid orders", "test-session")
+        assert result["sql_params"] == ["PAID", 5]
+        assert all(row["payment_status"] == "PAID" for row in result["data"])
+
+    def test_large_time_series_chart_is_bucketed(self):
+        """Test charts over many rows are bucketed, bounded by chart width."""
+        result = self.agent.process_query("List all orders", "test-session", chart_width=50)
+
+        chart = result["charts"]
+        assert chart["aggregated"] is True
+        assert chart["bucket"] in ("minute", "hour", "day", "week")
+        assert 0 < len(chart["data"]) <= 50
+        assert sum(chart["data"].column("total_count")) == len(result["data"])
+
+    def test_plain_list_makes_one_round_trip(self):
+        """Test a listing is charted from its own rows rather than re-aggregated in SQL."""
+        executed = []
+        execute_columnar = self.agent.db_client.execute_columnar
+
+        def counting(sql, *args, **kwargs):
+            executed.append(sql)
+            return execute_columnar(sql, *args, **kwargs)
+
+        self.agent.db_client.execute_columnar = counting
+        result = self.agent.process_query("Show all orders", "round-trip-test", use_context=False)
+
+        assert len(executed) == 1
+        assert result["charts"]["aggregated"] is True
+        assert sum(result["charts"]["data"].column("total_count")) == len(result["data"])
+
+    def test_trend_question_aggregated_in_sql(self):
+        """Test questions asking for a trend are bucketed by Postgres."""
+        result = self.agent.process_query("Show me the order trend over time", "trend-test", use_context=False)
+        series_sql = self.agent._generate_time_series_sql(
+            SQLStatement(result["sql_query"], result["sql_params"]), "created_at", result["charts"]["bucket"])
+
+        assert self.agent.result_cache.get(series_sql.sql, series_sql.params) is not None
+
+    def test_keyset_pagination(self):
+        """Test pages follow each other without gaps or overlaps."""
+        first = self.agent.paginate("test-session", query="List all paid orders", page_size=5)
+        second = self.agent.paginate("test-session", cursor=first["next_cursor"])
+
+        assert first["has_more"] is True
+        assert "OFFSET" not in second["sql_query"]
+        assert len(first["data"]) == len(second["data"]) == 5
+        assert set(first["data"].column("payment_status")) == {"PAID"}
+
+        combined = first["data"].column("created_at") + second["data"].column("created_at")
+        assert combined == sorted(combined, reverse=True)
+        assert not set(first["data"].column("id")) & set(second["data"].column("id"))
+
+        expected = self.agent.db_client.execute_sql(
+            "SELECT id FROM orders WHERE payment_status = 'PAID' ORDER BY created_at DESC, id DESC LIMIT 10")
+        assert first["data"].column("id") + second["data"].column("id") == [row["id"] for row in expected]
+
+    def test_pagination_rejects_bad_cursor(self):
+        """Test malformed cursors are rejected."""
+        with pytest.raises(ValueError):
+            self.agent.paginate("test-session", cursor="not-a-cursor")
+
+    def test_identical_concurrent_queries_share_one_execution(self):
+        """Test identical queries in flight together hit the database once."""
+        statement = SQLStatement("SELECT pg_sleep(%s) AS slept, %s::int AS answer", (0.3, 42))
+        self.agent._plan_query = lambda query, timings=None: ({"query_type": "list", "entities": [],
+                                                               "original_query": query}, statement)
+
+        async def run_all():
+            return await asyncio.gather(*(
+                self.agent.process_query_async("dashboard tile", f"analyst-{i}") for i in range(6)))
+
+        results = asyncio.run(run_all())
+
+        assert [result["data"][0]["answer"] for result in results] == [42] * 6
+        assert sorted(result["coalesced"] for result in results) == [False] + [True] * 5
+        stats = self.agent.single_flight.stats()
+        assert (stats["executions"], stats["shared"]) == (1, 5)
+
+    def test_follow_ups_refine_previous_result_in_memory(self):
+        """Test narrowing, limiting and counting follow-ups reuse the session's last rows."""
+        first = self.agent.process_query("Show me the latest 20 orders", "follow-up")
+        executions = self.agent.single_flight.stats()["executions"]
+
+        paid = self.agent.process_query("now only the paid ones", "follow-up")
+        top = self.agent.process_query("show the first 3 of those", "follow-up")
+        counted = self.agent.process_query("how many of those", "follow-up")
+
+        expected = [row for row in first["data"] if row["payment_status"] == "PAID"]
+        assert paid["refined_from"] == "Show me the latest 20 orders"
+        assert paid["data"].to_records() == expected
+        assert top["data"].to_records() == expected[:3]
+        assert counted["data"][0]["total_count"] == 3
+        assert self.agent.single_flight.stats()["executions"] == executions
+
+    def test_unrelated_query_is_not_refined(self):
+        """Test a new question, or one from another session, goes to the database."""
+        self.agent.process_query("Show me the latest 20 orders", "follow-up")
+
+        other_session = self.agent.process_query("now only the paid ones", "another-session")
+        programs = self.agent.process_query("show those programs", "follow-up")
+
+        assert "refined_from" not in other_session
+        assert "refined_from" not in programs
+
+    def test_larger_limit_than_remembered_is_queried(self):
+        """Test asking for more rows than the last answer held goes to the database."""
+        self.agent.process_query("Show me the latest 10 orders", "follow-up")
+
+        wider = self.agent.process_query("show the first 50 of those", "follow-up")
+
+        assert "refined_from" not in wider
+        assert len(wider["data"]) == 50
+
+    def test_new_time_range_or_status_is_queried(self):
+        """Test a follow-up naming a period, or contradicting a filter, is not answered from memory."""
+        self.agent.process_query("Show me the latest 20 paid orders", "follow-up")
+        last_week = self.agent.process_query("show those from last week", "follow-up")
+
+        self.agent.process_query("Show me the latest 20 paid orders", "follow-up")
+        pending = self.agent.process_query("now only the pending payment ones", "follow-up")
+
+        assert "refined_from" not in last_week
+        assert "refined_from" not in pending
+        assert pending["sql_params"][0] == "PENDING"
+        assert set(pending["data"].column("payment_status")) == {"PENDING"}
+
+    def test_process_query_async(self):
+        """Test the async path returns the same shape as the sync path."""
+        result = asyncio.run(self.agent.process_query_async("Show me total revenue", "test-session"))
+
+        assert "sql_query" in result
+        assert result["data"] is not None
+
+
+class TestIntentParser:
+    """Test cases for the compiled intent parser."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.parser = IntentParser()
+
+    def test_overlapping_keywords(self):
+        """Test keywords that overlap or nest are all detected."""
+        analysis = self.parser.parse("List orders from last week")
+
+        assert analysis["query_type"] == "retrieve"
+        assert analysis["entities"] == ["orders"]
+        assert analysis["time_references"] == ["recent", "latest"]
+
+    def test_filters_and_limits(self):
+        """Test status filters and limit extraction."""
+        analysis = self.parser.parse("Count pending payment orders, top 25")
+
+        assert analysis["query_type"] == "count"
+        assert analysis["filters"] == {"payment_status": "PENDING"}
+        assert analysis["limit"] == 25
+        assert self.parser.parse("show all programs")["limit"] is None
+        assert self.parser.parse("show programs")["limit"] == 10
+
+
+class TestQueryExecutor:
+    """Test cases for the bounded query executor."""
+
+    def test_runs_blocking_work_concurrently(self):
+        """Test blocking calls overlap instead of running back to back."""
+        executor = QueryExecutor(max_concurrency=4)
+
+        async def run_all():
+            return await asyncio.gather(*(executor.run(time.sleep, 0.2) for _ in range(4)))
+
+        started = time.monotonic()
+        asyncio.run(run_all())
+        elapsed = time.monotonic() - started
+        executor.shutdown()
+
+        assert elapsed < 0.6
+
+    def test_concurrency_ceiling(self):
+        """Test no more than max_concurrency calls run at once."""
+        executor = QueryExecutor(max_concurrency=2)
+
+        async def run_all():
+            return await asyncio.gather(*(executor.run(time.sleep, 0.2) for _ in range(4)))
+
+        started = time.monotonic()
+        asyncio.run(run_all())
+        elapsed = time.monotonic() - started
+        executor.shutdown()
+
+        assert elapsed >= 0.4
@@ -0,0 +1,106 @@
+"""
+Test suite for the incrementally maintained order count rollup.
+"""
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.react_agent import ReActAgent
+from app.services.rollups import ROLLUP_TABLE, RollupManager
+
+
+class TestRollups:
+    """Test cases for rollup backfill, incremental refresh and query routing."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.db_client = MCPDatabaseClient()
+        self.rollups = RollupManager(self.db_client, refresh_interval=0)
+        self.agent = ReActAgent(db_client=self.db_client, rollups=self.rollups)
+
+    def teardown_method(self):
+        """Drop the rollup tables and release connections."""
+        with self.db_client.transaction() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {ROLLUP_TABLE}, rollup_state")
+        self.agent.close()
+
+    def base_count(self, where: str = "TRUE") -> int:
+        return self.db_client.execute_sql(f"SELECT COUNT(*) AS n FROM orders WHERE {where}")[0]["n"]
+
+    def test_counts_answered_from_rollup_once_loaded(self):
+        """Test count and aggregate questions move to the rollup after the backfill."""
+        before = self.agent.process_query("How many paid orders", "rollup-test")
+        assert ROLLUP_TABLE not in before["sql_query"]
+        assert "freshness" not in before
+
+        assert self.rollups.refresh() == -1
+        count = self.agent.process_query("How many paid orders", "rollup-test")
+        summary = self.agent.process_query("Give me a summary of orders", "rollup-test")
+
+        assert ROLLUP_TABLE in count["sql_query"]
+        assert count["data"][0]["total_count"] == before["data"][0]["total_count"]
+        assert count["freshness"]["source"] == ROLLUP_TABLE
+        assert count["freshness"]["age_seconds"] < 60
+        assert summary["data"][0] == {
+            "total_orders": self.base_count(),
+            "paid_orders": self.base_count("payment_status = 'PAID'"),
+            "fulfilled_orders": self.base_count("fulfillment_status = 'FULFILLED'"),
+        }
+
+    def test_incremental_refresh_applies_status_changes(self):
+        """Test only days with updated orders are recomputed."""
+        self.rollups.refresh()
+        assert self.rollups.refresh() == 0
+
+        order = self.db_client.execute_sql(
+            "SELECT id, payment_status, updated_at FROM orders WHERE payment_status = 'PAID' ORDER BY id LIMIT 1")[0]
+        self.agent.process_query("How many paid orders", "rollup-test")
+        try:
+            with self.db_client.transaction() as cursor:
+                cursor.execute("UPDATE orders SET payment_status = 'FAILED', updated_at = localtimestamp "
+                               "WHERE id = %s", (order["id"],))
+            assert self.rollups.refresh() == 1
+
+            # The refresh invalidated the cached rollup answer
+            result = self.agent.process_query("How many paid orders", "rollup-test")
+            assert result["cached"] is False
+            assert result["data"][0]["total_count"] == self.base_count("payment_status = 'PAID'")
+        finally:
+            with self.db_client.transaction() as cursor:
+                cursor.execute("UPDATE orders SET payment_status = %s, updated_at = %s WHERE id = %s",
+                               (order["payment_status"], order["updated_at"], order["id"]))
+
+    def test_stale_rollup_falls_back_to_orders(self):
+        """Test queries go back to the base table once the rollup is too old."""
+        self.rollups.refresh()
+        self.rollups.max_staleness = 0
+        self.rollups.refresh()
+
+        result = self.agent.process_query("How many paid orders", "rollup-test")
+
+        assert ROLLUP_TABLE not in result["sql_query"]
+        assert self.rollups.stats()["available"] is False
+
+    def test_memoized_rollup_plan_replanned_once_stale(self):
+        """Test a memoized rollup plan is not reused after the rollup ages out without a refresh."""
+        self.rollups.refresh()
+        fresh = self.agent.process_query("How many paid orders", "rollup-test")
+        assert ROLLUP_TABLE in fresh["sql_query"]
+
+        self.rollups.max_staleness = 0
+        result = self.agent.process_query("How many paid orders", "rollup-test")
+
+        assert ROLLUP_TABLE not in result["sql_query"]
+        assert "freshness" not in result
+        assert result["data"][0]["total_count"] == self.base_count("payment_status = 'PAID'")
+
+    def test_dimension_types_copied_from_orders(self):
+        """Test the rollup's dimension columns are created with the types of the orders columns."""
+        self.rollups.refresh()
+        types_sql = ("SELECT column_name, data_type FROM information_schema.columns "
+                     "WHERE table_name = %s AND column_name IN ('payment_status', 'fulfillment_status', 'program_id')")
+
+        rollup_types = {row["column_name"]: row["data_type"]
+                        for row in self.db_client.execute_columnar(types_sql, [ROLLUP_TABLE])}
+        orders_types = {row["column_name"]: row["data_type"]
+                        for row in self.db_client.execute_columnar(types_sql, ["orders"])}
+
+        assert self.rollups.schema is self.agent.schema
+        assert rollup_types == orders_types and len(orders_types) == 3
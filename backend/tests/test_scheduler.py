@@ -0,0 +1,173 @@
+"""
+Test suite for query admission control and fair scheduling.
+"""
+import asyncio
+
+import pytest
+
+from app.services.executor import CancelToken, QueryTimeout
+from app.services.scheduler import QueryScheduler, SchedulerBusy, estimate_cost
+
+
+def analysis(query_type="retrieve", limit=10, filters=None):
+    return {"query_type": query_type, "limit": limit, "filters": filters or {}}
+
+
+class TestQueryScheduler:
+    """Test cases for concurrency limits, ordering and rejection."""
+
+    def test_global_concurrency_budget(self):
+        """Test no more than max_concurrency queries hold a slot at once."""
+        scheduler = QueryScheduler(max_concurrency=2, max_running_per_session=2)
+        running = []
+        peak = []
+
+        async def query(session_id):
+            async with scheduler.slot(session_id):
+                running.append(session_id)
+                peak.append(len(running))
+                await asyncio.sleep(0.02)
+                running.remove(session_id)
+
+        async def run_all():
+            await asyncio.gather(*(query(f"s{i % 3}") for i in range(8)))
+
+        asyncio.run(run_all())
+
+        assert max(peak) == 2
+        assert scheduler.stats()["running"] == 0
+        assert scheduler.stats()["admitted"] == 8
+
+    def test_sessions_take_turns(self):
+        """Test a session arriving behind a backlog runs before that backlog drains."""
+        scheduler = QueryScheduler(max_concurrency=1)
+        order = []
+
+        async def query(session_id, name):
+            async with scheduler.slot(session_id):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def run_all():
+            tasks = [asyncio.create_task(query("a", f"a{i}")) for i in range(4)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(query("b", "b0")))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run_all())
+
+        assert order.index("b0") < order.index("a3")
+        assert order.index("b0") <= 2
+
+    def test_cheapest_waiting_query_first(self):
+        """Test a session's cheap query overtakes its heavier queued ones."""
+        scheduler = QueryScheduler(max_concurrency=1)
+        order = []
+
+        async def query(name, cost):
+            async with scheduler.slot("a", cost):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async def run_all():
+            tasks = [asyncio.create_task(query("first", 1.0))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(query("heavy", 100.0)))
+            tasks.append(asyncio.create_task(query("count", 1.0)))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run_all())
+
+        assert order == ["first", "count", "heavy"]
+
+    def test_full_queues_reject_as_busy(self):
+        """Test session and global queue limits refuse work instead of queueing it."""
+        scheduler = QueryScheduler(max_concurrency=1, max_queued_per_session=1, max_queued=2)
+
+        async def run_all():
+            await scheduler.acquire("a")
+            waiting = [asyncio.create_task(scheduler.acquire("a")), asyncio.create_task(scheduler.acquire("b"))]
+            await asyncio.sleep(0)
+            errors = []
+            for session_id in ("a", "c"):
+                with pytest.raises(SchedulerBusy) as error:
+                    await scheduler.acquire(session_id)
+                errors.append(error.value.scope)
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+            scheduler.release("a")
+            return errors
+
+        assert asyncio.run(run_all()) == ["session", "global"]
+        stats = scheduler.stats()
+        assert stats["rejected_session"] == 1 and stats["rejected_global"] == 1
+        assert stats["queued"] == 0 and stats["running"] == 0
+
+    def test_free_slot_admitted_despite_queue_caps(self):
+        """Test queue limits only refuse queries that would have to wait."""
+        idle = QueryScheduler(max_concurrency=1, max_queued_per_session=0, max_queued=0)
+        scheduler = QueryScheduler(max_concurrency=2, max_running_per_session=1, max_queued=1)
+
+        async def run_all():
+            await idle.acquire("a")
+            idle.release("a")
+
+            await scheduler.acquire("a")
+            waiting = asyncio.create_task(scheduler.acquire("a"))
+            await asyncio.sleep(0)
+            # The global queue is full, but b has a free slot of its own
+            await asyncio.wait_for(scheduler.acquire("b"), timeout=1)
+            stats = scheduler.stats()
+            scheduler.release("a")
+            await waiting
+            scheduler.release("a")
+            scheduler.release("b")
+            return stats
+
+        stats = asyncio.run(run_all())
+
+        assert (stats["running"], stats["queued"], stats["rejected_global"]) == (2, 1, 0)
+        assert idle.stats()["admitted"] == 1
+
+    def test_deadline_applies_while_queued(self):
+        """Test a query that cannot get a slot before its deadline times out and leaves the queue."""
+        scheduler = QueryScheduler(max_concurrency=1)
+
+        async def run_all():
+            await scheduler.acquire("a")
+            with pytest.raises(QueryTimeout):
+                await scheduler.acquire("b", cancel_token=CancelToken(0.05))
+            stats = scheduler.stats()
+            scheduler.release("a")
+            return stats
+
+        assert asyncio.run(run_all())["queued"] == 0
+
+    def test_cancelled_while_queued(self):
+        """Test cancelling a queued query's token removes it without taking a slot."""
+        scheduler = QueryScheduler(max_concurrency=1)
+
+        async def run_all():
+            await scheduler.acquire("a")
+            token = CancelToken()
+            waiter = asyncio.create_task(scheduler.acquire("b", cancel_token=token))
+            await asyncio.sleep(0.01)
+            token.cancel("superseded")
+            result = await asyncio.gather(waiter, return_exceptions=True)
+            scheduler.release("a")
+            return result[0], scheduler.stats()
+
+        error, stats = asyncio.run(run_all())
+
+        assert "superseded" in str(error)
+        assert stats["running"] == 0 and stats["queued"] == 0
+
+    def test_cost_estimates(self):
+        """Test counts are cheapest and unlimited retrieves most expensive."""
+        count = estimate_cost(analysis("count"))
+        limited = estimate_cost(analysis(limit=10))
+        unlimited = estimate_cost(analysis(limit=None))
+        filtered = estimate_cost(analysis(limit=None, filters={"payment_status": "PAID"}))
+
+        assert count < limited < filtered < unlimited
@@ -0,0 +1,77 @@
+"""
+Test suite for schema introspection and its use in SQL generation.
+"""
+import pytest
+from app.services.react_agent import DEFAULT_KNOWN_TABLES, ReActAgent
+
+
+class TestSchemaCatalog:
+    """Test cases for the schema metadata cache."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.agent = ReActAgent(schema_refresh_interval=0)
+
+    def teardown_method(self):
+        """Release agent resources."""
+        self.agent.close()
+
+    def test_defaults_before_load(self):
+        """Test built-in table knowledge is used until the catalog loads."""
+        assert self.agent.schema.loaded is False
+        assert self.agent.known_tables == DEFAULT_KNOWN_TABLES
+
+    def test_load_reads_columns_keys_and_indexes(self):
+        """Test metadata is read from the database."""
+        assert self.agent.refresh_schema() is True
+
+        orders = self.agent.schema.get("orders")
+        assert "created_at" in orders.columns
+        assert orders.primary_key == ["id"]
+        assert any(fk["references_table"] == "programs" for fk in orders.foreign_keys)
+        assert orders.has_index_prefix(["id"])
+        assert orders.row_estimate is None or orders.row_estimate >= 0
+
+        # Reloading an unchanged schema reports no change
+        assert self.agent.refresh_schema() is False
+
+    def test_schema_change_clears_memoized_plans(self):
+        """Test plans are regenerated after the schema changes."""
+        self.agent._plan_query("Show me the latest 5 orders")
+        assert self.agent.plan_memo.stats()["entries"] == 1
+
+        self.agent.refresh_schema()
+
+        assert self.agent.plan_memo.stats()["entries"] == 0
+
+    def test_generator_uses_schema(self):
+        """Test generated SQL only references columns that exist."""
+        self.agent.refresh_schema()
+
+        _, statement = self.agent._plan_query("Show the latest 5 members")
+        assert statement.sql == "SELECT id, email, first_name, last_name FROM members ORDER BY id DESC LIMIT %s"
+        assert statement.params == (5,)
+
+        _, count_statement = self.agent._plan_query("How many of the latest orders")
+        assert "ORDER BY" not in count_statement.sql
+
+        with pytest.raises(ValueError):
+            self.agent._plan_query("Show paid members")
+
+    def test_pagination_selects_its_sort_column(self):
+        """Test pages include a sort column that is not among the displayed columns."""
+        with self.agent.db_client.transaction() as cursor:
+            cursor.execute("ALTER TABLE members ADD COLUMN created_at timestamp NOT NULL DEFAULT now()")
+        try:
+            self.agent.refresh_schema()
+            assert self.agent.schema.get("members").sort_column() == "created_at"
+
+            first = self.agent.paginate("schema-test", query="List all members", page_size=5)
+            second = self.agent.paginate("schema-test", cursor=first["next_cursor"])
+
+            assert "created_at" in first["data"].columns
+            assert len(second["data"]) == 5
+            assert not set(first["data"].column("id")) & set(second["data"].column("id"))
+        finally:
+            with self.agent.db_client.transaction() as cursor:
+                cursor.execute("ALTER TABLE members DROP COLUMN created_at")
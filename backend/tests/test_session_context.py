@@ -0,0 +1,58 @@
+"""
+Test suite for the per-session result context store.
+"""
+import time
+
+from app.services.results import ColumnarResult
+from app.services.session_context import SessionContextStore
+from app.services.statements import SQLStatement
+
+
+def rows(count):
+    return ColumnarResult.from_rows(["id"], [(i,) for i in range(count)])
+
+
+class TestSessionContextStore:
+    """Test cases for bounded per-session result memory."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.store = SessionContextStore(max_sessions=2, max_rows=100, max_rows_per_session=60)
+        self.statement = SQLStatement("SELECT id FROM orders")
+
+    def remember(self, session_id, count):
+        return self.store.remember(session_id, {"original_query": session_id}, self.statement, rows(count))
+
+    def test_starts_empty(self):
+        """Test a new store compares equal to an empty dict."""
+        assert self.store == {}
+
+    def test_lru_session_bound(self):
+        """Test the least recently used session is dropped first."""
+        self.remember("a", 1)
+        self.remember("b", 1)
+        self.store.recall("a")
+        self.remember("c", 1)
+
+        assert list(self.store) == ["a", "c"]
+        assert self.store.evictions == 1
+
+    def test_row_bounds(self):
+        """Test oversized results are not kept and total rows stay bounded."""
+        assert self.remember("a", 61) is False
+        assert self.remember("a", 50) is True
+        self.remember("b", 60)
+
+        assert list(self.store) == ["b"]
+        assert self.store.stats()["rows"] == 60
+
+    def test_expiry_and_forget(self):
+        """Test entries expire after the TTL and can be dropped explicitly."""
+        self.store.ttl = 0.05
+        self.remember("a", 1)
+        self.remember("b", 1)
+        self.store.forget("b")
+        time.sleep(0.1)
+
+        assert self.store.recall("a") is None
+        assert self.store.stats()["rows"] == 0
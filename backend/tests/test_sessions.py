@@ -0,0 +1,147 @@
+"""
+Test suite for the WebSocket session registry and cross-worker message fanout.
+"""
+import asyncio
+
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.sessions import PostgresSessionRegistry, SessionRegistry, build_session_registry
+
+
+def recorder():
+    received = []
+
+    async def deliver(session_id, message):
+        received.append((session_id, message))
+
+    return received, deliver
+
+
+class TestSessionRegistry:
+    """Test cases for the single-process registry."""
+
+    def test_publish_reaches_registered_sessions_only(self):
+        """Test messages are delivered locally while the session is registered."""
+        registry = build_session_registry("memory", None)
+        received, deliver = recorder()
+        registry.set_deliver(deliver)
+
+        async def scenario():
+            await registry.register("a")
+            sent = await registry.publish("a", {"type": "notice"})
+            missing = await registry.publish("b", {"type": "notice"})
+            count = await registry.connection_count()
+            await registry.unregister("a")
+            return sent, missing, count, await registry.is_connected("a")
+
+        assert asyncio.run(scenario()) == (True, False, 1, False)
+        assert received == [("a", {"type": "notice"})]
+        assert isinstance(registry, SessionRegistry)
+
+
+class TestPostgresSessionRegistry:
+    """Test cases for the registry shared by several workers through Postgres."""
+
+    def setup_method(self):
+        """Two registries stand in for two API worker processes."""
+        self.db_client = MCPDatabaseClient()
+        self.workers = [PostgresSessionRegistry(self.db_client, heartbeat_interval=3600) for _ in range(2)]
+
+    def teardown_method(self):
+        """Drop the session table and release connections."""
+        with self.db_client.transaction() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS ws_sessions")
+        self.db_client.close()
+
+    def run(self, scenario):
+        async def run_and_close():
+            for worker in self.workers:
+                await worker.start()
+            try:
+                return await scenario()
+            finally:
+                for worker in self.workers:
+                    await worker.close()
+        return asyncio.run(run_and_close())
+
+    def test_sessions_counted_across_workers(self):
+        """Test each worker sees sessions connected to the other."""
+        first, second = self.workers
+
+        async def scenario():
+            await first.register("a")
+            await first.register("b")
+            await second.register("b")
+            counts = [await worker.connection_count() for worker in self.workers]
+            connected = await second.is_connected("a")
+            await first.unregister("a")
+            return counts, connected, await second.is_connected("a")
+
+        counts, connected, after = self.run(scenario)
+
+        assert counts == [2, 2]
+        assert connected is True
+        assert after is False
+
+    def test_publish_forwarded_to_owning_worker(self):
+        """Test a message published on one worker reaches the socket held by the other."""
+        first, second = self.workers
+        received, deliver = recorder()
+        first.set_deliver(deliver)
+
+        async def scenario():
+            await first.register("a")
+            sent = await second.publish("a", {"type": "notice", "text": "hello"})
+            missing = await second.publish("nobody", {"type": "notice"})
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.02)
+            return sent, missing
+
+        assert self.run(scenario) == (True, False)
+        assert received == [("a", {"type": "notice", "text": "hello"})]
+        assert first.stats()["notifications"] == 1
+
+    def test_oversized_message_rejected(self):
+        """Test messages too large for NOTIFY are refused rather than truncated."""
+        first, second = self.workers
+
+        async def scenario():
+            await first.register("a")
+            try:
+                await second.publish("a", {"text": "x" * 10_000})
+            except ValueError as e:
+                return e
+
+        assert "too large" in str(self.run(scenario))
+
+    def test_delivery_resumes_after_listener_dropped(self):
+        """Test a worker whose LISTEN connection is killed reconnects and receives messages again."""
+        for worker in self.workers:
+            worker.reconnect_delay = 0.05
+        first, second = self.workers
+        received, deliver = recorder()
+        first.set_deliver(deliver)
+
+        async def scenario():
+            await first.register("a")
+            with self.db_client.transaction() as cursor:
+                cursor.execute("SELECT pg_terminate_backend(%s)", (first._listener.get_backend_pid(),))
+                # Rows lost while cut off are written back on reconnect
+                cursor.execute("DELETE FROM ws_sessions")
+            for _ in range(200):
+                if first.reconnects and await second.is_connected("a"):
+                    break
+                await asyncio.sleep(0.02)
+            sent = await second.publish("a", {"type": "notice"})
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.02)
+            return sent, first.stats()
+
+        sent, stats = self.run(scenario)
+        assert sent is True
+        assert received == [("a", {"type": "notice"})]
+        assert stats["listener_reconnects"] == 1
+        assert stats["listening"] is True
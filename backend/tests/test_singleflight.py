@@ -0,0 +1,115 @@
+"""
+Test suite for single-flight coalescing of identical in-flight work.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app.services.executor import CancelToken, QueryCancelled
+from app.services.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test cases for sharing one execution between concurrent callers."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.flight = SingleFlight(retry_on=(QueryCancelled,))
+        self.calls = 0
+        self.release = threading.Event()
+
+    def slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        return ["row"]
+
+    def run_concurrently(self, callers, func, **kwargs):
+        pool = ThreadPoolExecutor(max_workers=callers)
+        futures = [pool.submit(self.flight.do, "key", func, **kwargs) for _ in range(callers)]
+        deadline = time.monotonic() + 5
+        while self.flight.stats()["waiting"] < callers - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return pool, futures
+
+    def test_concurrent_callers_share_one_execution(self):
+        """Test callers arriving during an execution wait for and reuse its result."""
+        pool, futures = self.run_concurrently(5, self.slow_call)
+        self.release.set()
+        results = [future.result() for future in futures]
+        pool.shutdown()
+
+        assert self.calls == 1
+        assert all(result is results[0][0] for result, _ in results)
+        assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+        stats = self.flight.stats()
+        assert (stats["executions"], stats["shared"], stats["in_flight"]) == (1, 4, 0)
+
+    def test_sequential_callers_execute_again(self):
+        """Test nothing is shared once an execution has finished."""
+        self.release.set()
+        self.flight.do("key", self.slow_call)
+        self.flight.do("key", self.slow_call)
+
+        assert self.calls == 2
+        assert self.flight.stats()["shared"] == 0
+
+    def test_errors_are_shared(self):
+        """Test waiters receive the executing caller's error."""
+        def failing_call():
+            self.release.wait(5)
+            raise ValueError("boom")
+
+        pool, futures = self.run_concurrently(3, failing_call)
+        self.release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+        pool.shutdown()
+
+    def test_waiters_retry_when_executing_caller_is_cancelled(self):
+        """Test one caller's cancellation does not cancel the others."""
+        attempts = []
+
+        def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                self.release.wait(5)
+                raise QueryCancelled("Query cancelled: superseded")
+            # The remaining waiter joins this second execution
+            deadline = time.monotonic() + 5
+            while not self.flight.stats()["waiting"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return "fresh"
+
+        pool, futures = self.run_concurrently(3, call)
+        self.release.set()
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result()[0])
+            except QueryCancelled:
+                outcomes.append("cancelled")
+        pool.shutdown()
+
+        assert sorted(outcomes) == ["cancelled", "fresh", "fresh"]
+        assert len(attempts) == 2
+
+    def test_waiter_stops_at_its_own_deadline(self):
+        """Test a waiter gives up on its own timeout or cancellation."""
+        thread = threading.Thread(target=self.flight.do, args=("key", self.slow_call))
+        thread.start()
+        while not self.flight.stats()["in_flight"]:
+            time.sleep(0.01)
+
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        started = time.monotonic()
+        with pytest.raises(QueryCancelled):
+            self.flight.do("key", self.slow_call, cancel_token=token)
+        assert time.monotonic() - started < 1
+        assert self.flight.stats()["waiting"] == 0
+
+        self.release.set()
+        thread.join()
+        assert self.calls == 1
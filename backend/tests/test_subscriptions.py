@@ -0,0 +1,127 @@
+"""
+Test suite for live query subscriptions.
+"""
+import asyncio
+
+from app.services.mcp_clients import MCPDatabaseClient
+from app.services.react_agent import ReActAgent
+from app.services.subscriptions import SubscriptionError, SubscriptionManager
+
+
+class TestSubscriptions:
+    """Test cases for snapshots, shared evaluation and delta pushes."""
+
+    def setup_method(self):
+        """Setup test environment."""
+        self.db_client = MCPDatabaseClient()
+        self.agent = ReActAgent(db_client=self.db_client)
+        self.manager = SubscriptionManager(self.agent, poll_interval=3600)
+
+    def teardown_method(self):
+        """Release connections."""
+        self.agent.close()
+
+    def run(self, scenario):
+        async def run_and_close():
+            try:
+                return await scenario()
+            finally:
+                await self.manager.close()
+        return asyncio.run(run_and_close())
+
+    def test_subscribers_share_one_live_query(self):
+        """Test identical subscriptions are evaluated once and tracked by id."""
+        async def scenario():
+            pushed = []
+            first = await self.manager.subscribe("s1", "a", "Show me the latest 5 orders", pushed.append)
+            second = await self.manager.subscribe("s2", "b", "Show me the latest 5 orders", pushed.append)
+            stats = self.manager.stats()
+            removed = await self.manager.unsubscribe_session("s1")
+            return first, second, stats, removed, self.manager.stats()
+
+        first, second, stats, removed, after = self.run(scenario)
+
+        assert first["type"] == "snapshot"
+        assert first["key"] == "id"
+        assert first["row_count"] == 5
+        assert second["data"] == first["data"]
+        assert stats["live_queries"] == 1
+        assert stats["subscriptions"] == 2
+        assert stats["evaluations"] == 1
+        assert removed == 1
+        assert after["subscriptions"] == 1
+
+    def test_update_pushes_only_changed_rows(self):
+        """Test a change to a watched row is pushed as an update to every subscriber."""
+        with self.db_client.transaction() as cursor:
+            cursor.execute("CREATE INDEX IF NOT EXISTS orders_updated_at_idx ON orders (updated_at)")
+        try:
+            self.agent.refresh_schema()
+            self.check_update_pushed()
+        finally:
+            with self.db_client.transaction() as cursor:
+                cursor.execute("DROP INDEX IF EXISTS orders_updated_at_idx")
+
+    def check_update_pushed(self):
+        pushed = []
+
+        async def push(message):
+            pushed.append(message)
+
+        async def scenario():
+            snapshot = await self.manager.subscribe("s1", "a", "Show me the latest 5 orders", push)
+            await self.manager.subscribe("s2", "b", "Show me the latest 5 orders", push)
+            assert await self.manager.poll() == 0
+
+            order = snapshot["data"].to_records()[0]
+            with self.db_client.transaction() as cursor:
+                cursor.execute("SELECT payment_status, updated_at FROM orders WHERE id = %s", (order["id"],))
+                original = cursor.fetchone()
+                cursor.execute("UPDATE orders SET payment_status = 'SUBSCRIBED', updated_at = localtimestamp "
+                               "WHERE id = %s", (order["id"],))
+            try:
+                refreshed = await self.manager.poll()
+            finally:
+                with self.db_client.transaction() as cursor:
+                    cursor.execute("UPDATE orders SET payment_status = %s, updated_at = %s WHERE id = %s",
+                                   (*original, order["id"]))
+            return order, refreshed
+
+        order, refreshed = self.run(scenario)
+
+        assert refreshed == 1
+        assert [message["subscription_id"] for message in pushed] == ["a", "b"]
+        delta = pushed[0]
+        assert delta["type"] == "delta"
+        assert delta["inserted"] == [] and delta["removed"] == []
+        assert [row["id"] for row in delta["updated"]] == [order["id"]]
+        assert delta["updated"][0]["payment_status"] == "SUBSCRIBED"
+
+    def test_unindexed_watermark_not_polled(self):
+        """Test a table without an updated_at index is left to the resync instead of scanned each poll."""
+        self.agent.refresh_schema()
+
+        async def scenario():
+            await self.manager.subscribe("s1", "a", "Show me the latest 5 orders", None)
+            await self.manager.poll()
+            return dict(self.manager._watermarks), self.manager.stats()
+
+        watermarks, stats = self.run(scenario)
+
+        assert watermarks == {}
+        assert stats["unindexed_tables"] == ["orders"]
+
+    def test_row_limit(self):
+        """Test queries returning more rows than allowed are refused."""
+        self.manager.max_rows = 3
+
+        async def scenario():
+            try:
+                await self.manager.subscribe("s1", "a", "Show me the latest 5 orders", None)
+            except SubscriptionError as e:
+                return e, self.manager.stats()
+
+        error, stats = self.run(scenario)
+
+        assert "limited to 3" in str(error)
+        assert stats["live_queries"] == 0
@@ -0,0 +1,87 @@
+"""
+Test suite for startup warm-up and readiness.
+"""
+import asyncio
+import time
+
+from app.services.warmup import Warmup
+
+
+async def succeed():
+    await asyncio.sleep(0.01)
+
+
+async def fail():
+    raise RuntimeError("database unavailable")
+
+
+class TestWarmup:
+    """Test cases for warm-up phases and readiness."""
+
+    def test_not_ready_until_finished(self):
+        """Test readiness is only reported once every phase has run."""
+        warmup = Warmup()
+        assert warmup.to_dict()["status"] == "warming"
+
+        assert asyncio.run(warmup.run([[("pool", succeed, True)], [("tile", succeed, False)]]))
+        assert warmup.to_dict()["status"] == "ready"
+        assert warmup.steps["tile"]["status"] == "done"
+
+    def test_steps_of_a_phase_run_concurrently(self):
+        """Test a phase takes about as long as its slowest step."""
+        async def step():
+            await asyncio.sleep(0.05)
+
+        warmup = Warmup()
+        asyncio.run(warmup.run([[(f"step{i}", step, True) for i in range(5)]]))
+
+        assert warmup.to_dict()["elapsed_ms"] < 200
+
+    def test_optional_failure_keeps_readiness(self):
+        """Test a failed cache-priming step is reported without holding readiness back."""
+        warmup = Warmup()
+
+        assert asyncio.run(warmup.run([[("pool", succeed, True), ("tile", fail, False)]]))
+        assert warmup.steps["tile"] == {"status": "failed", "required": False,
+                                        "error": "database unavailable",
+                                        "elapsed_ms": warmup.steps["tile"]["elapsed_ms"]}
+
+    def test_required_failure_is_not_ready(self):
+        """Test a failed required step leaves the process unready."""
+        warmup = Warmup()
+
+        assert not asyncio.run(warmup.run([[("pool", fail, True)]]))
+        assert warmup.to_dict()["status"] == "failed"
+
+
+class TestReadiness:
+    """Test cases for /ready when the app's warm-up fails."""
+
+    def test_agent_construction_failure_reported(self, monkeypatch):
+        """Test /ready reports a failed warm-up rather than warming forever."""
+        from fastapi.testclient import TestClient
+
+        from app import main
+
+        def broken_agent():
+            raise RuntimeError("bad database settings")
+
+        # Start from an unbuilt agent, as a freshly started worker would
+        for name in ("_agent", "_subscriptions", "_session_registry"):
+            monkeypatch.setattr(main, name, None)
+        monkeypatch.setattr(main, "build_agent", broken_agent)
+
+        with TestClient(main.app) as client:
+            for _ in range(250):
+                response = client.get("/ready")
+                if response.json()["status"] != "warming":
+                    break
+                time.sleep(0.02)
+
+        assert response.status_code == 503
+        body = response.json()
+        assert body["status"] == "failed"
+        assert body["steps"]["services"] == {"status": "failed", "required": True,
+                                             "error": "bad database settings",
+                                             "elapsed_ms": body["steps"]["services"]["elapsed_ms"]}
+        assert "connection_pool" not in body["steps"]
@@ -0,0 +1,216 @@
+"""
+Test suite for the WebSocket query endpoint.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.main import app
+from app.services.scheduler import QueryScheduler
+from app.services.statements import SQLStatement
+
+client = TestClient(app)
+
+
+class TestWebSocketEndpoint:
+    """Test cases for WebSocket query handling."""
+
+    def test_query_returns_status_then_result(self):
+        """Test a plain query yields a status message and a full result."""
+        with client.websocket_connect("/ws/test-ws-session") as websocket:
+            websocket.send_json({"type": "query", "query": "Show me the latest 3 orders"})
+
+            assert websocket.receive_json()["type"] == "status"
+            message = websocket.receive_json()
+            assert message["type"] == "result"
+            assert len(message["data"]["data"]) == 3
+
+    def test_follow_up_context_dropped_on_disconnect(self):
+        """Test follow-ups refine the last result until the socket closes."""
+        with client.websocket_connect("/ws/test-ws-follow-up") as websocket:
+            for query in ("Show me the latest 10 orders", "show the first 2 of those"):
+                websocket.send_json({"type": "query", "query": query})
+                assert websocket.receive_json()["type"] == "status"
+                message = websocket.receive_json()
+
+            assert message["data"]["refined_from"] == "Show me the latest 10 orders"
+            assert len(message["data"]["data"]) == 2
+            status = client.get("/api/sessions/test-ws-follow-up/status").json()
+            assert status["context"]["rows"] == 2
+
+        assert main.get_agent().session_context.recall("test-ws-follow-up") is None
+
+    def test_batch_message_sends_results_as_they_finish(self):
+        """Test a batch message yields one result per query and a completion message."""
+        with client.websocket_connect("/ws/test-ws-batch") as websocket:
+            websocket.send_json({"type": "batch", "batch_id": "b1",
+                                 "queries": ["How many paid orders", "Show me the latest 3 orders"]})
+
+            assert websocket.receive_json()["type"] == "status"
+            messages = [websocket.receive_json() for _ in range(3)]
+
+        assert sorted(message["index"] for message in messages[:2]) == [0, 1]
+        assert all(message["batch_id"] == "b1" for message in messages)
+        assert messages[2]["type"] == "batch_complete"
+
+    def test_subscription_snapshot_and_unsubscribe(self):
+        """Test a subscribe message returns a snapshot and closing the socket drops it."""
+        with client.websocket_connect("/ws/test-ws-subscribe") as websocket:
+            websocket.send_json({"type": "subscribe", "subscription_id": "latest",
+                                 "query": "Show me the latest 3 orders"})
+            snapshot = websocket.receive_json()
+            assert snapshot["type"] == "snapshot"
+            assert snapshot["subscription_id"] == "latest"
+            assert snapshot["row_count"] == 3
+
+            websocket.send_json({"type": "subscribe", "subscription_id": "other",
+                                 "query": "Show me the latest 4 orders"})
+            websocket.receive_json()
+            websocket.send_json({"type": "unsubscribe", "subscription_id": "latest"})
+            assert websocket.receive_json() == {"type": "unsubscribed", "subscription_id": "latest",
+                                                "removed": True}
+            assert client.get("/api/subscriptions").json()["subscriptions"] == 1
+
+        assert main.get_subscriptions().stats()["subscriptions"] == 0
+
+    def test_published_message_reaches_socket(self):
+        """Test messages posted for a session are pushed to its socket and status reflects it."""
+        with client.websocket_connect("/ws/test-ws-publish") as websocket:
+            status = client.get("/api/sessions/test-ws-publish/status").json()
+            response = client.post("/api/sessions/test-ws-publish/messages",
+                                   json={"message": {"type": "notice", "text": "export ready"}})
+
+            assert response.status_code == 200
+            assert websocket.receive_json() == {"type": "notice", "text": "export ready"}
+            assert status["connected"] is True
+            assert status["connection_count"] >= 1
+
+        assert client.post("/api/sessions/test-ws-publish/messages",
+                           json={"message": {"type": "notice"}}).status_code == 404
+
+    def test_busy_when_scheduler_saturated(self, monkeypatch):
+        """Test a refused query is answered with a busy message instead of waiting."""
+        scheduler = QueryScheduler(max_concurrency=1, max_queued_per_session=0)
+        asyncio.run(scheduler.acquire("test-ws-busy"))
+        monkeypatch.setattr(main.get_agent(), "scheduler", scheduler)
+        try:
+            with client.websocket_connect("/ws/test-ws-busy") as websocket:
+                websocket.send_json({"type": "query", "query": "How many orders", "query_id": "q1"})
+
+                assert websocket.receive_json()["type"] == "status"
+                message = websocket.receive_json()
+        finally:
+            scheduler.release("test-ws-busy")
+
+        assert message["type"] == "busy"
+        assert message["query_id"] == "q1"
+        assert message["scope"] == "session"
+
+    def test_estimate_then_exact_count(self):
+        """Test an approximate query sends an estimate first and the exact count when asked."""
+        with client.websocket_connect("/ws/test-ws-estimate") as websocket:
+            websocket.send_json({"type": "query", "query": "How many paid orders", "approximate": True,
+                                 "exact": True, "query_id": "q7"})
+
+            assert websocket.receive_json()["type"] == "status"
+            estimate = websocket.receive_json()
+            result = websocket.receive_json()
+
+        assert estimate["type"] == "estimate"
+        low, high = estimate["data"]["estimate"]["bounds"]["total_count"]
+        assert result["type"] == "result"
+        assert estimate["query_id"] == result["query_id"] == "q7"
+        assert "estimate" not in result["data"]
+        assert low <= result["data"]["data"][0]["total_count"] <= high
+
+    def test_streamed_query_sends_partial_batches(self):
+        """Test streaming mode sends row batches followed by a summary."""
+        with client.websocket_connect("/ws/test-ws-stream") as websocket:
+            websocket.send_json({
+                "type": "query",
+                "query": "Show me the latest 25 orders",
+                "stream": True,
+                "batch_size": 10,
+            })
+
+            assert websocket.receive_json()["type"] == "status"
+            batches = []
+            message = websocket.receive_json()
+            while message["type"] == "partial":
+                batches.append(message)
+                message = websocket.receive_json()
+
+            assert [len(batch["data"]) for batch in batches] == [10, 10, 5]
+            assert message["type"] == "result"
+            assert message["data"]["streamed"] is True
+            assert message["data"]["row_count"] == 25
+            assert message["data"]["data"] is None
+
+
+@pytest.fixture
+def slow_queries(monkeypatch):
+    """Make queries mentioning "slow" run a 5 second pg_sleep."""
+    plan_query = main.get_agent()._plan_query
+
+    def plan(query, timings=None):
+        analysis, statement = plan_query(query, timings)
+        if "slow" in query:
+            statement = SQLStatement("SELECT pg_sleep(%s) AS slept", (5,))
+        return analysis, statement
+
+    monkeypatch.setattr(main.get_agent(), "_plan_query", plan)
+
+
+def sleeping_backends():
+    """Number of other sessions currently running pg_sleep."""
+    rows = main.get_agent().db_client.execute_sql(
+        "SELECT count(*) AS n FROM pg_stat_activity WHERE wait_event = 'PgSleep'")
+    return rows[0]["n"]
+
+
+class TestWebSocketCancellation:
+    """Test cases for cancelling superseded and abandoned queries."""
+
+    def test_newer_query_supersedes_running_one(self, slow_queries):
+        """Test a new query cancels the one in flight and the client is told."""
+        started = time.monotonic()
+        with client.websocket_connect("/ws/test-ws-supersede") as websocket:
+            websocket.send_json({"type": "query", "query": "show slow orders", "query_id": "q1"})
+            assert websocket.receive_json()["type"] == "status"
+            time.sleep(0.3)
+            websocket.send_json({"type": "query", "query": "Show me the latest 3 orders", "query_id": "q2"})
+
+            messages = {}
+            while "cancelled" not in messages or "result" not in messages:
+                message = websocket.receive_json()
+                messages[message["type"]] = message
+
+        assert messages["cancelled"]["query_id"] == "q1"
+        assert messages["cancelled"]["reason"] == "superseded"
+        assert len(messages["result"]["data"]["data"]) == 3
+        assert time.monotonic() - started < 3
+
+    def test_disconnect_cancels_running_query(self, slow_queries):
+        """Test closing the socket stops the query's database work."""
+        with client.websocket_connect("/ws/test-ws-disconnect") as websocket:
+            websocket.send_json({"type": "query", "query": "show slow orders"})
+            assert websocket.receive_json()["type"] == "status"
+            time.sleep(0.3)
+            assert sleeping_backends() == 1
+
+        deadline = time.monotonic() + 2
+        while sleeping_backends() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sleeping_backends() == 0
+
+    def test_query_deadline(self, slow_queries):
+        """Test a client-requested deadline turns into a timeout error."""
+        with client.websocket_connect("/ws/test-ws-timeout") as websocket:
+            websocket.send_json({"type": "query", "query": "show slow orders", "timeout": 0.3})
+            assert websocket.receive_json()["type"] == "status"
+            message = websocket.receive_json()
+
+        assert message["type"] == "error"
+        assert "timed out" in message["message"]